@@ -0,0 +1,50 @@
+"""
+The contract classes are available from the top level namespace, e.g. `qablet_contracts.Option`.
+They are imported lazily, the first time they are used, so that importing the package, or one of
+its modules, only imports what that module needs.
+"""
+
+import importlib
+
+# the module of each class in the top level namespace
+_CLASSES = {
+    "Contract": "qablet_contracts.timetable",
+    "EventsMixin": "qablet_contracts.timetable",
+    # bonds
+    "Bond": "qablet_contracts.bnd.zero",
+    "BondCall": "qablet_contracts.bnd.zero",
+    "BondPut": "qablet_contracts.bnd.zero",
+    "FixedCashFlows": "qablet_contracts.bnd.fixed",
+    "FixedBond": "qablet_contracts.bnd.fixed",
+    "CallableFixedBond": "qablet_contracts.bnd.callable",
+    "PuttableFixedBond": "qablet_contracts.bnd.callable",
+    # equity
+    "Option": "qablet_contracts.eq.vanilla",
+    "OptionKO": "qablet_contracts.eq.barrier",
+    "ForwardOption": "qablet_contracts.eq.forward",
+    "Accumulator": "qablet_contracts.eq.cliquet",
+    "Rainbow": "qablet_contracts.eq.rainbow",
+    "BasketRainbow": "qablet_contracts.eq.rainbow",
+    "DiscountCert": "qablet_contracts.eq.autocall",
+    "ReverseCB": "qablet_contracts.eq.autocall",
+    "WorstOfDiscountCert": "qablet_contracts.eq.autocall",
+    "WorstOfReverseCB": "qablet_contracts.eq.autocall",
+    # rates
+    "Swap": "qablet_contracts.ir.swap",
+    "Swaption": "qablet_contracts.ir.swaption",
+    "BermudaSwaption": "qablet_contracts.ir.swaption",
+}
+
+__all__ = list(_CLASSES)
+
+
+def __getattr__(name):
+    if name in _CLASSES:
+        value = getattr(importlib.import_module(_CLASSES[name]), name)
+        globals()[name] = value  # the next lookup doesn't call __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,324 @@
+"""
+This module contains a throughput benchmark of timetables, which values them with the
+[reference interpreter][qablet_contracts.interpreter] over synthetic paths, to compare the pricing cost
+of contract designs, e.g. the number of barrier observations, a chain of snappers, or the tracks of a Bermudan.
+
+The synthetic paths are lognormal assets, with a short rate that is constant, or mean reverting,
+on the grid of the event times. They are only meant to exercise the timetables, not to price them.
+
+The convergence of the value and the delta of a contract with the number of paths can also be compared,
+e.g. for a hard barrier and a smoothed barrier, see [convergence][qablet_contracts.benchmark.convergence].
+
+Run the module to benchmark a few contract designs, and the convergence of smoothed barriers:
+
+```
+python -m qablet_contracts.benchmark
+```
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.interpreter import evaluate
+
+
+def _assets(timetable: Dict, ccy: str) -> List[str]:
+    """The names of the assets of a timetable, i.e. the units and the inputs of the expressions,
+    which are not expressions, snaps, tracks, or the base currency."""
+    events = timetable["events"]
+    expressions = timetable.get("expressions", {})
+    names = set(events.column("unit").dictionary.to_pylist())
+    for expr in expressions.values():
+        names.update(expr.get("inp", []))
+    others = set(expressions) | {ccy, None}
+    others.update(events.column("track").dictionary.to_pylist())
+    for expr in expressions.values():
+        others.update(expr.get("out", []))
+    return sorted(names - others)
+
+
+def event_times(timetable: Dict, start=None) -> np.ndarray:
+    """The distinct times of the events, as datetime64, with the start time, if given."""
+    ms = timetable["events"].column("time").cast(pa.int64()).to_numpy()
+    times = ms.astype("datetime64[ms]")
+    if start is not None:
+        times = np.append(times, np.datetime64(start, "ms"))
+    return np.unique(times)
+
+
+def synthetic_paths(
+    times,
+    assets: List[str],
+    num_paths: int,
+    ccy: str = "USD",
+    spot: float = 100.0,
+    vol: float = 0.2,
+    rate: float = 0.03,
+    rate_vol: float = 0.0,
+    mean_reversion: float = 0.1,
+    seed: int = 0,
+) -> Dict:
+    """Lognormal paths of the assets, and the deflator of the base currency, with a mean reverting
+    short rate (constant if rate_vol is zero). The assets drift at the short rate.
+
+    Args:
+        times: the times of the paths, as datetime64, in ascending order.
+        assets: the names of the assets.
+        num_paths: the number of paths.
+        ccy: the base currency.
+        spot: the initial value of the assets.
+        vol: the volatility of the assets.
+        rate: the initial (and long term) short rate.
+        rate_vol: the normal volatility of the short rate.
+        mean_reversion: the mean reversion of the short rate.
+        seed: the seed of the random numbers.
+    """
+    times = np.asarray(times, dtype="datetime64[ms]")
+    years = (times - times[0]) / np.timedelta64(365 * 86400000, "ms")
+    dt = np.diff(years)[:, None]
+    rng = np.random.default_rng(seed)
+
+    short = np.full((len(times), num_paths), rate)
+    for i in range(1, len(times)):
+        dr = mean_reversion * (rate - short[i - 1]) * dt[i - 1]
+        dr += rate_vol * np.sqrt(dt[i - 1]) * rng.standard_normal(num_paths)
+        short[i] = short[i - 1] + dr
+    integral = np.cumsum((short[1:] + short[:-1]) / 2 * dt, axis=0)
+    paths = {ccy: np.exp(-np.vstack([np.zeros((1, num_paths)), integral]))}
+
+    for asset in assets:
+        z = rng.standard_normal((len(times) - 1, num_paths))
+        drift = (short[:-1] - vol**2 / 2) * dt
+        log_returns = np.cumsum(drift + vol * np.sqrt(dt) * z, axis=0)
+        paths[asset] = spot * np.exp(
+            np.vstack([np.zeros((1, num_paths)), log_returns])
+        )
+    return paths
+
+
+def benchmark(
+    cases: Dict[str, Dict],
+    num_paths: int = 10_000,
+    start=None,
+    ccy: str = "USD",
+    repeat: int = 3,
+    **kwargs,
+) -> List[Dict]:
+    """Value each timetable with the reference interpreter, over synthetic paths on the grid of its
+    event times, and report the best time of a number of repeats. The paths are generated once for
+    each timetable, and are not timed.
+
+    Args:
+        cases: a dict of names to timetables, or portfolio tables.
+        num_paths: the number of paths.
+        start: the first time of the paths, by default the first event time.
+        ccy: the base currency.
+        repeat: the number of times each timetable is valued.
+        kwargs: other arguments of [synthetic_paths][qablet_contracts.benchmark.synthetic_paths].
+
+    Returns:
+        A list of dicts, one for each case, with the number of contracts, rows and steps, the seconds,
+        the number of rows times paths per second, and the total value.
+    """
+    report = []
+    for name, tt in cases.items():
+        times = event_times(tt, start)
+        paths = synthetic_paths(
+            times, _assets(tt, ccy), num_paths, ccy, **kwargs
+        )
+        seconds = np.inf
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            values = evaluate(tt, times, paths, ccy)
+            seconds = min(seconds, time.perf_counter() - t0)
+        rows = len(tt["events"])
+        report.append(
+            {
+                "case": name,
+                "contracts": len(values),
+                "rows": rows,
+                "steps": len(times),
+                "seconds": seconds,
+                "row_paths_per_sec": rows * num_paths / seconds,
+                "value": float(np.sum(values.column("value").to_numpy())),
+            }
+        )
+    return report
+
+
+def convergence(
+    cases: Dict,
+    num_paths: Sequence[int] = (1_000, 4_000, 16_000),
+    seeds: int = 8,
+    bump: float = 0.01,
+    start=None,
+    ccy: str = "USD",
+    spot: float = 100.0,
+    **kwargs,
+) -> List[Dict]:
+    """The convergence of the value, and of the delta, of contracts with the number of paths,
+    e.g. to compare a hard barrier with a smoothed barrier. Each contract is valued with the reference
+    interpreter over independent sets of synthetic paths, and the delta is a central difference with bumped
+    spots, over the same random numbers.
+
+    Args:
+        cases: a dict of names to contracts.
+        num_paths: the numbers of paths.
+        seeds: the number of independent sets of paths, for each number of paths, at least 2
+            for the standard error.
+        bump: the relative bump of the spot of the assets.
+        start: the first time of the paths, by default the first event time.
+        ccy: the base currency.
+        spot: the initial value of the assets.
+        kwargs: other arguments of [synthetic_paths][qablet_contracts.benchmark.synthetic_paths].
+
+    Returns:
+        A list of dicts, one for each case and number of paths, with the mean and the standard error
+        (the standard deviation over the seeds) of the value and the delta, and the seconds of a valuation.
+
+    Examples:
+        >>> ko = OptionKO("USD", "EQ", 100, maturity, True, 120, "Up/Out", monthly)
+        >>> smooth = OptionKO("USD", "EQ", 100, maturity, True, 120, "Up/Out", monthly, smoothing=0.02)
+        >>> convergence({"hard": ko, "smooth": smooth}, start=start)
+    """
+    if seeds < 2:
+        raise ValueError(f"seeds must be at least 2, got {seeds}")
+    report = []
+    for name, contract in cases.items():
+        tt = contract.timetable()
+        times = event_times(tt, start)
+        assets = _assets(tt, ccy)
+        for n in num_paths:
+            values, deltas, seconds = [], [], np.inf
+            for seed in range(seeds):
+                value = {}
+                for sign in [-1, 0, 1]:
+                    paths = synthetic_paths(
+                        times,
+                        assets,
+                        n,
+                        ccy,
+                        spot=spot * (1 + sign * bump),
+                        seed=seed,
+                        **kwargs,
+                    )
+                    t0 = time.perf_counter()
+                    table = evaluate(tt, times, paths, ccy)
+                    seconds = min(seconds, time.perf_counter() - t0)
+                    value[sign] = float(
+                        np.sum(table.column("value").to_numpy())
+                    )
+                values.append(value[0])
+                deltas.append((value[1] - value[-1]) / (2 * bump * spot))
+            report.append(
+                {
+                    "case": name,
+                    "num_paths": n,
+                    "value": float(np.mean(values)),
+                    "value_stderr": float(np.std(values, ddof=1)),
+                    "delta": float(np.mean(deltas)),
+                    "delta_stderr": float(np.std(deltas, ddof=1)),
+                    "seconds": seconds,
+                }
+            )
+    return report
+
+
+def _convergence_cases() -> Dict:
+    """Hard and smoothed barriers, to compare their convergence."""
+    from qablet_contracts.eq.autocall import DiscountCert
+    from qablet_contracts.eq.barrier import OptionKO
+    from qablet_contracts.ir.schedule import add_months
+
+    start = np.datetime64("2024-01-01")
+    maturity = datetime(2025, 1, 1)
+    monthly = add_months(np.full(12, start), np.arange(1, 13))
+    monthly = monthly.astype("datetime64[ms]").tolist()
+    ko = ("USD", "EQ", 100, maturity, True, 120, "Up/Out", monthly)
+    cert = (
+        "USD",
+        "EQ",
+        100,
+        80,
+        datetime(2024, 1, 1),
+        maturity,
+        102,
+        monthly,
+        0.1,
+    )
+    return {
+        "ko hard": OptionKO(*ko),
+        "ko sigmoid 2%": OptionKO(*ko, smoothing=0.02),
+        "ko spread 2%": OptionKO(
+            *ko, smoothing=0.02, smoothing_shape="spread"
+        ),
+        "autocall hard": DiscountCert(*cert),
+        "autocall sigmoid 2%": DiscountCert(*cert, smoothing=0.02),
+    }
+
+
+def _cases() -> Dict[str, Dict]:
+    """A few contract designs, to compare their cost."""
+    from qablet_contracts.bnd.fixed import fixed_bond_batch
+    from qablet_contracts.eq.autocall import DiscountCert
+    from qablet_contracts.eq.barrier import OptionKO
+    from qablet_contracts.eq.cliquet import Accumulator
+    from qablet_contracts.ir.schedule import add_months
+    from qablet_contracts.ir.swaption import BermudaSwaption, Swaption
+
+    start = np.datetime64("2024-01-01")
+    maturity = datetime(2025, 1, 1)
+
+    def dates(values):  # as python datetimes
+        return values.astype("datetime64[ms]").tolist()
+
+    monthly = dates(add_months(np.full(12, start), np.arange(1, 13)))
+    daily = dates(start + np.arange(1, 367))
+    swap_dates = dates(add_months(np.full(11, start), np.arange(6, 72, 6)))
+    coupons = np.linspace(0.01, 0.06, 1000)
+    return {
+        "ko monthly": OptionKO(
+            "USD", "EQ", 100, maturity, True, 120, "Up/Out", monthly
+        ).timetable(),
+        "ko daily": OptionKO(
+            "USD", "EQ", 100, maturity, True, 120, "Up/Out", daily
+        ).timetable(),
+        "ko monthly continuous": OptionKO(
+            "USD",
+            "EQ",
+            100,
+            maturity,
+            True,
+            120,
+            "Up/Out",
+            [dates(start)] + monthly,
+            continuous_vol=0.2,
+        ).timetable(),
+        "accumulator monthly": Accumulator(
+            "USD", "EQ", [dates(start)] + monthly, 0.0, -0.03, 0.05
+        ).timetable(),
+        "autocall monthly": DiscountCert(
+            "USD", "EQ", 100, 80, dates(start), maturity, 102, monthly, 0.1
+        ).timetable(),
+        "swaption european": Swaption("USD", swap_dates, 0.03).timetable(),
+        "swaption bermudan": BermudaSwaption(
+            "USD", swap_dates, 0.03
+        ).timetable(),
+        "1000 fixed bonds": fixed_bond_batch(
+            "USD", coupons, start, np.datetime64("2029-01-01")
+        ),
+    }
+
+
+if __name__ == "__main__":
+    from qablet_contracts.display import format_events
+
+    start = np.datetime64("2024-01-01")
+    report = benchmark(_cases(), start=start, rate_vol=0.01)
+    print(format_events(pa.RecordBatch.from_pylist(report)))
+    report = convergence(_convergence_cases(), start=start, bump=0.001)
+    print(format_events(pa.RecordBatch.from_pylist(report)))
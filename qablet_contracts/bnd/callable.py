@@ -0,0 +1,311 @@
+"""
+This module contains examples of callable and puttable fixed rate bonds.
+The call (or put) events are merged with the coupon events as arrays, without creating a list of events.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+
+import numpy as np
+
+from qablet_contracts.bnd.fixed import FixedBond, _fixed_bond_cashflows
+from qablet_contracts.portfolio import portfolio_from_arrays
+from qablet_contracts.timetable import (
+    Contract,
+    dict_array,
+    timetable_from_arrays,
+)
+
+
+def _merge_options(cf_contract, cf_times, cf_amounts, contract, times, prices):
+    """Merge the option events into the cashflow events, ordered by contract and time.
+    An option event comes after the cashflows on the same date, i.e. the coupon is paid
+    before the bond is called (or put). Returns the columns, and a flag for the option events."""
+    contract = np.concatenate(
+        [cf_contract, np.asarray(contract, dtype=np.int64)]
+    )
+    times = np.concatenate(
+        [
+            np.asarray(cf_times, dtype="datetime64[ms]"),
+            np.asarray(times, dtype="datetime64[ms]"),
+        ]
+    )
+    quantity = np.concatenate(
+        [
+            np.asarray(cf_amounts, dtype=np.float64),
+            np.asarray(prices, dtype=np.float64),
+        ]
+    )
+    is_option = np.arange(len(contract)) >= len(cf_contract)
+    order = np.lexsort((is_option, times, contract))
+    return contract[order], times[order], quantity[order], is_option[order]
+
+
+def _bond_with_options(bond: FixedBond, dates, prices, op: str, dtype):
+    """The timetable of a fixed bond, with an option event of the given op on each date."""
+    cf_dates, cf_amounts = bond.cashflows()
+    _, time, quantity, is_option = _merge_options(
+        np.zeros(len(cf_dates), dtype=np.int64),
+        cf_dates,
+        cf_amounts,
+        np.zeros(len(dates), dtype=np.int64),
+        dates,
+        prices,
+    )
+    n = len(time)
+    return timetable_from_arrays(
+        time,
+        dict_array(is_option, ["+", op]),
+        quantity,
+        dict_array(np.zeros(n, dtype=np.int64), [bond.ccy]),
+        dict_array(np.zeros(n, dtype=np.int64), [bond.track]),
+        dtype=dtype,
+    )
+
+
+@dataclass
+class CallableFixedBond(Contract):
+    """A **Callable Fixed Rate Bond** is a [FixedBond][qablet_contracts.bnd.fixed.FixedBond] that the issuer
+    can redeem at the call price on each call date, after paying the coupon due on that date.
+
+    Args:
+        ccy: the currency of cashflows.
+        coupon: the coupon rate per year.
+        accrual_start: the start of the first coupon period.
+        maturity: the maturity of the bond.
+        call_dates: the dates on which the bond can be called.
+        call_prices: the call price on each call date.
+        freq: the frequency of coupon payments, see [FixedBond][qablet_contracts.bnd.fixed.FixedBond].
+        track: an optional identifier for the contract.
+
+    Examples:
+        >>> CallableFixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), [datetime(2024, 12, 31)], [1.0], "2QE").print_events()
+              time op  quantity unit track
+        06/30/2024  +     0.025  USD
+        12/31/2024  +     0.025  USD
+        12/31/2024  <     1.000  USD
+        06/30/2025  +     0.025  USD
+        12/31/2025  +     1.025  USD
+    """
+
+    ccy: str
+    coupon: float
+    accrual_start: datetime
+    maturity: datetime
+    call_dates: List[datetime]
+    call_prices: List[float]
+    freq: str = "2BQE"
+    track: str = ""
+
+    def timetable(self, dtype=np.float64):
+        bond = FixedBond(
+            self.ccy,
+            self.coupon,
+            self.accrual_start,
+            self.maturity,
+            self.freq,
+            self.track,
+        )
+        return _bond_with_options(
+            bond, self.call_dates, self.call_prices, "<", dtype
+        )
+
+
+@dataclass
+class PuttableFixedBond(Contract):
+    """A **Puttable Fixed Rate Bond** is a [FixedBond][qablet_contracts.bnd.fixed.FixedBond] that the holder
+    can sell back to the issuer at the put price on each put date, after receiving the coupon due on that date.
+
+    Args:
+        ccy: the currency of cashflows.
+        coupon: the coupon rate per year.
+        accrual_start: the start of the first coupon period.
+        maturity: the maturity of the bond.
+        put_dates: the dates on which the bond can be put.
+        put_prices: the put price on each put date.
+        freq: the frequency of coupon payments, see [FixedBond][qablet_contracts.bnd.fixed.FixedBond].
+        track: an optional identifier for the contract.
+
+    Examples:
+        >>> PuttableFixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), [datetime(2024, 12, 31)], [1.0], "2QE").print_events()
+              time op  quantity unit track
+        06/30/2024  +     0.025  USD
+        12/31/2024  +     0.025  USD
+        12/31/2024  >     1.000  USD
+        06/30/2025  +     0.025  USD
+        12/31/2025  +     1.025  USD
+    """
+
+    ccy: str
+    coupon: float
+    accrual_start: datetime
+    maturity: datetime
+    put_dates: List[datetime]
+    put_prices: List[float]
+    freq: str = "2BQE"
+    track: str = ""
+
+    def timetable(self, dtype=np.float64):
+        bond = FixedBond(
+            self.ccy,
+            self.coupon,
+            self.accrual_start,
+            self.maturity,
+            self.freq,
+            self.track,
+        )
+        return _bond_with_options(
+            bond, self.put_dates, self.put_prices, ">", dtype
+        )
+
+
+def _bond_option_batch(
+    op,
+    ccy,
+    coupons,
+    accrual_starts,
+    maturities,
+    option_contract,
+    option_dates,
+    option_prices,
+    freq,
+    notionals,
+    track,
+    dtype,
+):
+    coupons, accrual_starts, maturities, notionals = np.broadcast_arrays(
+        np.asarray(coupons, dtype=np.float64),
+        np.asarray(accrual_starts, dtype="datetime64[D]"),
+        np.asarray(maturities, dtype="datetime64[D]"),
+        np.asarray(notionals, dtype=np.float64),
+    )
+    cf_contract, cf_times, cf_amounts = _fixed_bond_cashflows(
+        coupons, accrual_starts, maturities, freq, notionals
+    )
+    option_contract = np.asarray(option_contract, dtype=np.int64)
+    prices = np.asarray(option_prices) * notionals[option_contract]
+    contract, time, quantity, is_option = _merge_options(
+        cf_contract,
+        cf_times,
+        cf_amounts,
+        option_contract,
+        option_dates,
+        prices,
+    )
+    n = len(contract)
+    return portfolio_from_arrays(
+        contract,
+        time,
+        dict_array(is_option, ["+", op]),
+        quantity,
+        dict_array(np.zeros(n, dtype=np.int64), [ccy]),
+        dict_array(contract, [f"{track}#{c}" for c in range(len(coupons))]),
+        dtype=dtype,
+    )
+
+
+def callable_bond_batch(
+    ccy: str,
+    coupons,
+    accrual_starts,
+    maturities,
+    call_contract,
+    call_dates,
+    call_prices,
+    freq=2,
+    notionals=1.0,
+    track: str = "",
+    dtype=np.float64,
+):
+    """Create the portfolio table of many [callable bonds][qablet_contracts.bnd.callable.CallableFixedBond]
+    in a single vectorized pass. The cashflows are those of
+    [fixed_bond_batch][qablet_contracts.bnd.fixed.fixed_bond_batch], and the call schedules are given as flat arrays,
+    with one element for each call date of all bonds. Bond c has the track `{track}#c`, so that batches
+    with different tracks can be combined in a portfolio.
+
+    Args:
+        ccy: the currency of the bonds.
+        coupons: the coupon rate per year of each bond.
+        accrual_starts: the accrual start of each bond.
+        maturities: the maturity of each bond.
+        call_contract: the bond of each call date.
+        call_dates: the call dates.
+        call_prices: the call price of each call date, per unit notional.
+        freq: the number of coupon payments per year of each bond.
+        notionals: the notional of each bond.
+        track: the prefix of the track of each bond.
+        dtype: the dtype of the quantities.
+    """
+    return _bond_option_batch(
+        "<",
+        ccy,
+        coupons,
+        accrual_starts,
+        maturities,
+        call_contract,
+        call_dates,
+        call_prices,
+        freq,
+        notionals,
+        track,
+        dtype,
+    )
+
+
+def puttable_bond_batch(
+    ccy: str,
+    coupons,
+    accrual_starts,
+    maturities,
+    put_contract,
+    put_dates,
+    put_prices,
+    freq=2,
+    notionals=1.0,
+    track: str = "",
+    dtype=np.float64,
+):
+    """Create the portfolio table of many [puttable bonds][qablet_contracts.bnd.callable.PuttableFixedBond]
+    in a single vectorized pass, see [callable_bond_batch][qablet_contracts.bnd.callable.callable_bond_batch].
+
+    Args:
+        ccy: the currency of the bonds.
+        coupons: the coupon rate per year of each bond.
+        accrual_starts: the accrual start of each bond.
+        maturities: the maturity of each bond.
+        put_contract: the bond of each put date.
+        put_dates: the put dates.
+        put_prices: the put price of each put date, per unit notional.
+        freq: the number of coupon payments per year of each bond.
+        notionals: the notional of each bond.
+        track: the prefix of the track of each bond.
+        dtype: the dtype of the quantities.
+    """
+    return _bond_option_batch(
+        ">",
+        ccy,
+        coupons,
+        accrual_starts,
+        maturities,
+        put_contract,
+        put_dates,
+        put_prices,
+        freq,
+        notionals,
+        track,
+        dtype,
+    )
+
+
+if __name__ == "__main__":
+    print("callable bond:\n")
+    CallableFixedBond(
+        "USD",
+        0.05,
+        datetime(2023, 12, 31),
+        datetime(2025, 12, 31),
+        [datetime(2024, 12, 31)],
+        [1.0],
+        "2QE",
+    ).print_events()
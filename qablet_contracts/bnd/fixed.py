@@ -7,11 +7,18 @@ from datetime import datetime
 from typing import List
 
 import numpy as np
-import pandas as pd
 import pyarrow as pa
 
 from qablet_contracts.ir.dcf import dcf_30_360 as dcf
-from qablet_contracts.timetable import TS_EVENT_SCHEMA, Contract
+from qablet_contracts.ir.dcf import dcf_30_360_array as dcf_array
+from qablet_contracts.ir.schedule import backward_schedule
+from qablet_contracts.portfolio import portfolio_from_arrays
+from qablet_contracts.timetable import (
+    Contract,
+    build_stage,
+    dict_array,
+    event_schema,
+)
 
 
 def _const_dict_array(n, val):
@@ -23,21 +30,25 @@ def _const_dict_array(n, val):
 
 
 def timetable_from_cf(
-    ccy: str, dates: List[datetime], amounts: List[float], track: str = ""
+    ccy: str,
+    dates: List[datetime],
+    amounts: List[float],
+    track: str = "",
+    dtype=np.float64,
 ):
     n = len(dates)
-    return {
-        "events": pa.RecordBatch.from_arrays(
+    with build_stage("arrow"):
+        events = pa.RecordBatch.from_arrays(
             [
                 pa.array(dates),
                 _const_dict_array(n, "+"),  # ops
-                pa.array(amounts),
+                pa.array(np.asarray(amounts, dtype=dtype)),
                 _const_dict_array(n, ccy),  # units
                 _const_dict_array(n, track),  # tracks
             ],
-            schema=TS_EVENT_SCHEMA,
+            schema=event_schema(dtype),
         )
-    }
+    return {"events": events}
 
 
 @dataclass
@@ -66,9 +77,9 @@ class FixedCashFlows(Contract):
     amounts: List[float]
     track: str = ""
 
-    def timetable(self):
+    def timetable(self, dtype=np.float64):
         return timetable_from_cf(
-            self.ccy, self.dates, self.amounts, self.track
+            self.ccy, self.dates, self.amounts, self.track, dtype
         )
 
 
@@ -99,22 +110,221 @@ class FixedBond(Contract):
     freq: str = "2BQE"
     track: str = ""
 
-    def timetable(self):
+    def cashflows(self):
+        """Return the payment dates and amounts of the bond."""
+        import pandas as pd  # only needed for the business day calendar
+
         # Coupon period dates including the start of first period, and end of last period.
-        cpn_dates = pd.bdate_range(
-            self.accrual_start,
-            self.maturity,
-            freq=self.freq,
-            inclusive="both",
-        )
+        with build_stage("schedule"):
+            cpn_dates = pd.bdate_range(
+                self.accrual_start,
+                self.maturity,
+                freq=self.freq,
+                inclusive="both",
+            )
 
-        amounts = [
-            dcf(end, start) * self.coupon
-            for start, end in zip(cpn_dates[:-1], cpn_dates[1:])
-        ]
+        with build_stage("dcf"):
+            amounts = [
+                dcf(end, start) * self.coupon
+                for start, end in zip(cpn_dates[:-1], cpn_dates[1:])
+            ]
 
         amounts[-1] += 1  # The last payment includes the principal
-        return timetable_from_cf(self.ccy, cpn_dates[1:], amounts, self.track)
+        return cpn_dates[1:], amounts
+
+    def timetable(self, dtype=np.float64):
+        dates, amounts = self.cashflows()
+        return timetable_from_cf(self.ccy, dates, amounts, self.track, dtype)
+
+
+def _sinking_before(num_contracts, contract, dates, amounts, owner, before):
+    """The total sinking fund payments of contract owner[i] on or before before[i], for each i,
+    and the total sinking fund payments of each contract."""
+    if contract is None:
+        return np.zeros(len(owner)), np.zeros(num_contracts)
+    contract = np.asarray(contract, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    # search on a single int64 key, which orders by contract, then date
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64) + (
+        1 << 31
+    )
+    keys = (contract << 32) + days
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    cum = np.concatenate([[0.0], np.cumsum(amounts[order])])
+
+    before = np.asarray(before, dtype="datetime64[D]").astype(np.int64)
+    last = np.searchsorted(keys, (owner << 32) + before + (1 << 31), "right")
+    first = np.searchsorted(keys, owner << 32, "left")
+    total = np.bincount(contract, weights=amounts, minlength=num_contracts)
+    return cum[last] - cum[first], total
+
+
+def fixed_bond_batch(
+    ccy: str,
+    coupons,
+    accrual_starts,
+    maturities,
+    freq=2,
+    notionals=1.0,
+    amort_periods=0,
+    sinking_contract=None,
+    sinking_dates=None,
+    sinking_amounts=None,
+    track: str = "",
+    dtype=np.float64,
+):
+    """Create the portfolio table of many fixed rate bonds in a single vectorized pass, one for each element
+    of the input arrays. The coupon periods roll back from the maturity, with a short first period if needed.
+    Each bond pays the coupon on its outstanding notional at the end of each period, and the principal:
+
+    - in equal amounts at the end of its last `amort_periods` periods, if it amortizes, or at maturity, and
+    - on the dates of its sinking fund payments. A sinking fund payment reduces the notional of
+    the periods that start on or after its date, and the amount paid at maturity.
+
+    Amortization is only in equal amounts over the last periods. Any other schedule of the notional
+    can be given as sinking fund payments, one on each date where the notional steps down.
+    A ValueError is raised if the amortization and the sinking fund payments of a bond are more than its notional,
+    or if a sinking fund payment is for a bond that is not in the batch.
+
+    The events of a bond are the same as those of a [FixedBond][qablet_contracts.bnd.fixed.FixedBond]
+    with calendar (not business day) dates, and the sinking fund payments are separate events.
+
+    Args:
+        ccy: the currency of the bonds.
+        coupons: the coupon rate per year of each bond.
+        accrual_starts: the accrual start of each bond.
+        maturities: the maturity of each bond.
+        freq: the number of coupon payments per year of each bond, one of 1, 2, 3, 4, 6 or 12.
+        notionals: the initial notional of each bond.
+        amort_periods: the number of periods at the end of each bond, over which its principal amortizes.
+            0 means a bullet bond.
+        sinking_contract: the bond of each sinking fund payment, if any.
+        sinking_dates: the date of each sinking fund payment.
+        sinking_amounts: the amount of each sinking fund payment.
+        track: the track of all events.
+        dtype: the dtype of the quantities.
+
+    Examples:
+        >>> tt = fixed_bond_batch(
+        ...     "USD", [0.05, 0.04], datetime(2023, 12, 31), [datetime(2025, 12, 31), datetime(2026, 12, 31)],
+        ...     amort_periods=[0, 2], sinking_contract=[0], sinking_dates=[datetime(2024, 12, 31)], sinking_amounts=[0.25])
+        >>> [round(x, 6) for x in tt["events"].column("quantity").to_pylist()]
+        [0.025, 0.025, 0.25, 0.01875, 0.76875, 0.02, 0.02, 0.02, 0.02, 0.52, 0.51]
+    """
+    contract, time, amounts = _fixed_bond_cashflows(
+        coupons,
+        accrual_starts,
+        maturities,
+        freq,
+        notionals,
+        amort_periods,
+        sinking_contract,
+        sinking_dates,
+        sinking_amounts,
+    )
+    n = len(contract)
+    return portfolio_from_arrays(
+        contract,
+        time,
+        dict_array(np.zeros(n, dtype=np.int64), ["+"]),
+        amounts,
+        dict_array(np.zeros(n, dtype=np.int64), [ccy]),
+        dict_array(np.zeros(n, dtype=np.int64), [track]),
+        dtype=dtype,
+    )
+
+
+def _fixed_bond_cashflows(
+    coupons,
+    accrual_starts,
+    maturities,
+    freq=2,
+    notionals=1.0,
+    amort_periods=0,
+    sinking_contract=None,
+    sinking_dates=None,
+    sinking_amounts=None,
+):
+    """The cashflows of the bonds in [fixed_bond_batch][qablet_contracts.bnd.fixed.fixed_bond_batch],
+    as arrays (contract, time, amount), sorted by contract and time."""
+    coupons, starts, maturities, freq, notionals, amort_periods = (
+        np.broadcast_arrays(
+            np.asarray(coupons, dtype=np.float64),
+            np.asarray(accrual_starts, dtype="datetime64[D]"),
+            np.asarray(maturities, dtype="datetime64[D]"),
+            np.asarray(freq, dtype=np.int64),
+            np.asarray(notionals, dtype=np.float64),
+            np.asarray(amort_periods, dtype=np.int64),
+        )
+    )
+    num_bonds = len(coupons)
+    if np.any(freq <= 0) or np.any(12 % np.maximum(freq, 1) != 0):
+        raise ValueError(
+            f"freq must be one of 1, 2, 3, 4, 6 or 12, got {np.unique(freq)}"
+        )
+
+    if sinking_contract is not None:
+        sinking_contract = np.asarray(sinking_contract, dtype=np.int64)
+        unknown = (sinking_contract < 0) | (sinking_contract >= num_bonds)
+        if np.any(unknown):
+            raise ValueError(
+                f"the sinking fund payments are for bonds {np.unique(sinking_contract[unknown]).tolist()}, "
+                f"which are not in the batch of {num_bonds} bonds"
+            )
+
+    owner, period_start, period_end = backward_schedule(
+        starts, maturities, 12 // freq
+    )
+    num_periods = np.bincount(owner, minlength=num_bonds)
+    pos = np.arange(len(owner)) - (np.cumsum(num_periods) - num_periods)[owner]
+
+    # amortization, in equal amounts at the end of the last k periods
+    k = np.minimum(amort_periods, num_periods)[owner]
+    amort = np.where(k > 0, notionals[owner] / np.maximum(k, 1), 0.0)
+    first_amort = num_periods[owner] - k
+    amort_before = amort * np.maximum(pos - first_amort, 0)
+    principal = np.where(pos >= first_amort, amort, 0.0)
+
+    sunk, total_sunk = _sinking_before(
+        num_bonds,
+        sinking_contract,
+        sinking_dates,
+        sinking_amounts,
+        owner,
+        period_start,
+    )
+    outstanding = notionals[owner] - amort_before - sunk
+    is_last = pos == num_periods[owner] - 1
+    principal = np.where(
+        is_last,
+        notionals[owner] - amort_before - total_sunk[owner],
+        principal,
+    )
+    tol = 1e-12 * np.abs(notionals[owner])
+    negative = (outstanding < -tol) | (principal < -tol)
+    if np.any(negative):
+        raise ValueError(
+            "the sinking fund payments are more than the notional of bonds "
+            f"{np.unique(owner[negative]).tolist()}"
+        )
+    amounts = (
+        coupons[owner] * dcf_array(period_end, period_start) * outstanding
+        + principal
+    )
+
+    # merge the sinking fund payments, after the coupons on the same date
+    contract, time = owner, period_end
+    if sinking_contract is not None:
+        contract = np.concatenate([owner, sinking_contract])
+        time = np.concatenate(
+            [period_end, np.asarray(sinking_dates, dtype="datetime64[D]")]
+        )
+        amounts = np.concatenate([amounts, sinking_amounts])
+        is_sink = np.arange(len(contract)) >= len(owner)
+        order = np.lexsort((is_sink, time, contract))
+        contract, time, amounts = contract[order], time[order], amounts[order]
+    return contract, time, amounts
 
 
 if __name__ == "__main__":
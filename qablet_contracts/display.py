@@ -0,0 +1,296 @@
+"""
+This module contains a formatter for the events of a timetable, or a portfolio table.
+It works directly on the arrow columns, and produces the same output as converting the events
+to a pandas dataframe and calling `to_string(index=False)`, with the time formatted as mm/dd/yyyy.
+
+Dictionary columns are formatted once per dictionary entry, and times once per distinct date.
+Large tables can be written to a file in chunks, and long tables can be truncated to their
+first and last rows.
+"""
+
+import sys
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+DEFAULT_CHUNK_SIZE = 65536
+_NA = "NaN"
+_DIGITS = 6  # the default display precision of pandas
+_MS_PER_DAY = 86400000
+
+
+def _as_batches(events) -> List[pa.RecordBatch]:
+    if isinstance(events, pa.Table):
+        return events.to_batches()
+    return [events]
+
+
+def _dict_strings(col: pa.DictionaryArray) -> np.ndarray:
+    """The strings of each row of a dictionary column."""
+    values = np.array(col.dictionary.to_pylist() + [_NA], dtype=object)
+    codes = col.indices.fill_null(-1).to_numpy()
+    return values[codes]
+
+
+def _time_strings(col: pa.Array) -> np.ndarray:
+    """The mm/dd/yyyy strings of a timestamp column, formatted once per distinct date."""
+    ms = col.cast(pa.int64()).fill_null(np.iinfo(np.int64).min).to_numpy()
+    days, inverse = np.unique(ms // _MS_PER_DAY, return_inverse=True)
+    null = np.iinfo(np.int64).min // _MS_PER_DAY
+    strings = np.array(
+        [
+            "NaT"
+            if d == null
+            else np.datetime64(int(d), "D").item().strftime("%m/%d/%Y")
+            for d in days
+        ],
+        dtype=object,
+    )
+    return strings[inverse.ravel()]
+
+
+class _FloatFormat:
+    """The format of a float column, which depends on all its values: the fixed point format,
+    with the same number of decimals for all values, or the scientific format if the values
+    are too small, or too large."""
+
+    def __init__(self):
+        self.decimals = 1
+        self.int_len = 0  # the sign, integer part, and decimal point
+        self.sci_len = 0
+        self.other_len = 0  # nan or inf
+        self.large = False
+        self.small = False
+
+    def update(self, values: np.ndarray):
+        values = values.astype(np.float64)
+        finite = values[np.isfinite(values)]
+        if len(finite):
+            fixed = np.char.mod(f"%.{_DIGITS}f", finite)
+            stripped = np.char.rstrip(fixed, "0")
+            decimals = (
+                np.char.str_len(stripped) - np.char.find(stripped, ".") - 1
+            )
+            self.decimals = max(self.decimals, int(decimals.max()))
+            self.int_len = max(
+                self.int_len, int(np.char.str_len(fixed).max()) - _DIGITS
+            )
+            sci = np.char.mod(f"%.{_DIGITS}e", finite)
+            self.sci_len = max(self.sci_len, int(np.char.str_len(sci).max()))
+        abs_vals = np.abs(values)
+        self.large |= bool((abs_vals > 1e6).any())
+        self.small |= bool(((abs_vals < 10**-_DIGITS) & (abs_vals > 0)).any())
+        if np.isnan(values).any():
+            self.other_len = max(self.other_len, len(_NA))
+        if np.isinf(values).any():
+            self.other_len = max(self.other_len, 3 + int((values < 0).any()))
+
+    def sci(self) -> bool:
+        maxlen = max(self.int_len + self.decimals, self.other_len)
+        too_long = maxlen > _DIGITS + 6
+        return self.small or (too_long and self.large)
+
+    def width(self) -> int:
+        if self.sci():
+            return max(self.sci_len, self.other_len)
+        return max(self.int_len + self.decimals, self.other_len)
+
+    def strings(self, values: np.ndarray) -> np.ndarray:
+        values = values.astype(np.float64)
+        fmt = f"%.{_DIGITS}e" if self.sci() else f"%.{self.decimals}f"
+        out = np.char.mod(fmt, values).astype(object)
+        out[np.isnan(values)] = _NA
+        return out
+
+
+def _column_kind(field: pa.Field) -> str:
+    if pa.types.is_dictionary(field.type):
+        return "dict"
+    if pa.types.is_timestamp(field.type):
+        return "time"
+    if pa.types.is_floating(field.type):
+        return "float"
+    return "other"
+
+
+class _Formatter:
+    """Formats the rows of a table, in one or more chunks, with the column widths and float formats
+    of all the rows that are added with `update`."""
+
+    def __init__(self, schema: pa.Schema, truncated: bool = False):
+        self.names = schema.names
+        self.kinds = [_column_kind(f) for f in schema]
+        self.headers = [
+            " " + f.name
+            if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)
+            else f.name
+            for f in schema
+        ]
+        self.widths = [len(h) for h in self.headers]
+        if truncated:
+            self.widths = [max(w, len("...")) for w in self.widths]
+        self.floats = [_FloatFormat() for _ in schema]
+
+    def _strings(self, col, i) -> np.ndarray:
+        kind = self.kinds[i]
+        if kind == "dict":
+            return _dict_strings(col)
+        if kind == "time":
+            return _time_strings(col)
+        if kind == "float":
+            return self.floats[i].strings(col.to_numpy(zero_copy_only=False))
+        return np.array(
+            [_NA if v is None else str(v) for v in col.to_pylist()],
+            dtype=object,
+        )
+
+    def update(self, batch: pa.RecordBatch):
+        """Update the float formats, and the widths of the other columns, with the rows of a batch."""
+        for i, col in enumerate(batch.columns):
+            if not len(col):
+                continue
+            kind = self.kinds[i]
+            if kind == "float":
+                self.floats[i].update(col.to_numpy(zero_copy_only=False))
+                continue
+            if kind == "dict":
+                lengths = [len(v) for v in col.dictionary.to_pylist()]
+                lengths = np.array(lengths + [len(_NA)], dtype=np.int64)
+                codes = col.indices.fill_null(-1).to_numpy()
+                width = lengths[np.unique(codes)].max()
+            elif kind == "time":
+                width = len("mm/dd/yyyy") if col.null_count < len(col) else 3
+            else:
+                width = max(len(s) for s in self._strings(col, i))
+            self.widths[i] = max(self.widths[i], int(width))
+
+    def _widths(self) -> List[int]:
+        return [
+            max(w, self.floats[i].width()) if kind == "float" else w
+            for i, (w, kind) in enumerate(zip(self.widths, self.kinds))
+        ]
+
+    def header(self) -> str:
+        return self._join([np.array([h], dtype=object) for h in self.headers])
+
+    def ellipsis(self) -> str:
+        return self._join([np.array(["..."], dtype=object)] * len(self.names))
+
+    def lines(self, batch: pa.RecordBatch) -> str:
+        return self._join(
+            [self._strings(col, i) for i, col in enumerate(batch.columns)]
+        )
+
+    def _join(self, columns: List[np.ndarray]) -> str:
+        lines = None
+        for col, width in zip(columns, self._widths()):
+            col = np.char.rjust(col.astype(str), width)
+            lines = (
+                col
+                if lines is None
+                else np.char.add(np.char.add(lines, " "), col)
+            )
+        return "\n".join(lines.tolist())
+
+
+def _empty(schema: pa.Schema) -> str:
+    return "Empty DataFrame\nColumns: [{}]\nIndex: []".format(
+        ", ".join(schema.names)
+    )
+
+
+def _parts(events, head: Optional[int], tail: Optional[int]):
+    """Split the events into the rows to show before and after the ellipsis, if the
+    events are truncated. Returns (head_batches, tail_batches, truncated)."""
+    num_rows = len(events)
+    if (head is None and tail is None) or (head or 0) + (
+        tail or 0
+    ) >= num_rows:
+        return _as_batches(events), [], False
+    first = _as_batches(events.slice(0, head or 0))
+    last = _as_batches(events.slice(num_rows - (tail or 0)))
+    return first, last, True
+
+
+def write_events(
+    events,
+    file=None,
+    head: Optional[int] = None,
+    tail: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
+    """Write the events of a timetable, or a portfolio table, to a text file or stream, one chunk at a time.
+    The widths and formats of all columns are calculated first, in a pass over the chunks, so that the output
+    is the same as [format_events][qablet_contracts.display.format_events].
+
+    Args:
+        events: a record batch, or a table.
+        file: a text stream, or the path of a file, by default stdout.
+        head: if given, show only the first head rows, and the tail rows.
+        tail: if given, show only the last tail rows, and the head rows.
+        chunk_size: the number of rows formatted at a time.
+    """
+    if file is None:
+        file = sys.stdout
+    if isinstance(file, str):
+        with open(file, "w") as f:
+            return write_events(events, f, head, tail, chunk_size)
+
+    if len(events) == 0:
+        file.write(_empty(events.schema) + "\n")
+        return
+
+    first, last, truncated = _parts(events, head, tail)
+
+    def chunks(batches):
+        for batch in batches:
+            for start in range(0, len(batch), chunk_size):
+                yield batch.slice(start, chunk_size)
+
+    fmt = _Formatter(events.schema, truncated)
+    for chunk in chunks(first + last):
+        fmt.update(chunk)
+
+    file.write(fmt.header() + "\n")
+    for chunk in chunks(first):
+        if len(chunk):
+            file.write(fmt.lines(chunk) + "\n")
+    if truncated:
+        file.write(fmt.ellipsis() + "\n")
+    for chunk in chunks(last):
+        if len(chunk):
+            file.write(fmt.lines(chunk) + "\n")
+
+
+def format_events(
+    events, head: Optional[int] = None, tail: Optional[int] = None
+) -> str:
+    """Format the events of a timetable, or a portfolio table, as a string.
+
+    Args:
+        events: a record batch, or a table.
+        head: if given, show only the first head rows, and the tail rows.
+        tail: if given, show only the last tail rows, and the head rows.
+
+    Examples:
+        >>> tt = FixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE").timetable()
+        >>> print(format_events(tt["events"], head=1, tail=1))
+              time  op  quantity unit track
+        06/30/2024   +     0.025  USD
+               ... ...       ...  ...   ...
+        12/31/2025   +     1.025  USD
+    """
+    if len(events) == 0:
+        return _empty(events.schema)
+    first, last, truncated = _parts(events, head, tail)
+    fmt = _Formatter(events.schema, truncated)
+    for batch in first + last:
+        fmt.update(batch)
+
+    parts = [fmt.header()]
+    parts += [fmt.lines(b) for b in first if len(b)]
+    if truncated:
+        parts.append(fmt.ellipsis())
+    parts += [fmt.lines(b) for b in last if len(b)]
+    return "\n".join(parts)
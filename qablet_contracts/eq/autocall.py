@@ -7,14 +7,109 @@ from datetime import datetime
 from typing import List
 
 import numpy as np
-import pandas as pd
 
+from qablet_contracts.eq.fns import (
+    Above,
+    DiscountPayoff,
+    SmoothAbove,
+    WorstOfAbove,
+    WorstOfPayoff,
+)
+from qablet_contracts.eq.kernels import add_kernels
 from qablet_contracts.ir.dcf import dcf_30_360 as dcf
-from qablet_contracts.timetable import EventsMixin
+from qablet_contracts.ir.dcf import dcf_30_360_array as dcf_array
+from qablet_contracts.portfolio import portfolio_from_arrays, ragged_index
+from qablet_contracts.timetable import EventsMixin, dict_array
+
+
+class _DiscountCertEvents:
+    """The events of a discount certificate, shared by the single asset and the worst-of certificates,
+    which name their phrases with the phrase_name method."""
+
+    def phrase_name(self, name: str) -> str:
+        return name
+
+    def events(self):
+        events = []
+        # Autocall events
+        for barrier_date in self.barrier_dates:
+            # daycount_fraction
+            frac = dcf(barrier_date, self.accrual_start)
+            events.append(
+                {
+                    "track": self.track,
+                    "time": barrier_date,
+                    "op": self.phrase_name("call"),
+                    "quantity": self.notional * np.exp(frac * self.cpn_rate),
+                    "unit": self.ccy,
+                }
+            )
+
+        # payoff at maturity
+        events.append(
+            {
+                "track": "",
+                "time": self.maturity,
+                "op": "+",
+                "quantity": 1.0,
+                "unit": self.phrase_name("payoff"),
+            }
+        )
+        return events
+
+    def fixed_payoff(self):
+        return self.notional * np.exp(
+            dcf(self.maturity, self.accrual_start) * self.cpn_rate
+        )
+
+
+class _ReverseCBEvents(_DiscountCertEvents):
+    """The events of a reverse convertible, shared by the single asset and the worst-of notes."""
+
+    def events(self):
+        events = []
+        cpn_start_dates = [self.accrual_start] + list(self.barrier_dates[:-1])
+        # Autocall events
+        for start, end in zip(cpn_start_dates, self.barrier_dates):
+            # daycount_fraction
+            frac = dcf(end, start)
+            events.append(
+                {
+                    "track": self.track,
+                    "time": end,
+                    "op": "+",
+                    "quantity": self.notional * frac * self.cpn_rate,
+                    "unit": self.ccy,
+                }
+            )
+            events.append(
+                {
+                    "track": self.track,
+                    "time": end,
+                    "op": self.phrase_name("call"),
+                    "quantity": self.notional,
+                    "unit": self.ccy,
+                }
+            )
+
+        # payoff at maturity
+        events.append(
+            {
+                "track": "",
+                "time": self.maturity,
+                "op": "+",
+                "quantity": 1.0,
+                "unit": self.phrase_name("payoff"),
+            }
+        )
+        return events
+
+    def fixed_payoff(self):
+        return self.notional
 
 
 @dataclass
-class DiscountCert(EventsMixin):
+class DiscountCert(_DiscountCertEvents, EventsMixin):
     """An **Autocallable Discount Certificate** is called if the asset price is above the barrier level
     on any of the barrier observation dates. If called, the note pays the principal and the coupon accreted
     till the call date. Otherwise, at maturity, if the asset is above strike, it pays the principal and the
@@ -32,6 +127,9 @@ class DiscountCert(EventsMixin):
         cpn_rate: the coupon rate.
         notional: the notional amount.
         track: an optional identifier for the contract.
+        smoothing: the width of a smoothed autocall barrier, relative to the barrier level, e.g. 0.01 for 1%.
+            If zero, the call condition is true or false, otherwise it is a weight between 0 and 1.
+        smoothing_shape: the shape of a smoothed barrier, "sigmoid" or "spread".
 
     Examples:
         >>> start = datetime(2024, 3, 31)
@@ -57,71 +155,48 @@ class DiscountCert(EventsMixin):
     cpn_rate: float
     notional: float = 100.0
     track: str = ""
+    smoothing: float = 0.0
+    smoothing_shape: str = "sigmoid"
 
-    def events(self):
-        events = []
-        # Autocall events
-        for barrier_date in self.barrier_dates:
-            # daycount_fraction
-            frac = dcf(barrier_date, self.accrual_start)
-            events.append(
-                {
-                    "track": self.track,
-                    "time": barrier_date,
-                    "op": "call",
-                    "quantity": self.notional * np.exp(frac * self.cpn_rate),
-                    "unit": self.ccy,
-                }
-            )
-
-        # payoff at maturity
-        events.append(
-            {
-                "track": "",
-                "time": self.maturity,
-                "op": "+",
-                "quantity": 1.0,
-                "unit": "payoff",
-            }
-        )
-        return events
-
-    def fixed_payoff(self):
-        return self.notional * np.exp(
-            dcf(self.maturity, self.accrual_start) * self.cpn_rate
-        )
-
-    def expressions(self):
+    def expressions(self, dtype=np.float64):
+        # Constants are computed once, and cast to dtype so that float32 paths are not promoted.
         # Define the autocall condition
-        def ko_fn(inputs):
-            [S] = inputs
-            return [S > (self.barrier * self.initial_spot / self.notional)]
-
+        level = self.barrier * self.initial_spot / self.notional
+        if self.smoothing:
+            call_fn = SmoothAbove(
+                dtype(level),
+                dtype(self.smoothing * level),
+                self.smoothing_shape,
+            )
+        else:
+            call_fn = Above(dtype(level))
         call = {
             "type": "phrase",
             "inp": [self.asset_name],
-            "fn": ko_fn,
+            "fn": call_fn,
+            "grad": call_fn.grad,
+            "chunk_safe": True,
         }
 
         # Define the final payoff
-        def payoff_fn(inputs):
-            [s] = inputs
-            eq_pay = s * (self.notional / self.initial_spot)
-            return [
-                np.where(eq_pay < self.strike, eq_pay, self.fixed_payoff())
-            ]
-
+        payoff_fn = DiscountPayoff(
+            scale=dtype(self.notional / self.initial_spot),
+            strike=dtype(self.strike),
+            fixed=dtype(self.fixed_payoff()),
+        )
         payoff = {
             "type": "phrase",
             "inp": [self.asset_name],
             "fn": payoff_fn,
+            "grad": payoff_fn.grad,
+            "chunk_safe": True,
         }
 
-        return {"payoff": payoff, "call": call}
+        return add_kernels({"payoff": payoff, "call": call})
 
 
 @dataclass
-class ReverseCB(DiscountCert):
+class ReverseCB(_ReverseCBEvents, DiscountCert):
     """An **Autocallable Reverse Convertible** is called if the asset price is above the barrier level
     on any of the barrier observation dates. Otherwise, at maturity, if the asset is above strike, it pays the principal and the
     coupon at maturity. If the asset is below strike, the principal payment is scaled down proportionately
@@ -156,49 +231,238 @@ class ReverseCB(DiscountCert):
         07/31/2024    +   1.000000 payoff
     """
 
-    def events(self):
-        events = []
-        cpn_start_dates = [self.accrual_start] + list(self.barrier_dates[:-1])
-        # Autocall events
-        for start, end in zip(cpn_start_dates, self.barrier_dates):
-            # daycount_fraction
-            frac = dcf(end, start)
-            events.append(
-                {
-                    "track": self.track,
-                    "time": end,
-                    "op": "+",
-                    "quantity": self.notional * frac * self.cpn_rate,
-                    "unit": self.ccy,
-                }
-            )
-            events.append(
-                {
-                    "track": self.track,
-                    "time": end,
-                    "op": "call",
-                    "quantity": self.notional,
-                    "unit": self.ccy,
-                }
-            )
 
-        # payoff at maturity
-        events.append(
-            {
-                "track": "",
-                "time": self.maturity,
-                "op": "+",
-                "quantity": 1.0,
-                "unit": "payoff",
-            }
+@dataclass
+class WorstOfDiscountCert(_DiscountCertEvents, EventsMixin):
+    """A **Worst-of Autocallable Discount Certificate** is a
+    [Discount Certificate][qablet_contracts.eq.autocall.DiscountCert] on the worst performing of
+    a basket of assets, where the performance of an asset is its price divided by its initial price.
+    The assets are stacked into a single basket input, and each phrase calculates the worst-of
+    with a single vectorized reduction. The phrases are named after the track, `{track}.call`,
+    `{track}.payoff` and `{track}.basket` (or `call`, `payoff` and `basket` without a track), so that contracts with different terms can be combined in a portfolio,
+    as in [worst_of_autocall_batch][qablet_contracts.eq.autocall.worst_of_autocall_batch].
+
+    Args:
+        ccy: the currency of the option.
+        asset_names: the names of the underlying assets.
+        initial_spots: the initial spot prices of the assets.
+        strike: downside participation below this strike.
+        maturity: the maturity of the option in years.
+        barrier: the note is called above this barrier level.
+        barrier_dates: the barrier observation points.
+        cpn_rate: the coupon rate.
+        notional: the notional amount.
+        track: an optional identifier for the contract.
+
+    Examples:
+        >>> start = datetime(2024, 3, 31)
+        >>> maturity = datetime(2024, 7, 31)
+        >>> barrier_dates = pd.date_range(start, maturity, freq="ME", inclusive="right")
+        >>> WorstOfDiscountCert("USD", ["AAPL", "MSFT"], [100, 400], 80, start, maturity, 102, barrier_dates, 0.10).print_events()
+              time   op   quantity   unit track
+        04/30/2024 call 100.836815    USD
+        05/31/2024 call 101.680633    USD
+        06/30/2024 call 102.531512    USD
+        07/31/2024 call 103.389511    USD
+        07/31/2024    +   1.000000 payoff
+    """
+
+    ccy: str
+    asset_names: List[str]
+    initial_spots: List[float]
+    strike: float
+    accrual_start: datetime
+    maturity: datetime
+    barrier: float
+    barrier_dates: List[datetime]
+    cpn_rate: float
+    notional: float = 100.0
+    track: str = ""
+
+    def phrase_name(self, name: str) -> str:
+        return f"{self.track}.{name}" if self.track else name
+
+    def expressions(self, dtype=np.float64):
+        basket = self.phrase_name("basket")
+        inv_spots = 1 / np.asarray(self.initial_spots, dtype=dtype)
+        return {
+            basket: {"type": "basket", "inp": list(self.asset_names)},
+            self.phrase_name("call"): {
+                "type": "phrase",
+                "inp": [basket],
+                "fn": WorstOfAbove(
+                    inv_spots, dtype(self.barrier / self.notional)
+                ),
+                "chunk_safe": True,
+            },
+            self.phrase_name("payoff"): {
+                "type": "phrase",
+                "inp": [basket],
+                "fn": WorstOfPayoff(
+                    inv_spots,
+                    scale=dtype(self.notional),
+                    strike=dtype(self.strike),
+                    fixed=dtype(self.fixed_payoff()),
+                ),
+                "chunk_safe": True,
+            },
+        }
+
+
+@dataclass
+class WorstOfReverseCB(_ReverseCBEvents, WorstOfDiscountCert):
+    """A **Worst-of Autocallable Reverse Convertible** is a
+    [Reverse Convertible][qablet_contracts.eq.autocall.ReverseCB] on the worst performing of
+    a basket of assets. See [WorstOfDiscountCert][qablet_contracts.eq.autocall.WorstOfDiscountCert].
+
+    Args:
+        ccy: the currency of the option.
+        asset_names: the names of the underlying assets.
+        initial_spots: the initial spot prices of the assets.
+        strike: downside participation below this strike.
+        maturity: the maturity of the option in years.
+        barrier: the note is called above this barrier level.
+        barrier_dates: the barrier observation points.
+        cpn_rate: the coupon rate.
+        notional: the notional amount.
+        track: an optional identifier for the contract.
+    """
+
+
+def worst_of_autocall_batch(
+    ccy: str,
+    asset_names: List[str],
+    initial_spots,
+    strike,
+    accrual_start,
+    maturity,
+    barrier,
+    barrier_dates: List,
+    cpn_rate,
+    notional=100.0,
+    reverse: bool = False,
+    dtype=np.float64,
+):
+    """Create the portfolio table of many worst-of autocallables on the same basket of assets,
+    with the events of all contracts created in a single vectorized pass. Contract i has the
+    events of a [WorstOfDiscountCert][qablet_contracts.eq.autocall.WorstOfDiscountCert]
+    (or a [WorstOfReverseCB][qablet_contracts.eq.autocall.WorstOfReverseCB] if reverse is true)
+    with track `#i`, and its phrases are named `#i.call` and `#i.payoff`, as in the contract. All contracts share
+    a single basket `.basket`, instead of a basket `#i.basket` for each contract.
+
+    Args:
+        ccy: the currency of the options.
+        asset_names: the names of the underlying assets.
+        initial_spots: an array (contracts x assets) of initial spot prices.
+        strike: an array of strikes, one for each contract.
+        accrual_start: an array of accrual start dates.
+        maturity: an array of maturities.
+        barrier: an array of barrier levels.
+        barrier_dates: a list with the array of barrier observation dates of each contract, which may be empty.
+        cpn_rate: an array of coupon rates.
+        notional: the notional amount, or an array of notional amounts.
+        reverse: true for reverse convertibles, false for discount certificates.
+        dtype: the dtype of the quantities and expressions.
+
+    Examples:
+        >>> tt = worst_of_autocall_batch("USD", ["AAPL", "MSFT"], [[100, 400], [110, 410]], [80, 80],
+        ...     [start, start], [maturity, maturity], [102, 105], [barrier_dates, barrier_dates], [0.092, 0.1])
+    """
+    initial_spots = np.asarray(initial_spots, dtype=dtype)
+    n = initial_spots.shape[0]
+    strike, barrier, cpn_rate, notional = (
+        np.broadcast_to(np.asarray(x, dtype=np.float64), n)
+        for x in (strike, barrier, cpn_rate, notional)
+    )
+    accrual_start = np.asarray(accrual_start, dtype="datetime64[ms]")
+    maturity = np.asarray(maturity, dtype="datetime64[ms]")
+
+    # barrier dates of all contracts, and the contract of each date
+    counts = np.array([len(d) for d in barrier_dates], dtype=np.int64)
+    dates = np.concatenate(
+        [np.asarray(d, dtype="datetime64[ms]") for d in barrier_dates]
+    )
+    owner, pos = ragged_index(counts)  # the contract, and position within it
+    first = (
+        np.cumsum(counts) - counts
+    )  # position of each contract's first date
+
+    # rows per contract: (one coupon, if reverse, and) one call per date, and the payoff
+    per_date = 2 if reverse else 1
+    block = counts * per_date + 1
+    start = np.cumsum(block) - block
+    contract = np.repeat(np.arange(n), block)
+    time = np.empty(len(contract), dtype="datetime64[ms]")
+    op = np.zeros(len(contract), dtype=np.int64)  # "+"
+    quantity = np.empty(len(contract), dtype=np.float64)
+    unit = np.zeros(len(contract), dtype=np.int64)  # ccy
+    track = 1 + contract  # "#i"
+
+    call_rows = start[owner] + pos * per_date + per_date - 1
+    time[call_rows] = dates
+    op[call_rows] = 1 + owner  # "#i.call"
+    if reverse:
+        prev = np.roll(dates, 1)
+        # contracts without barrier dates have no coupons
+        dated = counts > 0
+        prev[first[dated]] = accrual_start[dated]
+        cpn_rows = call_rows - 1
+        time[cpn_rows] = dates
+        quantity[cpn_rows] = (
+            notional[owner] * dcf_array(dates, prev) * cpn_rate[owner]
+        )
+        quantity[call_rows] = notional[owner]
+        fixed = notional
+    else:
+        frac = dcf_array(dates, accrual_start[owner])
+        quantity[call_rows] = notional[owner] * np.exp(frac * cpn_rate[owner])
+        fixed = notional * np.exp(
+            dcf_array(maturity, accrual_start) * cpn_rate
         )
-        return events
 
-    def fixed_payoff(self):
-        return self.notional
+    payoff_rows = start + block - 1
+    time[payoff_rows] = maturity
+    quantity[payoff_rows] = 1.0
+    unit[payoff_rows] = 1 + np.arange(n)  # "#i.payoff"
+    track[payoff_rows] = 0  # ""
+
+    names = [f"#{i}" for i in range(n)]
+    inv_spots = 1 / initial_spots
+    expressions = {".basket": {"type": "basket", "inp": list(asset_names)}}
+    for i, name in enumerate(names):
+        expressions[name + ".call"] = {
+            "type": "phrase",
+            "inp": [".basket"],
+            "fn": WorstOfAbove(inv_spots[i], dtype(barrier[i] / notional[i])),
+            "chunk_safe": True,
+        }
+        expressions[name + ".payoff"] = {
+            "type": "phrase",
+            "inp": [".basket"],
+            "fn": WorstOfPayoff(
+                inv_spots[i],
+                scale=dtype(notional[i]),
+                strike=dtype(strike[i]),
+                fixed=dtype(fixed[i]),
+            ),
+            "chunk_safe": True,
+        }
+
+    return portfolio_from_arrays(
+        contract,
+        time,
+        dict_array(op, ["+"] + [name + ".call" for name in names]),
+        quantity,
+        dict_array(unit, [ccy] + [name + ".payoff" for name in names]),
+        dict_array(track, [""] + names),
+        expressions,
+        dtype,
+    )
 
 
 if __name__ == "__main__":
+    import pandas as pd
+
     # Create the autocallable contract
     start = datetime(2024, 3, 31)
     maturity = datetime(2024, 7, 31)
@@ -6,8 +6,17 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import List
 
-import pandas as pd
-
+import numpy as np
+
+from qablet_contracts.eq.fns import (
+    Above,
+    Below,
+    BridgeAbove,
+    BridgeBelow,
+    SmoothAbove,
+    SmoothBelow,
+)
+from qablet_contracts.eq.kernels import add_kernels
 from qablet_contracts.eq.vanilla import Option
 from qablet_contracts.timetable import EventsMixin
 
@@ -19,6 +28,11 @@ class OptionKO(EventsMixin):
     In an **Up/Out Option** the contract is cancelled if the underlying asset price
     rises above the barrier level on any of the observation dates.
 
+    If a volatility is given, the barrier is monitored continuously, from the first barrier date to the last,
+    with a coarse schedule of barrier dates. A snapper keeps the asset price of the previous barrier date, and at each
+    barrier date after the first, the knock-out weight is the probability that the asset crossed the barrier since then,
+    if it were a Brownian bridge with that volatility (the ops of these events are `{track}.ko1`, `{track}.ko2`, ...).
+
     Args:
         ccy: the currency of the option.
         asset_name: the name of the underlying asset.
@@ -30,6 +44,11 @@ class OptionKO(EventsMixin):
         barrier_dates: the barrier observation points.
         rebate: the rebate amount paid at cancellation.
         track: an optional identifier for the contract.
+        smoothing: the width of a smoothed barrier, relative to the barrier level, e.g. 0.01 for 1%.
+            If zero, the knock-out condition is true or false, otherwise it is a weight between 0 and 1.
+        smoothing_shape: the shape of a smoothed barrier, "sigmoid" or "spread".
+        continuous_vol: the volatility of the asset, for a continuously monitored barrier.
+            If zero, the barrier is monitored on the barrier dates only.
 
     Examples:
         >>> start = datetime(2024, 3, 31)
@@ -56,19 +75,34 @@ class OptionKO(EventsMixin):
     barrier_dates: List[datetime]
     rebate: float = 0
     track: str = ""
+    smoothing: float = 0.0
+    smoothing_shape: str = "sigmoid"
+    continuous_vol: float = 0.0
 
     def events(self):
         events = []
-        for barrier_date in self.barrier_dates:
+        for i, barrier_date in enumerate(self.barrier_dates):
             events.append(
                 {
                     "track": self.track,
                     "time": barrier_date,
-                    "op": "ko",
+                    "op": f"{self.track}.ko{i}"
+                    if i and self.continuous_vol
+                    else "ko",
                     "quantity": self.rebate,
                     "unit": self.ccy,
                 }
             )
+            if self.continuous_vol and i < len(self.barrier_dates) - 1:
+                events.append(
+                    {
+                        "track": None,
+                        "time": barrier_date,
+                        "op": None,
+                        "quantity": 0,
+                        "unit": f"{self.track}.prev",  # keep the asset price
+                    }
+                )
 
         vanilla_events = Option(
             self.ccy,
@@ -82,31 +116,79 @@ class OptionKO(EventsMixin):
         events.extend(vanilla_events)
         return events
 
-    def expressions(self):
-        """Define the knockout expression (ko)."""
+    def expressions(self, dtype=np.float64):
+        """Define the knockout expression (ko), and for a continuously monitored barrier, the expressions
+        of the later barrier dates, and the snapper of the previous asset price."""
+        barrier = dtype(self.barrier)
+        width = dtype(self.smoothing * self.barrier)
         if self.barrier_type == "Dn/Out":
-
-            def ko_fn(inputs):
-                [S] = inputs
-                return [S < self.barrier]
+            ko_fn = (
+                SmoothBelow(barrier, width, self.smoothing_shape)
+                if self.smoothing
+                else Below(barrier)
+            )
         elif self.barrier_type == "Up/Out":
-
-            def ko_fn(inputs):
-                [S] = inputs
-                return [S > self.barrier]
+            ko_fn = (
+                SmoothAbove(barrier, width, self.smoothing_shape)
+                if self.smoothing
+                else Above(barrier)
+            )
         else:
             raise ValueError(f"Unknown barrier type: {self.barrier_type}")
 
-        return {
+        expressions = {
             "ko": {
                 "type": "phrase",
                 "inp": [self.asset_name],
                 "fn": ko_fn,
+                "grad": ko_fn.grad,
+                "chunk_safe": True,
+            }
+        }
+        if self.continuous_vol:
+            expressions.update(self._bridge_expressions(dtype))
+        return add_kernels(expressions)
+
+    def _bridge_expressions(self, dtype):
+        s_prev = f"{self.track}.S_PREV"
+
+        def prev_fn(inputs):
+            return inputs
+
+        def prev_grad(inputs, width=0.0):
+            return [[1.0]]
+
+        expressions = {
+            f"{self.track}.prev": {
+                "type": "snapper",
+                "inp": [self.asset_name],
+                "fn": prev_fn,
+                "grad": prev_grad,
+                "out": [s_prev],
+                "chunk_safe": True,
             }
         }
+        # the variance of the log of the asset over each period, in years (act/365)
+        dates = np.asarray(self.barrier_dates, dtype="datetime64[ms]")
+        years = np.diff(dates) / np.timedelta64(365 * 86400000, "ms")
+        bridge = BridgeBelow if self.barrier_type == "Dn/Out" else BridgeAbove
+        for i, dt in enumerate(years, 1):
+            ko_fn = bridge(
+                dtype(self.barrier), dtype(self.continuous_vol**2 * dt)
+            )
+            expressions[f"{self.track}.ko{i}"] = {
+                "type": "phrase",
+                "inp": [self.asset_name, s_prev],
+                "fn": ko_fn,
+                "grad": ko_fn.grad,
+                "chunk_safe": True,
+            }
+        return expressions
 
 
 if __name__ == "__main__":
+    import pandas as pd
+
     # Create the ko option
     start = datetime(2024, 3, 31)
     maturity = datetime(2024, 9, 30)
@@ -7,8 +7,13 @@ from datetime import datetime
 from typing import List
 
 import numpy as np
-import pandas as pd
 
+from qablet_contracts.eq.fns import (
+    AccumulatorInit,
+    AccumulatorPath,
+    AccumulatorUpdate,
+)
+from qablet_contracts.eq.kernels import add_kernels
 from qablet_contracts.timetable import EventsMixin
 
 
@@ -95,46 +100,43 @@ class Accumulator(EventsMixin):
         )
         return events
 
-    def expressions(self):
-        last_acc = self.state.get("ACC", 0.0)
-
-        if "S_PREV" in self.state:
-
-            def accumulator_init_fn(inputs):
-                [s] = inputs
-                return [last_acc, self.state["S_PREV"]]  # [ACC, S_PREV]
-        else:
-
-            def accumulator_init_fn(inputs):
-                [s] = inputs
-                return [last_acc, s]  # [ACC, S_PREV]
-
-        def accumulator_update_fn(inputs):
-            [s, s_prev, a] = inputs
-
-            ret = s / s_prev - 1.0  # ret = S / S_PREV - 1
-            ret = np.maximum(self.local_floor, ret)
-            ret = np.minimum(self.local_cap, ret)
-
-            return [a + ret, s]  # [ACC, S_PREV]
+    def expressions(self, dtype=np.float64):
+        # Constants are computed once, and cast to dtype so that float32 paths are not promoted.
+        s_prev = self.state.get("S_PREV")
+        accumulator_init_fn = AccumulatorInit(
+            dtype(self.state.get("ACC", 0.0)),
+            None if s_prev is None else dtype(s_prev),
+        )
+        local_floor, local_cap = dtype(self.local_floor), dtype(self.local_cap)
+        accumulator_update_fn = AccumulatorUpdate(local_floor, local_cap)
 
-        return {
-            "start": {
-                "type": "snapper",
-                "inp": [self.asset_name],
-                "fn": accumulator_init_fn,
-                "out": ["ACC", "S_PREV"],
-            },
-            "addfix": {
-                "type": "snapper",
-                "inp": [self.asset_name, "S_PREV", "ACC"],
-                "fn": accumulator_update_fn,
-                "out": ["ACC", "S_PREV"],
-            },
-        }
+        return add_kernels(
+            {
+                "start": {
+                    "type": "snapper",
+                    "inp": [self.asset_name],
+                    "fn": accumulator_init_fn,
+                    "grad": accumulator_init_fn.grad,
+                    "out": ["ACC", "S_PREV"],
+                    "chunk_safe": True,
+                },
+                "addfix": {
+                    "type": "snapper",
+                    "inp": [self.asset_name, "S_PREV", "ACC"],
+                    "fn": accumulator_update_fn,
+                    "grad": accumulator_update_fn.grad,
+                    "out": ["ACC", "S_PREV"],
+                    "chunk_safe": True,
+                    # all the fixings at once, for engines that hold the whole path
+                    "path_fn": AccumulatorPath(local_floor, local_cap),
+                },
+            }
+        )
 
 
 if __name__ == "__main__":
+    import pandas as pd
+
     # Create the cliquet
     fix_dates = pd.bdate_range(
         datetime(2021, 12, 31), datetime(2024, 12, 31), freq="2BQE"
@@ -0,0 +1,362 @@
+"""
+This module contains the phrase and snapper functions used by the equity contracts.
+The contract constants are computed once, when the contract's expressions are created,
+and stored in these function objects, so that each call does only the path calculations.
+
+Most functions also have a `grad` method, with the partial derivatives of each output with respect to each input,
+i.e. a list (one per output) of lists (one per input), for pathwise derivatives. A condition is a step,
+whose derivative is zero, unless a smoothing width is given, in the units of the asset. The step is then
+replaced by a logistic function of that width, i.e. with the slope of a call spread of that width at the level,
+and grad is the derivative of the smoothed function.
+"""
+
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def _step(x, width):
+    """The logistic step of the given width, at a distance x from the level, i.e. 1 / (1 + exp(-4 x / width)),
+    whose slope at the level, 1 / width, is the same as a call spread of that width."""
+    return 0.5 * (1 + np.tanh(2 * x / width))
+
+
+def _step_slope(x, width):
+    """The derivative of the logistic step of the given width, at a distance x from the level."""
+    return (1 - np.tanh(2 * x / width) ** 2) / width
+
+
+@dataclass(frozen=True)
+class Above:
+    """A condition that is true if the input is above the level."""
+
+    level: float
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [S > self.level]
+
+    def grad(self, inputs, width=0.0):
+        [S] = inputs
+        if width == 0:
+            return [[0.0]]
+        return [[_step_slope(S - self.level, width)]]
+
+
+@dataclass(frozen=True)
+class Below:
+    """A condition that is true if the input is below the level."""
+
+    level: float
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [S < self.level]
+
+    def grad(self, inputs, width=0.0):
+        [S] = inputs
+        if width == 0:
+            return [[0.0]]
+        return [[-_step_slope(S - self.level, width)]]
+
+
+SMOOTHING_SHAPES = ["sigmoid", "spread"]
+
+
+def _check_shape(shape):
+    if shape not in SMOOTHING_SHAPES:
+        raise ValueError(f"Unknown smoothing shape: {shape}")
+
+
+def _smooth_step(x, width, shape):
+    """A step from 0 to 1, of the given width, at a distance x from the level."""
+    if shape == "sigmoid":
+        return _step(x, width)
+    return np.clip(x / width + 0.5, 0.0, 1.0)
+
+
+def _smooth_step_slope(x, width, shape):
+    if shape == "sigmoid":
+        return _step_slope(x, width)
+    return np.where(np.abs(x) < width / 2, 1 / width, 0.0)
+
+
+@dataclass(frozen=True)
+class SmoothAbove:
+    """A fractional condition, which rises smoothly from 0 below the level, to 1 above it, over the width.
+    The shape is "sigmoid", a logistic function, or "spread", a call spread centered on the level."""
+
+    level: float
+    width: float
+    shape: str = "sigmoid"
+
+    def __post_init__(self):
+        _check_shape(self.shape)
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [_smooth_step(S - self.level, self.width, self.shape)]
+
+    def grad(self, inputs, width=0.0):
+        [S] = inputs
+        return [[_smooth_step_slope(S - self.level, self.width, self.shape)]]
+
+
+@dataclass(frozen=True)
+class SmoothBelow:
+    """A fractional condition, which falls smoothly from 1 below the level, to 0 above it, over the width.
+    The shape is "sigmoid", a logistic function, or "spread", a put spread centered on the level."""
+
+    level: float
+    width: float
+    shape: str = "sigmoid"
+
+    def __post_init__(self):
+        _check_shape(self.shape)
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [_smooth_step(self.level - S, self.width, self.shape)]
+
+    def grad(self, inputs, width=0.0):
+        [S] = inputs
+        return [[-_smooth_step_slope(self.level - S, self.width, self.shape)]]
+
+
+def _bridge(d, d_prev, variance):
+    """The probability that a Brownian bridge, with the given variance, crosses zero between two points
+    at distances d_prev and d from zero, on the same side, and its derivatives with respect to d and d_prev."""
+    d, d_prev = np.maximum(d, 0.0), np.maximum(d_prev, 0.0)
+    p = np.exp(-2 * d * d_prev / variance)
+    return p, -2 * d_prev / variance * p, -2 * d / variance * p
+
+
+@dataclass(frozen=True)
+class BridgeAbove:
+    """The knock-out weight of an up barrier that is monitored continuously, between the previous fixing and this one.
+    It is 1 if the asset is above the level, otherwise the probability that the log of the asset, as a Brownian bridge
+    with the given variance over the period, crossed the level."""
+
+    level: float
+    variance: float
+
+    def __call__(self, inputs):
+        [S, s_prev] = inputs
+        p, _, _ = _bridge(
+            np.log(self.level / S), np.log(self.level / s_prev), self.variance
+        )
+        return [np.where(S > self.level, 1.0, p)]
+
+    def grad(self, inputs, width=0.0):
+        [S, s_prev] = inputs
+        d, d_prev = np.log(self.level / S), np.log(self.level / s_prev)
+        _, dp, dp_prev = _bridge(d, d_prev, self.variance)
+        inside = (d > 0) & (d_prev > 0)
+        return [
+            [
+                np.where(inside, -dp / S, 0.0),
+                np.where(inside, -dp_prev / s_prev, 0.0),
+            ]
+        ]
+
+
+@dataclass(frozen=True)
+class BridgeBelow:
+    """The knock-out weight of a down barrier that is monitored continuously, see BridgeAbove."""
+
+    level: float
+    variance: float
+
+    def __call__(self, inputs):
+        [S, s_prev] = inputs
+        p, _, _ = _bridge(
+            np.log(S / self.level), np.log(s_prev / self.level), self.variance
+        )
+        return [np.where(S < self.level, 1.0, p)]
+
+    def grad(self, inputs, width=0.0):
+        [S, s_prev] = inputs
+        d, d_prev = np.log(S / self.level), np.log(s_prev / self.level)
+        _, dp, dp_prev = _bridge(d, d_prev, self.variance)
+        inside = (d > 0) & (d_prev > 0)
+        return [
+            [
+                np.where(inside, dp / S, 0.0),
+                np.where(inside, dp_prev / s_prev, 0.0),
+            ]
+        ]
+
+
+@dataclass(frozen=True)
+class DiscountPayoff:
+    """The payoff of a discount certificate, i.e. the scaled asset price if it is below
+    the strike, and the fixed payoff otherwise."""
+
+    scale: float
+    strike: float
+    fixed: float
+
+    def __call__(self, inputs):
+        [s] = inputs
+        eq_pay = s * self.scale
+        return [np.where(eq_pay < self.strike, eq_pay, self.fixed)]
+
+    def grad(self, inputs, width=0.0):
+        [s] = inputs
+        eq_pay = s * self.scale
+        if width == 0:
+            return [[np.where(eq_pay < self.strike, self.scale, 0.0)]]
+        # the weight of eq_pay, below the strike
+        x = s - self.strike / self.scale
+        below = _step(-x, width)
+        slope = _step_slope(x, width)
+        return [[below * self.scale - (eq_pay - self.fixed) * slope]]
+
+
+@dataclass(frozen=True)
+class AccumulatorInit:
+    """Initialize an accumulator and the previous fixing. If s_prev is None, the previous fixing
+    is set to the current asset price."""
+
+    acc: float
+    s_prev: float = None
+
+    def __call__(self, inputs):
+        [s] = inputs
+        if self.s_prev is None:
+            return [self.acc, s]  # [ACC, S_PREV]
+        return [self.acc, self.s_prev]  # [ACC, S_PREV]
+
+    def grad(self, inputs, width=0.0):
+        return [[0.0], [1.0 if self.s_prev is None else 0.0]]
+
+
+@dataclass(frozen=True)
+class AccumulatorUpdate:
+    """Add the return since the previous fixing to the accumulator, subject to a local floor and cap."""
+
+    local_floor: float
+    local_cap: float
+
+    def __call__(self, inputs):
+        [s, s_prev, a] = inputs
+
+        ret = s / s_prev - 1.0  # ret = S / S_PREV - 1
+        ret = np.maximum(self.local_floor, ret)
+        ret = np.minimum(self.local_cap, ret)
+
+        return [a + ret, s]  # [ACC, S_PREV]
+
+    def grad(self, inputs, width=0.0):
+        [s, s_prev, _] = inputs
+
+        ret = s / s_prev - 1.0
+        inside = (ret > self.local_floor) & (ret < self.local_cap)
+        ds = np.where(inside, 1.0 / s_prev, 0.0)
+
+        return [[ds, -ds * s / s_prev, 1.0], [1.0, 0.0, 0.0]]
+
+
+@dataclass(frozen=True)
+class AccumulatorPath:
+    """The whole-path form of AccumulatorUpdate, which adds the returns of all the fixings in one call.
+    The asset input is a 2-D array (fixings x paths), the other inputs are the snaps before the first fixing.
+    The returns are computed in place, a block of fixings at a time, so that the temporaries fit in cache."""
+
+    local_floor: float
+    local_cap: float
+    block_size: int = 65536  # the number of elements in a block
+
+    def __call__(self, inputs):
+        [s, s_prev, a] = inputs
+
+        ret = s[0] / s_prev - 1.0
+        acc = a + np.clip(ret, self.local_floor, self.local_cap)
+        rows = max(1, self.block_size // max(1, s[0].size))
+        buf = np.empty((min(rows, len(s)),) + s.shape[1:], dtype=ret.dtype)
+        for i in range(1, len(s), rows):
+            j = min(i + rows, len(s))
+            ret = np.divide(s[i:j], s[i - 1 : j - 1], out=buf[: j - i])
+            ret -= 1.0
+            np.clip(ret, self.local_floor, self.local_cap, out=ret)
+            acc += ret.sum(axis=0)
+
+        return [acc, s[-1]]  # [ACC, S_PREV]
+
+
+@dataclass(frozen=True, eq=False)
+class BestOf:
+    """The best of the weighted assets of a basket. The input is a 2-D array (assets x paths),
+    and weights is a 1-D array with one weight per asset."""
+
+    weights: np.ndarray
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [np.max(S * self.weights[:, None], axis=0)]
+
+
+@dataclass(frozen=True, eq=False)
+class WorstOf:
+    """The worst of the weighted assets of a basket. The input is a 2-D array (assets x paths),
+    and weights is a 1-D array with one weight per asset."""
+
+    weights: np.ndarray
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [np.min(S * self.weights[:, None], axis=0)]
+
+
+_scratch = threading.local()
+
+
+def _buffer(shape, dtype) -> np.ndarray:
+    """A scratch buffer, allocated once per thread, and reused while the shape and dtype don't change."""
+    buf = getattr(_scratch, "buf", None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = np.empty(shape, dtype=dtype)
+        _scratch.buf = buf
+    return buf
+
+
+@dataclass(frozen=True, eq=False)
+class WorstPerformance:
+    """The worst performance of a basket, i.e. the minimum over assets of the asset price
+    divided by its initial price. The input is a 2-D array (assets x paths).
+    The performances are calculated in a scratch buffer which is reused in each call,
+    e.g. over all observation dates, and all contracts."""
+
+    inv_spots: np.ndarray
+
+    def worst(self, S):
+        buf = _buffer(S.shape, np.result_type(S, self.inv_spots))
+        np.multiply(S, self.inv_spots[:, None], out=buf)
+        return buf.min(axis=0)
+
+
+@dataclass(frozen=True, eq=False)
+class WorstOfAbove(WorstPerformance):
+    """A condition that is true if the worst performance of a basket is above the level."""
+
+    level: float = 1.0
+
+    def __call__(self, inputs):
+        [S] = inputs
+        return [self.worst(S) > self.level]
+
+
+@dataclass(frozen=True, eq=False)
+class WorstOfPayoff(WorstPerformance):
+    """The payoff of a worst-of discount certificate, i.e. the worst performance scaled by the notional
+    if it is below the strike, and the fixed payoff otherwise."""
+
+    scale: float = 1.0
+    strike: float = 0.0
+    fixed: float = 0.0
+
+    def __call__(self, inputs):
+        [S] = inputs
+        eq_pay = self.worst(S) * self.scale
+        return [np.where(eq_pay < self.strike, eq_pay, self.fixed)]
@@ -5,6 +5,8 @@ This module contains examples of forward starting options.
 from dataclasses import dataclass
 from datetime import datetime
 
+import numpy as np
+
 from qablet_contracts.timetable import EventsMixin
 
 
@@ -73,16 +75,21 @@ class ForwardOption(EventsMixin):
             },
         ]
 
-    def expressions(self):
+    def expressions(self, dtype=np.float64):
         # Define the strike expression, return the spot itself.
         def strike_fn(inputs):
             return inputs
 
+        # the strike moves one for one with the spot
+        def strike_grad(inputs, width=0.0):
+            return [[1.0]]
+
         return {
             f"{self.track}.fix_K": {
                 "type": "snapper",
                 "inp": [self.asset_name],
                 "fn": strike_fn,
+                "grad": strike_grad,
                 "out": [f"{self.track}.K"],
             }
         }
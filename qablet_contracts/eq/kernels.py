@@ -0,0 +1,157 @@
+"""
+This module contains optional numba kernels for the phrase and snapper functions in
+[fns][qablet_contracts.eq.fns]. Each kernel makes a single pass over the path arrays,
+without temporaries. Inputs of any shape, e.g. the paths of a basket, are broadcast against
+each other and flattened for the pass. The kernels are only available if numba is installed.
+
+A kernel has the same signature as the **fn** of the expression, and returns exactly the same
+result, so an engine that understands the `"kernel"` key of an expression can call it instead of **fn**.
+Other engines ignore it and call **fn**.
+"""
+
+import importlib.util
+from functools import cache
+from typing import Dict
+
+import numpy as np
+
+from qablet_contracts.eq.fns import (
+    Above,
+    AccumulatorUpdate,
+    Below,
+    DiscountPayoff,
+)
+
+
+def _above(s, level, out):
+    for i in range(out.shape[0]):
+        out[i] = s[i] > level
+
+
+def _below(s, level, out):
+    for i in range(out.shape[0]):
+        out[i] = s[i] < level
+
+
+def _discount_payoff(s, scale, strike, fixed, out):
+    for i in range(out.shape[0]):
+        eq_pay = s[i] * scale
+        out[i] = eq_pay if eq_pay < strike else fixed
+
+
+def _accumulator_update(s, s_prev, a, one, local_floor, local_cap, out):
+    for i in range(out.shape[0]):
+        ret = max(s[i] / s_prev[i] - one, local_floor)
+        out[i] = a[i] + min(ret, local_cap)
+
+
+@cache
+def _has_numba() -> bool:
+    return importlib.util.find_spec("numba") is not None
+
+
+@cache
+def _jit(loop):
+    """Compile a loop with numba, the first time it is needed, so that numba is not imported
+    with this module."""
+    import numba
+
+    return numba.njit(cache=True)(loop)
+
+
+def _as_1d(*arrays):
+    """Broadcast the inputs against each other, and return their shape, and the inputs as 1-D arrays."""
+    arrays = np.broadcast_arrays(*(np.atleast_1d(x) for x in arrays))
+    return arrays[0].shape, [np.ravel(x) for x in arrays]
+
+
+def _above_kernel(fn: Above):
+    level = fn.level
+
+    def kernel(inputs):
+        shape, [S] = _as_1d(*inputs)
+        out = np.empty(S.shape, dtype=np.bool_)
+        _jit(_above)(S, np.result_type(S, level).type(level), out)
+        return [out.reshape(shape)]
+
+    return kernel
+
+
+def _below_kernel(fn: Below):
+    level = fn.level
+
+    def kernel(inputs):
+        shape, [S] = _as_1d(*inputs)
+        out = np.empty(S.shape, dtype=np.bool_)
+        _jit(_below)(S, np.result_type(S, level).type(level), out)
+        return [out.reshape(shape)]
+
+    return kernel
+
+
+def _discount_payoff_kernel(fn: DiscountPayoff):
+    scale, strike, fixed = fn.scale, fn.strike, fn.fixed
+
+    def kernel(inputs):
+        shape, [s] = _as_1d(*inputs)
+        pay_type = np.result_type(s, scale)
+        out = np.empty(s.shape, dtype=np.result_type(pay_type, fixed))
+        _jit(_discount_payoff)(
+            s,
+            pay_type.type(scale),
+            np.result_type(pay_type, strike).type(strike),
+            fixed,
+            out,
+        )
+        return [out.reshape(shape)]
+
+    return kernel
+
+
+def _accumulator_update_kernel(fn: AccumulatorUpdate):
+    local_floor, local_cap = fn.local_floor, fn.local_cap
+
+    def kernel(inputs):
+        shape, [s, s_prev, a] = _as_1d(*inputs)
+        # use the same dtypes as numpy for each step of the calculation
+        ret_type = np.result_type(s, s_prev)
+        floor_type = np.result_type(ret_type, local_floor)
+        cap_type = np.result_type(floor_type, local_cap)
+        out = np.empty(s.shape, dtype=np.result_type(a, cap_type))
+        _jit(_accumulator_update)(
+            s,
+            s_prev,
+            a,
+            ret_type.type(1.0),
+            floor_type.type(local_floor),
+            cap_type.type(local_cap),
+            out,
+        )
+        return [out.reshape(shape), inputs[0]]  # [ACC, S_PREV]
+
+    return kernel
+
+
+_KERNELS = {
+    Above: _above_kernel,
+    Below: _below_kernel,
+    DiscountPayoff: _discount_payoff_kernel,
+    AccumulatorUpdate: _accumulator_update_kernel,
+}
+
+
+def kernel(fn):
+    """Return the numba kernel for a function, or None if numba is not installed,
+    or if there is no kernel for this function."""
+    if type(fn) not in _KERNELS or not _has_numba():
+        return None
+    return _KERNELS[type(fn)](fn)
+
+
+def add_kernels(expressions: Dict) -> Dict:
+    """Add a `"kernel"` to each expression that has one, and return the expressions."""
+    for expr in expressions.values():
+        k = kernel(expr["fn"])
+        if k is not None:
+            expr["kernel"] = k
+    return expressions
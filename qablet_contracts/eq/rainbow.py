@@ -6,6 +6,9 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import List
 
+import numpy as np
+
+from qablet_contracts.eq.fns import BestOf, WorstOf
 from qablet_contracts.timetable import EventsMixin
 
 
@@ -83,6 +86,81 @@ class Rainbow(EventsMixin):
         return events
 
 
+@dataclass
+class BasketRainbow(Rainbow):
+    """A **Rainbow Option** on a basket. It has the same payoff as the [Rainbow][qablet_contracts.eq.rainbow.Rainbow] option,
+    but instead of one choice per asset, the assets are stacked into a named basket, and a single phrase
+    computes the best of (for a call) or the worst of (for a put) the assets, in units of their strikes.
+    The number of events, and the number of asset lookups per step, don't depend on the number of assets.
+
+    Args:
+        ccy: the currency of the option.
+        asset_names: the name of the underlying assets.
+        strikes: the option strikes.
+        notional: the notional of the option.
+        maturity: the maturity of the option.
+        is_call: true if the option is a call.
+        track: an optional identifier for the contract.
+
+    Examples:
+        >>> assets = ["SPX", "FTSE", "N225"]
+        >>> strikes = [5087, 7684, 39100]
+        >>> BasketRainbow("USD", assets, strikes, 100_000, datetime(2024, 3, 31), True).print_events()
+              time op  quantity  unit track
+        03/31/2024  + -100000.0   USD
+        03/31/2024  >  100000.0 .best
+        03/31/2024  +  100000.0   USD
+    """
+
+    def phrase_name(self):
+        return self.track + (".best" if self.is_call else ".worst")
+
+    def events(self):
+        sign = 1 if self.is_call else -1
+        return [
+            # Pay the initial strike
+            {
+                "track": "",
+                "time": self.maturity,
+                "op": "+",
+                "quantity": -self.notional * sign,
+                "unit": self.ccy,
+            },
+            # Option to receive the best (or worst) of the assets
+            {
+                "track": "",
+                "time": self.maturity,
+                "op": ">",
+                "quantity": self.notional * sign,
+                "unit": self.phrase_name(),
+            },
+            # Otherwise receive the notional back
+            {
+                "track": "",
+                "time": self.maturity,
+                "op": "+",
+                "quantity": self.notional * sign,
+                "unit": self.ccy,
+            },
+        ]
+
+    def expressions(self, dtype=np.float64):
+        basket = self.track + ".basket"
+        weights = 1 / np.asarray(self.strikes, dtype=dtype)
+        return {
+            basket: {
+                "type": "basket",
+                "inp": list(self.asset_names),
+            },
+            self.phrase_name(): {
+                "type": "phrase",
+                "inp": [basket],
+                "fn": BestOf(weights) if self.is_call else WorstOf(weights),
+                "chunk_safe": True,
+            },
+        }
+
+
 if __name__ == "__main__":
     # Create the rainbow option
     Rainbow(
@@ -93,3 +171,12 @@ if __name__ == "__main__":
         datetime(2024, 3, 31),
         True,
     ).print_events()
+
+    BasketRainbow(
+        "USD",
+        ["SPX", "FTSE", "N225"],
+        [5087, 7684, 39100],
+        100_000,
+        datetime(2024, 3, 31),
+        True,
+    ).print_events()
@@ -0,0 +1,472 @@
+"""
+This module contains utilities to evaluate the phrases and snappers of a timetable
+over arrays of paths, optionally splitting the paths into chunks, and to profile them.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def is_chunk_safe(expressions: Dict) -> bool:
+    """Return True if every expression is declared chunk-safe.
+
+    An expression is chunk-safe if its **fn** treats each path independently, and
+    keeps no state between calls other than its snaps. Evaluating it over a slice of
+    the paths then gives the same slice of the result, so the paths can be split into
+    chunks and the chunks evaluated in any order, or in parallel.
+    An expression declares this with the key `"chunk_safe": True`. A basket has no
+    **fn**, and is always chunk-safe.
+
+    Args:
+        expressions: the expressions dictionary of a timetable.
+    """
+    return all(
+        expr.get("chunk_safe", False)
+        for expr in expressions.values()
+        if expr["type"] != "basket"
+    )
+
+
+def eval_expression(expressions: Dict, name: str, values: Dict) -> List:
+    """Evaluate a phrase or a snapper, and return its list of outputs.
+
+    Inputs which are phrases themselves are evaluated first. The outputs of a snapper
+    are also stored in values, under the names given by its **out**.
+
+    Args:
+        expressions: the expressions dictionary of a timetable.
+        name: the name of the phrase or snapper.
+        values: a dict of asset, basket and snap values.
+    """
+    expr = expressions[name]
+    inputs = [_eval_input(expressions, inp, values) for inp in expr["inp"]]
+    outputs = expr["fn"](inputs)
+    if expr["type"] == "snapper":
+        values.update(zip(expr["out"], outputs))
+    return outputs
+
+
+def eval_grad(
+    expressions: Dict, name: str, values: Dict, width: float = 0.0
+) -> List[List]:
+    """Evaluate the partial derivatives of the outputs of a phrase or a snapper with respect to its inputs,
+    with its `"grad"`, i.e. a list (one per output) of lists (one per input). Inputs which are phrases
+    are evaluated first, but their derivatives are not chained.
+
+    Args:
+        expressions: the expressions dictionary of a timetable.
+        name: the name of the phrase or snapper.
+        values: a dict of asset, basket and snap values.
+        width: the smoothing width of conditions, in the units of the asset. If zero, the derivative
+            of a condition is zero.
+
+    Examples:
+        >>> tt = DiscountCert("USD", "EQ", 100, 80, start, maturity, 102, barrier_dates, 0.1).timetable()
+        >>> [[d_payoff]] = eval_grad(tt["expressions"], "payoff", {"EQ": paths["EQ"][-1]})
+    """
+    expr = expressions[name]
+    inputs = [_eval_input(expressions, inp, values) for inp in expr["inp"]]
+    return expr["grad"](inputs, width)
+
+
+def eval_path_snapper(
+    expressions: Dict, name: str, paths: Dict, steps, snaps: Dict
+) -> List:
+    """Evaluate all the events of a snapper at once, with its `"path_fn"`, and return its list of outputs,
+    i.e. the snaps after its last event. The outputs are also stored in snaps.
+
+    Each input that is an asset is a 2-D array (events x paths), with the asset at the step of each event,
+    and each input that is a snap has its value before the first event.
+
+    Args:
+        expressions: the expressions dictionary of a timetable.
+        name: the name of the snapper.
+        paths: a dict of asset names to arrays of shape (steps, num_paths).
+        steps: the step of each event of the snapper, i.e. the index into the first axis of the paths.
+        snaps: the values of the snaps before the first event.
+
+    Examples:
+        >>> tt = Accumulator("USD", "SPX", fix_dates, 0.0, -0.03, 0.05).timetable()
+        >>> snaps = {"ACC": 0.0, "S_PREV": paths["SPX"][0]}
+        >>> acc, s_prev = eval_path_snapper(tt["expressions"], "addfix", paths, range(1, len(fix_dates)), snaps)
+    """
+    expr = expressions[name]
+    steps = np.asarray(steps)
+    if len(steps) > 1 and (np.diff(steps) == 1).all():
+        steps = slice(steps[0], steps[-1] + 1)  # a view of the paths
+    inputs = [
+        snaps[inp] if inp in snaps else paths[inp][steps]
+        for inp in expr["inp"]
+    ]
+    outputs = expr["path_fn"](inputs)
+    snaps.update(zip(expr["out"], outputs))
+    return outputs
+
+
+def _eval_input(expressions: Dict, name: str, values: Dict):
+    """Return the value of an input, which can be an asset, a snap, a phrase, or a basket.
+    A basket is stacked from its assets, unless values already has the stacked array."""
+    kind = expressions.get(name, {}).get("type")
+    if kind == "phrase":
+        return eval_expression(expressions, name, values)[0]
+    if kind == "basket":
+        try:
+            return values[name]
+        except KeyError:
+            assets = [values[asset] for asset in expressions[name]["inp"]]
+            return np.stack(np.broadcast_arrays(*assets))
+    return values[name]
+
+
+def _slice(value, sl: slice):
+    """Slice the path axis (the last axis) of a value, unless it is a scalar or size 1."""
+    if np.ndim(value) == 0 or np.shape(value)[-1] == 1:
+        return value
+    return value[..., sl]
+
+
+def _broadcast(value, size: int):
+    """Broadcast the path axis (the last axis) of a value to size, e.g. a scalar to an array of size paths."""
+    shape = np.shape(value)
+    return np.broadcast_to(value, shape[:-1] + (size,) if shape else (size,))
+
+
+class _StepValues(dict):
+    """Values at one step for a chunk of paths, sliced from the paths on first access."""
+
+    def __init__(self, paths: Dict, step: int, sl: slice, snaps: Dict):
+        super().__init__(snaps)
+        self._paths = paths
+        self._step = step
+        self._sl = sl
+
+    def __missing__(self, key):
+        value = _slice(self._paths[key][self._step], self._sl)
+        self[key] = value
+        return value
+
+
+def _eval_chunk(
+    expressions: Dict,
+    steps: List[Tuple[int, str]],
+    paths: Dict,
+    snaps: Dict,
+    sl: slice,
+    size: int,
+):
+    """Evaluate all steps for one chunk of paths, carrying the snaps of the chunk."""
+    snaps = {k: _slice(v, sl) for k, v in snaps.items()}
+    results = []
+    for step, name in steps:
+        values = _StepValues(paths, step, sl, snaps)
+        outputs = eval_expression(expressions, name, values)
+        if expressions[name]["type"] == "snapper":
+            snaps.update(zip(expressions[name]["out"], outputs))
+        results.append([_broadcast(out, size) for out in outputs])
+    snaps = {k: _broadcast(v, size) for k, v in snaps.items()}
+    return results, snaps
+
+
+def evaluate_chunked(
+    expressions: Dict,
+    steps: List[Tuple[int, str]],
+    paths: Dict,
+    num_paths: int,
+    snaps: Optional[Dict] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    executor=None,
+):
+    """Evaluate a sequence of phrases and snappers over chunks of paths.
+
+    Each chunk carries its own snaps from one step to the next, so the working set is
+    limited to the size of a chunk. If an executor is given, e.g. a
+    `concurrent.futures.ThreadPoolExecutor`, the chunks are evaluated in parallel.
+    If any of the expressions is not [chunk-safe][qablet_contracts.expr.is_chunk_safe],
+    all paths are evaluated in a single chunk.
+
+    Args:
+        expressions: the expressions dictionary of a timetable.
+        steps: a list of (step, name) tuples, where step is the index into the
+            first axis of the path arrays, and name is the phrase or snapper to evaluate.
+        paths: a dict of asset names to arrays of shape (steps, ..., num_paths).
+        num_paths: the number of paths.
+        snaps: the initial values of the snaps, if any.
+        chunk_size: the number of paths in each chunk.
+        executor: an optional executor to evaluate the chunks.
+
+    Returns:
+        A tuple of (outputs, snaps), where outputs is a list with the outputs of each step,
+        and snaps is a dict with the final value of each snap. The last axis of all arrays has size num_paths.
+
+    Examples:
+        >>> tt = OptionKO("USD", "EQ", 100, maturity, True, 102, "Up/Out", barrier_dates).timetable()
+        >>> paths = {"EQ": np.random.lognormal(4.6, 0.1, (4, 1_000_000))}
+        >>> steps = [(i, "ko") for i in range(4)]
+        >>> outputs, _ = evaluate_chunked(tt["expressions"], steps, paths, 1_000_000)
+    """
+    snaps = snaps or {}
+    if not is_chunk_safe(expressions):
+        chunk_size = num_paths
+    chunk_size = max(1, chunk_size)
+
+    # with no paths, a single empty chunk gives outputs of the right shape and dtype
+    bounds = range(0, num_paths, chunk_size) or [0]
+
+    def run(start):
+        stop = min(start + chunk_size, num_paths)
+        return _eval_chunk(
+            expressions, steps, paths, snaps, slice(start, stop), stop - start
+        )
+
+    if executor is None:
+        chunks = [run(start) for start in bounds]
+    else:
+        chunks = list(executor.map(run, bounds))
+
+    outputs = [
+        [
+            np.concatenate([chunk[0][i][j] for chunk in chunks], axis=-1)
+            for j in range(len(chunks[0][0][i]))
+        ]
+        for i in range(len(steps))
+    ]
+    final_snaps = {
+        k: np.concatenate([chunk[1][k] for chunk in chunks], axis=-1)
+        for k in chunks[0][1]
+    }
+    return outputs, final_snaps
+
+
+def compare_precision(
+    contract,
+    steps: List[Tuple[int, str]],
+    paths: Dict,
+    num_paths: int,
+    dtype=np.float32,
+    atol: float = 1e-8,
+    **kwargs,
+) -> List[Dict]:
+    """Evaluate the expressions of a contract over the same paths in float64, and in a lower
+    precision dtype, and report the differences for each output of each step.
+
+    Args:
+        contract: the contract, whose timetable accepts a dtype.
+        steps: a list of (step, name) tuples, see [evaluate_chunked][qablet_contracts.expr.evaluate_chunked].
+        paths: a dict of asset names to float64 arrays of shape (steps, ..., num_paths).
+        num_paths: the number of paths.
+        dtype: the lower precision dtype.
+        atol: the relative error is over the paths where the absolute float64 value is above atol,
+            the others are only in the absolute error.
+        kwargs: other arguments to evaluate_chunked.
+
+    Returns:
+        A list of dicts, one for each output, with the step, name, output dtype, the max absolute
+        and relative error for float outputs, and the fraction of mismatched paths for bool outputs.
+    """
+    results = {}
+    for dt in [np.float64, dtype]:
+        expressions = contract.timetable(dtype=dt)["expressions"]
+        dt_paths = {k: v.astype(dt) for k, v in paths.items()}
+        results[dt], _ = evaluate_chunked(
+            expressions, steps, dt_paths, num_paths, **kwargs
+        )
+
+    report = []
+    for (step, name), ref_outs, outs in zip(
+        steps, results[np.float64], results[dtype]
+    ):
+        for ref, out in zip(ref_outs, outs):
+            row = {"step": step, "name": name, "dtype": out.dtype}
+            if out.dtype == bool:
+                row["mismatch"] = np.mean(ref != out)
+            else:
+                err = np.abs(out.astype(np.float64) - ref)
+                scale = np.abs(ref)
+                large = scale > atol
+                row["max_abs_error"] = err.max(initial=0.0)
+                row["max_rel_error"] = (err[large] / scale[large]).max(
+                    initial=0.0
+                )
+            report.append(row)
+    return report
+
+
+def _path_size(values) -> int:
+    """The number of paths of the values, i.e. the largest size of their last axis."""
+    return max((np.shape(v)[-1] for v in values if np.ndim(v) > 0), default=1)
+
+
+def _float_itemsize(values) -> int:
+    """The largest itemsize of the float arrays among the values, considering only the arrays
+    over the paths, if there are any. Python floats don't change the dtype of a result."""
+    arrays = [
+        v
+        for v in values
+        if isinstance(v, (np.ndarray, np.generic))
+        and np.issubdtype(v.dtype, np.floating)
+    ]
+    paths = [v for v in arrays if np.size(v) > 1]
+    return max((v.dtype.itemsize for v in paths or arrays), default=0)
+
+
+# the counters that are added up in the report by group
+_TOTALS = ["calls", "seconds", "output_bytes", "upcast", "broadcast"]
+
+
+class _Instrumented:
+    """A phrase or snapper function that records its calls in a profile."""
+
+    def __init__(self, fn, profile, key):
+        self.fn = fn
+        self.profile = profile
+        self.key = key
+
+    def __call__(self, inputs):
+        start = time.perf_counter()
+        outputs = self.fn(inputs)
+        seconds = time.perf_counter() - start
+        self.profile._record(self.key, inputs, outputs, seconds)
+        return outputs
+
+
+class ExpressionProfile:
+    """Counters of the calls of the phrases and snappers of one or more timetables, by contract class
+    and expression name. The functions are wrapped by [wrap][qablet_contracts.expr.ExpressionProfile.wrap],
+    so any engine that calls **fn** (or **kernel**) records its calls.
+
+    For each expression it records the number of calls, their wall time, the largest size and the dtypes
+    of each input, and the bytes of the output arrays that were allocated by the function. It also counts
+    the calls whose outputs were unexpected, according to the function signature in the phrase specification:
+
+    - `upcast`: a float output with a larger itemsize than the float inputs over the paths, e.g. float64 from float32 paths.
+    - `broadcast`: an output that is not a scalar, or a 1-D array of size 1 or N, where N is the number of paths of the inputs.
+
+    Examples:
+        >>> profile = ExpressionProfile()
+        >>> tt = profile.timetable(OptionKO("USD", "EQ", 100, maturity, True, 102, "Up/Out", barrier_dates), np.float32)
+        >>> paths = {"EQ": np.random.lognormal(4.6, 0.1, (4, 100_000)).astype(np.float32)}
+        >>> outputs, _ = evaluate_chunked(tt["expressions"], [(i, "ko") for i in range(4)], paths, 100_000)
+        >>> [(row["name"], row["calls"], row["upcast"]) for row in profile.report()]
+        [('ko', 4, 0)]
+    """
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, expressions: Dict, group: str = "") -> Dict:
+        """A copy of an expressions dictionary, whose phrases and snappers record their calls.
+
+        Args:
+            expressions: the expressions dictionary of a timetable.
+            group: the group of the calls in the report, usually the contract class.
+        """
+        wrapped = {}
+        for name, expr in expressions.items():
+            expr = dict(expr)
+            if expr["type"] != "basket":
+                key = (group, name)
+                with self._lock:
+                    self.stats.setdefault(key, self._new_stats(expr))
+                for fn_key in ["fn", "kernel"]:
+                    if fn_key in expr:
+                        expr[fn_key] = _Instrumented(expr[fn_key], self, key)
+            wrapped[name] = expr
+        return wrapped
+
+    def timetable(self, contract, dtype=np.float64) -> Dict:
+        """The timetable of a contract, with its expressions wrapped, in the group of the contract class."""
+        tt = contract.timetable(dtype)
+        tt["expressions"] = self.wrap(
+            tt.get("expressions", {}), type(contract).__name__
+        )
+        return tt
+
+    @staticmethod
+    def _new_stats(expr: Dict) -> Dict:
+        fn = expr["fn"]
+        fn_name = getattr(fn, "__qualname__", type(fn).__qualname__)
+        return {
+            "type": expr["type"],
+            "fn": fn_name,
+            "calls": 0,
+            "seconds": 0.0,
+            "input_sizes": [0] * len(expr["inp"]),
+            "input_dtypes": [set() for _ in expr["inp"]],
+            "output_bytes": 0,
+            "upcast": 0,
+            "broadcast": 0,
+        }
+
+    def _record(self, key, inputs, outputs, seconds):
+        size = _path_size(inputs)
+        itemsize = _float_itemsize(inputs)
+        allocated = upcast = broadcast = 0
+        for out in outputs:
+            if isinstance(out, np.ndarray) and out.flags.owndata:
+                allocated += out.nbytes
+            if np.ndim(out) > 1 or np.size(out) not in (1, size):
+                broadcast = 1
+            dtype = getattr(out, "dtype", None)
+            if (
+                dtype is not None
+                and np.issubdtype(dtype, np.floating)
+                and 0 < itemsize < dtype.itemsize
+            ):
+                upcast = 1
+        with self._lock:
+            stats = self.stats[key]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            for i, value in enumerate(inputs):
+                stats["input_sizes"][i] = max(
+                    stats["input_sizes"][i], int(np.size(value))
+                )
+                stats["input_dtypes"][i].add(
+                    str(getattr(value, "dtype", type(value).__name__))
+                )
+            stats["output_bytes"] += allocated
+            stats["upcast"] += upcast
+            stats["broadcast"] += broadcast
+
+    def report(self, by: str = "expression") -> List[Dict]:
+        """The counters of each expression, or their totals for each group, e.g. across the contracts
+        of a class in a portfolio, in decreasing order of their time.
+
+        Args:
+            by: "expression" for a row for each group and expression name, or "group" for a row for each group.
+        """
+        with self._lock:
+            rows = [
+                {
+                    "group": group,
+                    "name": name,
+                    **stats,
+                    "input_sizes": list(stats["input_sizes"]),
+                    "input_dtypes": [sorted(d) for d in stats["input_dtypes"]],
+                }
+                for (group, name), stats in self.stats.items()
+            ]
+        if by == "group":
+            totals = {}
+            for row in rows:
+                total = totals.setdefault(
+                    row["group"],
+                    {
+                        "group": row["group"],
+                        "expressions": 0,
+                        **dict.fromkeys(_TOTALS, 0),
+                    },
+                )
+                total["expressions"] += 1
+                for k in _TOTALS:
+                    total[k] += row[k]
+            rows = list(totals.values())
+        elif by != "expression":
+            raise ValueError(f"unknown report grouping {by}")
+        return sorted(rows, key=lambda row: -row["seconds"])
@@ -0,0 +1,240 @@
+"""
+This module contains content fingerprints of timetables, e.g. to key a cache of valuations.
+A fingerprint depends only on the decoded events, and on the canonical form of the expressions
+they refer to, so it doesn't depend on the dictionary encoding, the order of the dictionaries,
+or on the process. It depends on the values of the quantities and of the constants of the expressions,
+so a timetable built with float32 has a different fingerprint, unless all its values are exact in float32.
+
+The string values of each dictionary column are hashed once per dictionary entry,
+together with the expression of that name, if any. Then each row is hashed
+with vectorized 64 bit mixing, and the row hashes are summed for each contract,
+so that the fingerprints of all contracts in a portfolio are calculated in one pass.
+The fingerprint of a contract is the same on its own, and in a portfolio.
+
+The canonical form of an expression has its type, inputs, outputs and function, where a function is identified
+by its qualified name and its parameters (the fields of a dataclass, or the defaults and closure of a function),
+and not by its code, so fingerprints are stable across releases. Other objects raise a TypeError. The `"chunk_safe"` and `"kernel"` keys
+are hints that don't change the result, and are not included.
+"""
+
+import dataclasses
+import hashlib
+import struct
+from typing import Dict
+
+import numpy as np
+import pyarrow as pa
+
+_EXPRESSION_KEYS = ["type", "inp", "out", "fn"]
+_NULL = b"\x00null"
+_SEEDS = np.array([0x243F6A8885A308D3, 0x13198A2E03707344], dtype=np.uint64)
+
+
+def _canonical(obj, depth=0) -> bytes:
+    """A canonical byte string of an object, stable across processes."""
+    if depth > 20:
+        raise ValueError("the object is nested too deeply")
+    depth += 1
+    if obj is None:
+        return _NULL
+    if isinstance(obj, (bool, np.bool_)):
+        return b"b" + (b"1" if obj else b"0")
+    if isinstance(obj, (int, np.integer)):
+        return b"i" + str(int(obj)).encode()
+    if isinstance(obj, (float, np.floating)):
+        return b"f" + float(obj).hex().encode()
+    if isinstance(obj, str):
+        return b"s" + _sized(obj.encode())
+    if isinstance(obj, bytes):
+        return b"y" + _sized(obj)
+    if isinstance(obj, np.ndarray):
+        data = np.ascontiguousarray(obj, dtype=obj.dtype.newbyteorder("<"))
+        return (
+            b"a"
+            + _sized(f"{obj.dtype.str[1:]}{obj.shape}".encode())
+            + _sized(data.tobytes())
+        )
+    if isinstance(obj, (list, tuple)):
+        return b"l" + _sized(b"".join(_canonical(x, depth) for x in obj))
+    if isinstance(obj, dict):
+        items = sorted((str(k), v) for k, v in obj.items())
+        return b"d" + _sized(
+            b"".join(_canonical(k) + _canonical(v, depth) for k, v in items)
+        )
+    cls = type(obj)
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    if dataclasses.is_dataclass(obj):
+        fields = {
+            f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)
+        }
+        return b"c" + _canonical(name) + _canonical(fields, depth)
+    if hasattr(obj, "__code__"):  # a function, or a lambda
+        name = f"{obj.__module__}.{obj.__qualname__}"
+        closure = [c.cell_contents for c in obj.__closure__ or ()]
+        params = [obj.__defaults__, obj.__kwdefaults__, closure]
+        return b"F" + _canonical(name) + _canonical(params, depth)
+    if hasattr(obj, "__dict__"):
+        return b"o" + _canonical(name) + _canonical(vars(obj), depth)
+    if isinstance(obj, type(len)):  # a builtin function
+        return b"B" + _canonical(f"{obj.__module__}.{obj.__qualname__}")
+    # a repr, e.g. object.__repr__, may depend on the memory address
+    raise TypeError(f"cannot fingerprint an object of type {name}")
+
+
+def _sized(data: bytes) -> bytes:
+    return struct.pack("<Q", len(data)) + data
+
+
+def expression_spec(expressions: Dict, name: str) -> bytes:
+    """The canonical form of an expression, including the expressions of its inputs."""
+    seen = set()
+
+    def spec(name):
+        expr = expressions.get(name)
+        if expr is None or name in seen:
+            return _canonical(name)
+        seen.add(name)
+        inputs = [spec(i) for i in expr.get("inp", [])]
+        body = {
+            k: expr[k] for k in _EXPRESSION_KEYS if k in expr and k != "inp"
+        }
+        return _canonical(name) + _canonical(body) + _canonical(inputs)
+
+    return spec(name)
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer, applied to an array of uint64."""
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _dict_hashes(col: pa.Array, expressions: Dict) -> np.ndarray:
+    """The hashes (rows x 2) of the values of a dictionary (or string) column, computed once per entry."""
+    if not pa.types.is_dictionary(col.type):
+        col = col.dictionary_encode()
+    values = col.dictionary.to_pylist()
+    digests = [
+        hashlib.blake2b(
+            _canonical(v)
+            + (expression_spec(expressions, v) if v in expressions else b""),
+            digest_size=16,
+        ).digest()
+        for v in values
+    ]
+    digests.append(hashlib.blake2b(_NULL, digest_size=16).digest())
+    table = np.frombuffer(b"".join(digests), dtype="<u8").reshape(-1, 2)
+    codes = col.indices.fill_null(-1).to_numpy()
+    return table[codes]
+
+
+def _row_hashes(events: pa.RecordBatch, expressions: Dict) -> np.ndarray:
+    """The hash (rows x 2) of each row of the events, excluding the contract column."""
+    # the time in microseconds since the epoch, whatever the unit of the column
+    time = events.column("time").cast(pa.timestamp("us")).cast(pa.int64())
+    time = time.to_numpy().view(np.uint64)
+    # the values of the quantities, as float64, with -0.0 and 0.0 the same
+    quantity = (
+        events.column("quantity")
+        .to_numpy(zero_copy_only=False)
+        .astype(np.float64)
+        + 0.0
+    )
+    h = _mix(_SEEDS[None, :] ^ time[:, None])
+    h = _mix(h ^ quantity.view(np.uint64)[:, None])
+    for name in ["op", "unit", "track"]:
+        h = _mix(h ^ _dict_hashes(events.column(name), expressions))
+    return h
+
+
+def _as_batch(events) -> pa.RecordBatch:
+    if isinstance(events, pa.Table):
+        events = events.unify_dictionaries().combine_chunks()
+        batches = events.to_batches()
+        return (
+            batches[0]
+            if batches
+            else pa.RecordBatch.from_pylist([], schema=events.schema)
+        )
+    return events
+
+
+def _group_digests(contract: np.ndarray, rows: np.ndarray):
+    """Combine the row hashes of each contract, in order. Returns the contract ids, and their digests (contracts x 2)."""
+    order = np.argsort(contract, kind="stable")
+    contract = contract[order]
+    ids, first, counts = np.unique(
+        contract, return_index=True, return_counts=True
+    )
+    position = np.arange(len(contract), dtype=np.uint64) - np.repeat(
+        first, counts
+    ).astype(np.uint64)
+    h = _mix(rows[order] ^ _mix(position)[:, None])
+    if len(h):
+        total = np.add.reduceat(h, first, axis=0)
+    else:
+        total = np.zeros((0, 2), dtype=np.uint64)
+    return ids, _mix(total ^ counts.astype(np.uint64)[:, None])
+
+
+def _fingerprints(timetable: Dict):
+    """The contract ids, and the digests (contracts x 2) of a timetable, or a portfolio table."""
+    events = _as_batch(timetable["events"])
+    rows = _row_hashes(events, timetable.get("expressions", {}))
+    if "contract" in events.schema.names:
+        contract = events.column("contract").to_numpy()
+    else:
+        contract = np.zeros(len(events), dtype=np.int64)
+    ids, digests = _group_digests(contract, rows)
+    return ids, np.ascontiguousarray(digests.astype("<u8"))
+
+
+def contract_fingerprints(timetable: Dict) -> pa.Table:
+    """The fingerprint of each contract in a portfolio table, in a single vectorized pass.
+    The fingerprint of a contract is the same as the fingerprint of its own timetable.
+
+    Args:
+        timetable: a portfolio table, i.e. a dict with the events, and the expressions.
+
+    Returns:
+        A table with the columns contract, and fingerprint (16 bytes), with one row for each contract.
+
+    Examples:
+        >>> tt = fixed_bond_batch("USD", [0.05, 0.04], datetime(2023, 12, 31), datetime(2025, 12, 31))
+        >>> contract_fingerprints(tt).column("contract").to_pylist()
+        [0, 1]
+    """
+    ids, digests = _fingerprints(timetable)
+    return pa.table(
+        {
+            "contract": pa.array(ids, type=pa.int64()),
+            "fingerprint": pa.FixedSizeBinaryArray.from_buffers(
+                pa.binary(16),
+                len(ids),
+                [None, pa.py_buffer(digests.tobytes())],
+            ),
+        }
+    )
+
+
+def fingerprint(timetable: Dict) -> str:
+    """The fingerprint of a timetable, or of a portfolio table, as a hex string.
+    The fingerprint of a portfolio depends on the id and the fingerprint of each of its contracts.
+
+    Args:
+        timetable: a dict with the events, and the expressions.
+
+    Examples:
+        >>> bond = Bond("USD", datetime(2025, 3, 31))
+        >>> fingerprint(bond.timetable()) == bond.fingerprint()
+        True
+    """
+    ids, digests = _fingerprints(timetable)
+    if "contract" not in timetable["events"].schema.names:
+        if len(ids) == 0:
+            return hashlib.blake2b(b"", digest_size=16).hexdigest()
+        return digests[0].tobytes().hex()
+    data = ids.astype("<i8").tobytes() + digests.tobytes()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
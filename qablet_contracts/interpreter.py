@@ -0,0 +1,291 @@
+"""
+This module contains a minimal reference interpreter of timetables, which values a timetable, or a portfolio table,
+over paths that are supplied by the user, e.g. to compare the cost of contract designs without a pricing model.
+It is not a pricing model: the paths, and their measure, are up to the user.
+
+The paths are arrays of shape (number of times, number of paths), on a grid of times.
+An event uses the paths at the last time of the grid on or before the event time.
+
+- The path of the base currency (ccy) is its deflator, i.e. the value (in the numeraire) of one unit paid at that time.
+  Without it, there is no discounting.
+- The path of an asset, or of another currency, is its price in the base currency.
+- Phrases and snaps are paid in the base currency.
+
+Each contract is evaluated in two passes over its events. A forward pass, in the order of the events,
+evaluates the snappers, and the phrases that are used as an op or a unit. A backward pass calculates the value
+of each track, starting from the last event, as specified in the operations of the timetable specification.
+Snappers with a `"path_fn"` are evaluated once, over all their events, at their last event.
+The choice of `>` and `<` is made on the values, if they are known at the time of the choice, or else
+on a least squares regression of the difference of the values on polynomials of the paths at that time.
+Contracts that have only `+` events, paid in assets, are valued in a single vectorized pass.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.expr import (
+    _StepValues,
+    eval_expression,
+    eval_path_snapper,
+)
+
+_CHOICES = [">", "<"]
+_SNAPPER_OPS = [None, "s"]
+
+
+def _codes(column: pa.DictionaryArray):
+    """The values of the dictionary of a column, with None at the end for nulls, and the code of each row."""
+    values = column.dictionary.to_pylist() + [None]
+    return values, column.indices.fill_null(-1).to_numpy() % len(values)
+
+
+class _Paths:
+    """The deflated values of the units, and the regression basis, at each time of the grid."""
+
+    def __init__(self, times, paths: Dict, ccy: str, degree: int):
+        self.times = np.asarray(times, dtype="datetime64[ms]")
+        self.paths = paths
+        self.ccy = ccy
+        self.degree = degree
+        self.num_paths = max(np.shape(v)[-1] for v in paths.values())
+        self._basis = {}
+        self._means = {}
+
+    def steps(self, times: np.ndarray) -> np.ndarray:
+        """The index of the last time of the grid on or before each time."""
+        steps = np.searchsorted(self.times, times, side="right") - 1
+        if (steps < 0).any():
+            raise ValueError("an event is before the first time of the paths")
+        return steps
+
+    def deflator(self, step: int):
+        if self.ccy in self.paths:
+            return self.paths[self.ccy][step]
+        return 1.0
+
+    def unit(self, unit: str, step: int):
+        """The deflated value of one unit of an asset, or a currency."""
+        if unit == self.ccy:
+            return self.deflator(step)
+        return self.paths[unit][step] * self.deflator(step)
+
+    def mean(self, unit: str, step: int) -> float:
+        key = (unit, step)
+        if key not in self._means:
+            self._means[key] = float(np.mean(self.unit(unit, step)))
+        return self._means[key]
+
+    def basis(self, step: int) -> np.ndarray:
+        """Polynomials of the standardized paths at a step, with a constant, as columns."""
+        if step not in self._basis:
+            columns = [np.ones(self.num_paths)]
+            for values in self.paths.values():
+                x = np.broadcast_to(values[step], self.num_paths)
+                std = x.std()
+                if std > 0:
+                    x = (x - x.mean()) / std
+                    columns += [x**d for d in range(1, self.degree + 1)]
+            self._basis[step] = np.stack(columns, axis=1)
+        return self._basis[step]
+
+    def regress(self, y, step: int) -> np.ndarray:
+        """The least squares estimate of y, given the paths at a step."""
+        basis = self.basis(step)
+        y = np.broadcast_to(y, self.num_paths)
+        coef, *_ = np.linalg.lstsq(basis, y, rcond=None)
+        return basis @ coef
+
+
+def _forward(rows, expressions: Dict, paths: _Paths, snaps: Dict) -> Dict:
+    """Evaluate the snappers, and the phrases used as ops or units, in the order of the events.
+    Returns the value of each phrase op (a condition), and each phrase or snap unit, by row."""
+    snaps = dict(snaps)
+    results = {}
+    rows = list(rows)
+    # the steps of the snappers that can be evaluated over the whole path, at their last event
+    path_steps = {}
+    for row, step, op, unit in rows:
+        if "path_fn" in expressions.get(unit, {}):
+            path_steps.setdefault(unit, []).append((row, step))
+    for row, step, op, unit in rows:
+        if unit in path_steps:
+            if row == path_steps[unit][-1][0]:
+                steps = [s for _, s in path_steps[unit]]
+                eval_path_snapper(expressions, unit, paths.paths, steps, snaps)
+            continue
+        values = _StepValues(paths.paths, step, slice(None), snaps)
+        kind = expressions.get(unit, {}).get("type")
+        if kind == "snapper" or op in _SNAPPER_OPS:
+            outputs = eval_expression(expressions, unit, values)
+            snaps.update(zip(expressions[unit]["out"], outputs))
+            continue
+        if op not in ["+"] + _CHOICES:
+            [results[row, "op"]] = eval_expression(expressions, op, values)
+        if kind == "phrase":
+            [results[row, "unit"]] = eval_expression(expressions, unit, values)
+        elif unit in snaps:
+            results[row, "unit"] = snaps[unit]
+    return results
+
+
+def _backward(rows, expressions, paths: _Paths, forward: Dict, tracks):
+    """The value of each track, on each path, from the last event to the first."""
+    value = {t: 0.0 for t in tracks}
+    # the latest step of the payments in each track, to know if its value is known at a step
+    latest = {t: -1 for t in tracks}
+    for row, step, op, quantity, unit, track in rows:
+        if op in _SNAPPER_OPS:
+            continue
+        if unit in value:
+            amount = quantity * value[unit]
+            amount_step = latest[unit]
+        elif (row, "unit") in forward:
+            amount = quantity * forward[row, "unit"] * paths.deflator(step)
+            amount_step = step
+        else:
+            amount = quantity * paths.unit(unit, step)
+            amount_step = step
+
+        rest = value[track]
+        if op == "+":
+            value[track] = rest + amount
+        elif op in _CHOICES:
+            sign = 1 if op == ">" else -1
+            diff = np.subtract(amount, rest) * sign
+            if max(amount_step, latest[track]) > step:
+                diff = paths.regress(diff, step)
+            value[track] = np.where(diff > 0, amount, rest)
+        else:
+            cond = forward[row, "op"]
+            if np.asarray(cond).dtype == bool:
+                value[track] = np.where(cond, amount, rest)
+            else:
+                value[track] = cond * amount + (1 - cond) * rest
+        latest[track] = max(latest[track], amount_step)
+    return value
+
+
+def evaluate(
+    timetable: Dict,
+    times,
+    paths: Dict,
+    ccy: Optional[str] = None,
+    snaps: Optional[Dict] = None,
+    degree: int = 2,
+) -> pa.Table:
+    """Value a timetable, or a portfolio table, over paths, see the [module][qablet_contracts.interpreter].
+
+    Args:
+        timetable: a timetable, or a portfolio table.
+        times: the times of the paths, as datetime64, in ascending order.
+        paths: a dict of asset names (and the base currency) to arrays of shape (len(times), number of paths).
+        ccy: the base currency, whose path is the deflator.
+        snaps: the initial values of the snaps, if any.
+        degree: the degree of the polynomials of the regression of choices.
+
+    Returns:
+        A table with the columns contract, and value, i.e. the mean over the paths of the deflated value
+        of the tracks of the contract that are not a unit of another event.
+
+    Examples:
+        >>> times = np.array(["2024-01-01", "2024-03-31"], dtype="datetime64[D]")
+        >>> rng = np.random.default_rng(1)
+        >>> paths = {"SPX": np.stack([np.full(10000, 2900.0), rng.lognormal(np.log(2900), 0.1, 10000)])}
+        >>> tt = Option("USD", "SPX", 2900, datetime(2024, 3, 31), True).timetable()
+        >>> evaluate(tt, times, paths, "USD").column("value")[0].as_py()
+        121.55339501625663
+    """
+    events = timetable["events"]
+    if isinstance(events, pa.Table):
+        events = events.unify_dictionaries().combine_chunks()
+        batches = events.to_batches()
+        events = (
+            batches[0]
+            if batches
+            else pa.RecordBatch.from_pylist([], schema=events.schema)
+        )
+    expressions = timetable.get("expressions", {})
+    paths = _Paths(times, paths, ccy, degree)
+    snaps = snaps or {}
+
+    if "contract" in events.schema.names:
+        contract = events.column("contract").to_numpy()
+    else:
+        contract = np.zeros(len(events), dtype=np.int64)
+    ms = events.column("time").cast(pa.int64()).to_numpy()
+    steps = paths.steps(ms.astype("datetime64[ms]"))
+    quantity = events.column("quantity").to_numpy(zero_copy_only=False)
+    quantity = quantity.astype(np.float64)
+    op_values, op_codes = _codes(events.column("op"))
+    unit_values, unit_codes = _codes(events.column("unit"))
+    track_values, track_codes = _codes(events.column("track"))
+
+    # the rows that are not payments of an asset, checked once per dictionary entry
+    not_plus = np.array([v != "+" for v in op_values])
+    special = np.array(
+        [v in expressions or v in track_values for v in unit_values]
+    )
+    nonlinear = not_plus[op_codes] | special[unit_codes]
+
+    order = np.argsort(contract, kind="stable")
+    ids, first, counts = np.unique(
+        contract[order], return_index=True, return_counts=True
+    )
+    owner = np.repeat(np.arange(len(ids)), counts)
+    linear = (
+        np.bincount(owner, weights=nonlinear[order], minlength=len(ids)) == 0
+    )
+    values = np.zeros(len(ids))
+
+    # contracts with payments only: the sum of the quantities times the mean value of their units
+    rows = order[linear[owner]]
+    keys, inverse = np.unique(
+        unit_codes[rows] * len(paths.times) + steps[rows], return_inverse=True
+    )
+    means = np.array(
+        [
+            paths.mean(
+                unit_values[k // len(paths.times)], k % len(paths.times)
+            )
+            for k in keys
+        ]
+    )
+    values += np.bincount(
+        owner[linear[owner]],
+        weights=quantity[rows] * means[inverse.ravel()],
+        minlength=len(ids),
+    )
+
+    # other contracts, one at a time, with the rows in the order of the events
+    ops = np.array(op_values, dtype=object)[op_codes]
+    units = np.array(unit_values, dtype=object)[unit_codes]
+    tracks = np.array(track_values, dtype=object)[track_codes]
+    for i in np.flatnonzero(~linear):
+        rows = order[first[i] : first[i] + counts[i]]
+        forward = _forward(
+            zip(rows, steps[rows], ops[rows], units[rows]),
+            expressions,
+            paths,
+            snaps,
+        )
+        own_tracks = set(tracks[rows])
+        back = rows[::-1]
+        value = _backward(
+            zip(
+                back,
+                steps[back],
+                ops[back],
+                quantity[back],
+                units[back],
+                tracks[back],
+            ),
+            expressions,
+            paths,
+            forward,
+            own_tracks,
+        )
+        roots = own_tracks - set(units[rows])
+        values[i] = sum(float(np.mean(value[t])) for t in roots)
+    return pa.table({"contract": pa.array(ids, pa.int64()), "value": values})
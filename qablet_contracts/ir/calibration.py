@@ -0,0 +1,94 @@
+"""
+This module contains a generator of swaption calibration sets for interest rate models.
+"""
+
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.ir.swaption import swaption_batch
+from qablet_contracts.timetable import dict_array, ts_array
+
+
+def calibration_set(
+    ccy: str,
+    expiries: List[datetime],
+    tenors: List[int],
+    strike_offsets: List[float],
+    atm_rates=0.0,
+    coterminal_tenors: List[int] = (),
+    coterminal_atm_rates=0.0,
+    freq: int = 2,
+    dtype=np.float64,
+):
+    """Create a calibration set of swaptions as a single portfolio table.
+
+    The set contains a [Swaption][qablet_contracts.ir.swaption.Swaption] for each expiry, tenor and strike offset,
+    and a co-terminal [Bermuda Swaption][qablet_contracts.ir.swaption.BermudaSwaption] for each co-terminal tenor
+    and strike offset. A co-terminal Bermuda Swaption starts at the first expiry, and can be exercised at the start of
+    each period until its maturity. All contracts are built in one vectorized pass, and contracts with the same
+    schedule share the schedule and daycount computations.
+
+    Args:
+        ccy: the currency of the swaptions.
+        expiries: the expiry datetimes of the swaptions.
+        tenors: the tenors of the underlying swaps, in years.
+        strike_offsets: the strike offsets from the ATM rate (in units, i.e. 0.001 means 10 bps).
+        atm_rates: the ATM rate for each expiry and tenor, an array of shape (expiries, tenors), or a single rate.
+        coterminal_tenors: the tenors of the co-terminal Bermuda Swaptions, in years from the first expiry.
+        coterminal_atm_rates: the ATM rate of each co-terminal tenor, or a single rate.
+        freq: the number of fixed payments per year.
+        dtype: the dtype of the quantities.
+
+    Returns:
+        The portfolio table, with an additional `contracts` table with the columns contract, type,
+        expiry, tenor, and strike, aligned to the contract ids.
+
+    Examples:
+        >>> expiries = [datetime(2025, 6, 30), datetime(2025, 12, 31), datetime(2026, 6, 30)]
+        >>> tt = calibration_set("USD", expiries, [1, 2, 5], [-0.005, 0, 0.005], atm_rates=0.035, coterminal_tenors=[5])
+        >>> tt["contracts"].num_rows
+        30
+    """
+    expiries = np.asarray(expiries, dtype="datetime64[D]")
+    tenors = np.asarray(tenors, dtype=np.int64)
+    offsets = np.asarray(strike_offsets, dtype=np.float64)
+    coterminal_tenors = np.asarray(coterminal_tenors, dtype=np.int64)
+
+    # european swaptions on the grid of expiry, tenor and offset
+    atm = np.broadcast_to(atm_rates, (len(expiries), len(tenors)))
+    eu_expiry, eu_tenor, eu_offset = np.meshgrid(
+        expiries, tenors, offsets, indexing="ij"
+    )
+    eu_strike = atm[..., None] + eu_offset
+
+    # co-terminal bermuda swaptions, for each co-terminal tenor and offset
+    coterminal_atm = np.broadcast_to(
+        coterminal_atm_rates, coterminal_tenors.shape
+    )
+    berm_tenor, berm_offset = np.meshgrid(
+        coterminal_tenors, offsets, indexing="ij"
+    )
+    berm_strike = coterminal_atm[:, None] + berm_offset
+    berm_expiry = np.full(berm_tenor.shape, expiries[0])
+
+    expiry = np.concatenate([eu_expiry.ravel(), berm_expiry.ravel()])
+    tenor = np.concatenate([eu_tenor.ravel(), berm_tenor.ravel()])
+    strike = np.concatenate([eu_strike.ravel(), berm_strike.ravel()])
+    bermudan = np.arange(len(expiry)) >= eu_expiry.size
+
+    tt = swaption_batch(
+        ccy, expiry, tenor * freq, strike, bermudan, freq=freq, dtype=dtype
+    )
+    tt["contracts"] = pa.table(
+        {
+            "contract": pa.array(np.arange(len(expiry), dtype=np.int64)),
+            "type": dict_array(bermudan, ["Swaption", "BermudaSwaption"]),
+            "expiry": ts_array(expiry),
+            "tenor": pa.array(tenor),
+            "strike": pa.array(strike),
+        }
+    )
+    return tt
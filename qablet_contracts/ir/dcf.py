@@ -4,6 +4,8 @@ This module contains examples of day count fraction calculations.
 
 from datetime import datetime, timedelta
 
+import numpy as np
+
 
 def _is_eom(dt):
     return (dt + timedelta(days=1)).month != dt.month
@@ -32,3 +34,34 @@ def dcf_30_360(end: datetime, start: datetime) -> float:
         + (end.month - start.month) / 12
         + (d2 - d1) / 360
     )
+
+
+def _ymd(dt: np.ndarray):
+    """Split an array of datetime64 into arrays of year, month and day."""
+    months = dt.astype("datetime64[M]")
+    year = months.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dt.astype("datetime64[D]") - months).astype(np.int64) + 1
+    return year, month, day
+
+
+def dcf_30_360_array(end, start) -> np.ndarray:
+    """Calculate US 30/360 daycount fractions for arrays of dates,
+    with the same convention as [dcf_30_360][qablet_contracts.ir.dcf.dcf_30_360].
+
+    Args:
+        end: an array (or anything convertible to an array of datetime64) of end dates.
+        start: an array of start dates, of the same shape as end, or a single date.
+    """
+    end = np.asarray(end, dtype="datetime64[D]")
+    start = np.asarray(start, dtype="datetime64[D]")
+    y1, m1, d1 = _ymd(start)
+    y2, m2, d2 = _ymd(end)
+
+    start_is_eom = (start + 1).astype("datetime64[M]") != start.astype(
+        "datetime64[M]"
+    )
+    d1 = np.where(start_is_eom, 30, d1)
+    d2 = np.where((d1 == 30) & (d2 == 31), 30, d2)
+
+    return (y2 - y1) + (m2 - m1) / 12 + (d2 - d1) / 360
@@ -0,0 +1,91 @@
+"""
+This module contains vectorized schedule generation, for building many contracts at once.
+"""
+
+import numpy as np
+
+from qablet_contracts.portfolio import ragged_index
+
+
+def add_months(dates, months, eom=False) -> np.ndarray:
+    """Add a number of months to an array of dates. If the day doesn't exist in the
+    resulting month, the last day of the month is used.
+
+    Args:
+        dates: an array of datetime64 (or anything convertible to it).
+        months: an integer array of months to add, broadcastable with dates.
+        eom: if true, a date at the end of its month is moved to the end of the resulting month.
+            It can be an array, broadcastable with dates.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    start_month = dates.astype("datetime64[M]")
+    day = (dates - start_month.astype("datetime64[D]")).astype(np.int64)
+    if np.any(eom):
+        is_eom = (dates + 1).astype("datetime64[M]") != start_month
+        day = np.where(is_eom & eom, 31, day)
+
+    month = start_month + np.asarray(months, dtype=np.int64)
+    first = month.astype("datetime64[D]")
+    month_len = ((month + 1).astype("datetime64[D]") - first).astype(np.int64)
+    return first + np.minimum(day, month_len - 1)
+
+
+def periodic_schedule(starts, num_periods, months_per_period):
+    """Generate the period dates of many regular schedules at once.
+
+    Args:
+        starts: the start date of each schedule.
+        num_periods: the number of periods of each schedule.
+        months_per_period: the number of months in a period, for each schedule.
+
+    Returns:
+        A tuple (owner, period_start, period_end), of arrays with one element for each period
+        of all schedules, where owner is the position of its schedule in the inputs.
+    """
+    starts = np.asarray(starts, dtype="datetime64[D]")
+    num_periods = np.broadcast_to(num_periods, starts.shape)
+    months = np.broadcast_to(months_per_period, starts.shape)
+
+    owner, pos = ragged_index(num_periods)
+    period_start = add_months(starts[owner], pos * months[owner])
+    period_end = add_months(starts[owner], (pos + 1) * months[owner])
+    return owner, period_start, period_end
+
+
+def backward_schedule(accrual_starts, maturities, months_per_period):
+    """Generate the coupon periods of many schedules at once, rolling back from the maturity,
+    with a short first period if needed. If the maturity is at the end of a month, so are
+    all period ends.
+
+    Args:
+        accrual_starts: the start of the first period of each schedule.
+        maturities: the end of the last period of each schedule.
+        months_per_period: the number of months in a regular period, for each schedule.
+
+    Returns:
+        A tuple (owner, period_start, period_end), of arrays with one element for each period
+        of all schedules, where owner is the position of its schedule in the inputs.
+    """
+    starts, maturities, months = np.broadcast_arrays(
+        np.asarray(accrual_starts, dtype="datetime64[D]"),
+        np.asarray(maturities, dtype="datetime64[D]"),
+        np.asarray(months_per_period, dtype=np.int64),
+    )
+    eom = (maturities + 1).astype("datetime64[M]") != maturities.astype(
+        "datetime64[M]"
+    )
+
+    # the number of periods is the smallest n, such that maturity - n periods <= start
+    month_diff = (
+        maturities.astype("datetime64[M]") - starts.astype("datetime64[M]")
+    ).astype(np.int64)
+    num_periods = month_diff // months
+    num_periods += add_months(maturities, -num_periods * months, eom) > starts
+
+    owner, pos = ragged_index(num_periods)
+    back = (num_periods[owner] - 1 - pos) * months[owner]
+    period_end = add_months(maturities[owner], -back, eom[owner])
+    # each period starts at the end of the previous one
+    period_start = np.roll(period_end, 1)
+    period_start[pos == 0] = starts[owner[pos == 0]]
+    return owner, period_start, period_end
@@ -4,12 +4,18 @@ This module contains examples of interest rate swaps.
 
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from typing import List
 
-import pandas as pd
+import numpy as np
 
 from qablet_contracts.ir.dcf import dcf_30_360 as dcf
-from qablet_contracts.timetable import EventsMixin
+from qablet_contracts.ir.dcf import dcf_30_360_array as dcf_array
+from qablet_contracts.timetable import (
+    EventsMixin,
+    dict_array,
+    timetable_from_arrays,
+)
 
 
 def simple_swap_period(
@@ -46,6 +52,59 @@ def simple_swap_period(
     ]
 
 
+@dataclass(frozen=True)
+class SwapLeg:
+    """The periods of a swap, as columnar arrays. A leg is computed once for a set of dates,
+    and shared by the [Swap][qablet_contracts.ir.swap.Swap], [Swaption][qablet_contracts.ir.swaption.Swaption]
+    and [BermudaSwaption][qablet_contracts.ir.swaption.BermudaSwaption] on those dates,
+    so the arrays are read-only.
+
+    Args:
+        starts: the start of each period, as datetime64.
+        ends: the end of each period, as datetime64.
+        fracs: the daycount fraction of each period.
+    """
+
+    starts: np.ndarray
+    ends: np.ndarray
+    fracs: np.ndarray
+
+    def fixed_amounts(self, fixed_rate) -> np.ndarray:
+        """The payment at the end of each period, i.e. the notional and the fixed rate.
+        If fixed_rate is an array of shape (k, 1), the result has shape (k, periods)."""
+        return -1 - fixed_rate * self.fracs
+
+    def swap_columns(self, fixed_rate):
+        """The times and quantities of the swap events, i.e. receive the notional at the start,
+        and pay the notional and the fixed rate at the end of each period."""
+        times = np.stack([self.starts, self.ends], axis=-1).ravel()
+        quantities = np.stack(
+            [np.ones_like(self.fracs), self.fixed_amounts(fixed_rate)], axis=-1
+        ).ravel()
+        return times, quantities
+
+
+def swap_leg(dates) -> SwapLeg:
+    """Return the [SwapLeg][qablet_contracts.ir.swap.SwapLeg] for the period dates of a swap,
+    including the inception and maturity. Legs are cached, so that contracts on the same dates
+    share the same arrays.
+
+    Args:
+        dates: the period datetimes of the swap.
+    """
+    dates = np.asarray(dates, dtype="datetime64[ms]")
+    return _swap_leg(dates.tobytes())
+
+
+@lru_cache(maxsize=1024)
+def _swap_leg(key: bytes) -> SwapLeg:
+    dates = np.frombuffer(key, dtype="datetime64[ms]")
+    starts, ends = dates[:-1], dates[1:]
+    fracs = dcf_array(ends, starts)
+    fracs.flags.writeable = False
+    return SwapLeg(starts, ends, fracs)
+
+
 @dataclass
 class Swap(EventsMixin):
     """In a **Vanilla Swap**, at the end of each period the holder pays a fixed rate and receives a floating rate.
@@ -85,8 +144,23 @@ class Swap(EventsMixin):
 
         return events
 
+    def timetable(self, dtype=np.float64):
+        # the same events, built from the shared leg arrays
+        times, quantities = swap_leg(self.dates).swap_columns(self.strike_rate)
+        zeros = np.zeros(len(times), dtype=np.int64)
+        return timetable_from_arrays(
+            times,
+            dict_array(zeros, ["+"]),
+            quantities,
+            dict_array(zeros, [self.ccy]),
+            dict_array(zeros, [self.track + ".swp"]),
+            dtype=dtype,
+        )
+
 
 if __name__ == "__main__":
+    import pandas as pd
+
     dates = pd.bdate_range(
         datetime(2023, 12, 31),
         datetime(2024, 12, 31),
@@ -6,10 +6,17 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import List
 
-import pandas as pd
+import numpy as np
 
-from qablet_contracts.ir.swap import simple_swap_period
-from qablet_contracts.timetable import EventsMixin
+from qablet_contracts.ir.dcf import dcf_30_360_array as dcf_array
+from qablet_contracts.ir.schedule import periodic_schedule
+from qablet_contracts.ir.swap import simple_swap_period, swap_leg
+from qablet_contracts.portfolio import portfolio_from_arrays, ragged_index
+from qablet_contracts.timetable import (
+    EventsMixin,
+    dict_array,
+    timetable_from_arrays,
+)
 
 
 @dataclass
@@ -60,6 +67,24 @@ class Swaption(EventsMixin):
 
         return events
 
+    def timetable(self, dtype=np.float64):
+        # the same events, built from the shared leg arrays:
+        # option expiration event at beginning of the swap, followed by the swap events
+        leg = swap_leg(self.dates)
+        times, quantities = leg.swap_columns(self.strike_rate)
+        times = np.concatenate([leg.starts[:1], times])
+        quantities = np.concatenate([[1.0], quantities])
+        codes = np.zeros(len(times), dtype=np.int64)
+        codes[0] = 1  # the option expiration event
+        return timetable_from_arrays(
+            times,
+            dict_array(codes, ["+", ">"]),
+            quantities,
+            dict_array(codes, [self.ccy, self.track + ".swp"]),
+            dict_array(codes, [self.track + ".swp", self.track + ".opt"]),
+            dtype=dtype,
+        )
+
 
 @dataclass
 class BermudaSwaption(EventsMixin):
@@ -112,8 +137,150 @@ class BermudaSwaption(EventsMixin):
 
         return events
 
+    def timetable(self, dtype=np.float64):
+        # the same events, built from the shared leg arrays:
+        # in each period, an option expiration event before the swap events
+        leg = swap_leg(self.dates)
+        times = np.stack([leg.starts, leg.starts, leg.ends], axis=-1).ravel()
+        quantities = np.stack(
+            [
+                np.ones_like(leg.fracs),
+                np.ones_like(leg.fracs),
+                leg.fixed_amounts(self.strike_rate),
+            ],
+            axis=-1,
+        ).ravel()
+        codes = np.tile([1, 0, 0], len(leg.fracs))  # 1 for the option events
+        return timetable_from_arrays(
+            times,
+            dict_array(codes, ["+", ">"]),
+            quantities,
+            dict_array(codes, [self.ccy, self.track + ".swp"]),
+            dict_array(codes, [self.track + ".swp", self.track + ".opt"]),
+            dtype=dtype,
+        )
+
+
+def swaption_batch(
+    ccy: str,
+    expiries,
+    num_periods,
+    strike_rates,
+    bermudan=False,
+    freq: int = 2,
+    dtype=np.float64,
+):
+    """Create the portfolio table of many [Swaptions][qablet_contracts.ir.swaption.Swaption]
+    (or [Bermuda Swaptions][qablet_contracts.ir.swaption.BermudaSwaption]) in a single vectorized pass,
+    one for each element of the input arrays. The schedule and daycount fractions are computed once for
+    each distinct (expiry, number of periods), and shared by all contracts with the same schedule.
+    Contract c has tracks `#c.opt` and `#c.swp`.
+
+    Args:
+        ccy: the currency of the swaptions.
+        expiries: the expiry of each contract, i.e. the start of the underlying swap.
+        num_periods: the number of periods of each underlying swap.
+        strike_rates: the strike rate of each contract (in units, i.e. 0.02 means 200 bps).
+        bermudan: true for a Bermuda Swaption, false for a Swaption, for each contract.
+        freq: the number of fixed payments per year.
+        dtype: the dtype of the quantities.
+    """
+    expiries, num_periods, strike_rates, bermudan = np.broadcast_arrays(
+        np.asarray(expiries, dtype="datetime64[D]"),
+        np.asarray(num_periods, dtype=np.int64),
+        np.asarray(strike_rates, dtype=np.float64),
+        np.asarray(bermudan, dtype=bool),
+    )
+    num_contracts = len(expiries)
+
+    # the distinct schedules, and the schedule of each contract
+    keys = np.stack([expiries.astype(np.int64), num_periods], axis=-1)
+    keys, schedule = np.unique(keys, axis=0, return_inverse=True)
+    schedule = schedule.ravel()
+    schedule_periods = keys[:, 1]
+    _, starts, ends = periodic_schedule(
+        keys[:, 0].astype("datetime64[D]"), schedule_periods, 12 // freq
+    )
+    fracs = dcf_array(ends, starts)
+    first_period = np.cumsum(schedule_periods) - schedule_periods
+
+    # A swaption has an option event, then two events per period.
+    # A bermuda swaption has an option event before the two events of each period.
+    rows = np.where(bermudan, 3 * num_periods, 1 + 2 * num_periods)
+    contract, pos = ragged_index(rows)
+    is_bermudan = bermudan[contract]
+    is_option = np.where(is_bermudan, pos % 3 == 0, pos == 0)
+    is_end = np.where(is_bermudan, pos % 3 == 2, (pos > 0) & (pos % 2 == 0))
+    period = np.where(is_bermudan, pos // 3, np.maximum(pos - 1, 0) // 2)
+    period += first_period[schedule[contract]]
+
+    time = np.where(is_end, ends[period], starts[period])
+    quantity = np.where(
+        is_end, -1 - strike_rates[contract] * fracs[period], 1.0
+    )
+
+    names = [f"#{c}" for c in range(num_contracts)]
+    return portfolio_from_arrays(
+        contract,
+        time,
+        dict_array(is_option, ["+", ">"]),
+        quantity,
+        dict_array(
+            np.where(is_option, 1 + contract, 0),
+            [ccy] + [n + ".swp" for n in names],
+        ),
+        dict_array(
+            np.where(is_option, contract, num_contracts + contract),
+            [n + ".opt" for n in names] + [n + ".swp" for n in names],
+        ),
+        dtype=dtype,
+    )
+
+
+def swaption_cube(
+    ccy: str,
+    expiries: List[datetime],
+    tenors: List[int],
+    strike_rates: List[float],
+    freq: int = 2,
+    dtype=np.float64,
+):
+    """Create the portfolio table of a cube of [Swaptions][qablet_contracts.ir.swaption.Swaption],
+    one for each expiry, tenor, and strike rate, in a single vectorized call. The schedule and
+    daycount fractions of each (expiry, tenor) are computed once, and shared by all strikes.
+    The contract id is `(i * len(tenors) + j) * len(strike_rates) + k` for expiry i, tenor j and strike k,
+    and contract c has tracks `#c.opt` and `#c.swp`.
+
+    Args:
+        ccy: the currency of the swaptions.
+        expiries: the expiry datetimes, i.e. the start of the underlying swaps.
+        tenors: the tenors of the underlying swaps, in years.
+        strike_rates: the strike rates (in units, i.e. 0.02 means 200 bps).
+        freq: the number of fixed payments per year.
+        dtype: the dtype of the quantities.
+
+    Examples:
+        >>> tt = swaption_cube("USD", [datetime(2024, 12, 31), datetime(2025, 12, 31)], [1, 2, 5], [0.03, 0.04])
+    """
+    expiry, tenor, strike = np.meshgrid(
+        np.asarray(expiries, dtype="datetime64[D]"),
+        np.asarray(tenors, dtype=np.int64),
+        np.asarray(strike_rates, dtype=np.float64),
+        indexing="ij",
+    )
+    return swaption_batch(
+        ccy,
+        expiry.ravel(),
+        tenor.ravel() * freq,
+        strike.ravel(),
+        freq=freq,
+        dtype=dtype,
+    )
+
 
 if __name__ == "__main__":
+    import pandas as pd
+
     dates = pd.bdate_range(
         datetime(2023, 12, 31),
         datetime(2024, 12, 31),
@@ -0,0 +1,189 @@
+"""
+This module contains queries of the cashflows in a timetable, or a portfolio table, i.e. the `+` events
+whose unit is a currency. The queries work directly on the arrow columns, and the dictionary codes
+of the op and unit columns, without converting the events to pandas.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.timetable import TS_TYPE, dict_array, ts_array
+
+# ops that don't represent a choice or a condition: payments, and snappers, whose op is None or "s"
+_NOT_CONDITIONS = ["+", "s"]
+
+
+def _as_batch(events) -> pa.RecordBatch:
+    """Return the events as a single record batch, with one dictionary per column."""
+    if isinstance(events, pa.Table):
+        events = events.unify_dictionaries().combine_chunks()
+        batches = events.to_batches()
+        if not batches:
+            return pa.RecordBatch.from_pylist([], schema=events.schema)
+        return batches[0]
+    return events
+
+
+def _dict_isin(column: pa.DictionaryArray, values: List[str]) -> np.ndarray:
+    """A bool mask of the rows of a dictionary column whose value is one of the values.
+    The values are matched once per dictionary entry, not once per row."""
+    in_dict = np.isin(column.dictionary.to_numpy(zero_copy_only=False), values)
+    codes = column.indices.fill_null(-1).to_numpy()
+    return np.append(in_dict, False)[codes]
+
+
+def _after_condition(events: pa.RecordBatch) -> np.ndarray:
+    """A bool mask of the rows that come after a choice or a condition of the same contract,
+    assuming that the rows of each contract are contiguous. The rows of all tracks of the contract
+    are included, not only the track of the condition, since a choice can switch to another track,
+    e.g. from the `.opt` to the `.swp` track of a swaption."""
+    is_cond = ~_dict_isin(events.column("op"), _NOT_CONDITIONS)
+    is_cond &= events.column("op").is_valid().to_numpy(zero_copy_only=False)
+    before = np.cumsum(is_cond) - is_cond  # conditions in the previous rows
+
+    if "contract" in events.schema.names:
+        contract = events.column("contract").to_numpy()
+        first = np.flatnonzero(np.diff(contract, prepend=contract[:1] - 1))
+        owner = np.repeat(first, np.diff(np.append(first, len(contract))))
+        before = before - before[owner]
+    return before > 0
+
+
+def _select(events, currencies: List[str], unconditional: bool) -> Dict:
+    """The columns of the cashflows in the events, where unit is the position of the currency in currencies."""
+    events = _as_batch(events)
+    unit = events.column("unit")
+    mask = _dict_isin(events.column("op"), ["+"])
+    mask &= _dict_isin(unit, currencies)
+    if unconditional:
+        mask &= ~_after_condition(events)
+    rows = np.flatnonzero(mask)
+
+    # map the unit codes to positions in currencies
+    dictionary = unit.dictionary.to_numpy(zero_copy_only=False)
+    lookup = np.full(len(dictionary), -1, dtype=np.int64)
+    for i, ccy in enumerate(currencies):
+        lookup[dictionary == ccy] = i
+
+    columns = {
+        "time": events.column("time").cast(pa.int64()).to_numpy()[rows],
+        "unit": lookup[unit.indices.to_numpy()[rows]],
+        "quantity": events.column("quantity")
+        .to_numpy()[rows]
+        .astype(np.float64),
+    }
+    if "contract" in events.schema.names:
+        columns["contract"] = events.column("contract").to_numpy()[rows]
+    return columns
+
+
+def _to_ms(times) -> np.ndarray:
+    """Convert datetimes to milliseconds since epoch, the same as the time column."""
+    return np.asarray(times, dtype="datetime64[ms]").astype(np.int64)
+
+
+def _ladder(columns: Dict, currencies: List[str], edges) -> pa.Table:
+    edges = np.asarray(edges, dtype="datetime64[ms]")
+    num_buckets = len(edges) - 1
+    bucket = np.searchsorted(_to_ms(edges), columns["time"], "right") - 1
+    inside = (bucket >= 0) & (bucket < num_buckets)
+    key = columns["unit"][inside] * num_buckets + bucket[inside]
+    size = len(currencies) * num_buckets
+    total = np.bincount(
+        key, weights=columns["quantity"][inside], minlength=size
+    )
+    count = np.bincount(key, minlength=size)
+
+    unit, bucket = np.divmod(np.arange(size), num_buckets)
+    return pa.table(
+        {
+            "unit": dict_array(unit, currencies),
+            "start": ts_array(edges[bucket]),
+            "end": ts_array(edges[bucket + 1]),
+            "quantity": pa.array(total),
+            "count": pa.array(count),
+        }
+    )
+
+
+def cashflow_ladder(
+    events, currencies: List[str], edges, unconditional: bool = False
+) -> pa.Table:
+    """Aggregate the cashflows of a timetable, or a portfolio, into time buckets.
+
+    Args:
+        events: the events of a timetable, or a portfolio table.
+        currencies: the currency units. Only `+` events in these units are included.
+        edges: the sorted bucket edges, as datetimes. Bucket i contains the cashflows with edges[i] <= time < edges[i+1].
+        unconditional: if true, exclude the cashflows that come after a choice or a condition
+            of the same contract, on any of its tracks, e.g. the coupons after a call date.
+
+    Returns:
+        A table with the columns unit, start, end, quantity, and count, with one row for each currency and bucket.
+
+    Examples:
+        >>> tt = FixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE").timetable()
+        >>> ladder = cashflow_ladder(tt["events"], ["USD"], [datetime(2024, 1, 1), datetime(2025, 1, 1), datetime(2026, 1, 1)])
+        >>> [round(x, 6) for x in ladder.column("quantity").to_pylist()]
+        [0.05, 1.05]
+    """
+    return _ladder(
+        _select(events, currencies, unconditional), currencies, edges
+    )
+
+
+class CashflowIndex:
+    """The cashflows of a timetable, or a portfolio, sorted by time, for repeated queries.
+    The cashflows are selected, and sorted, once when the index is created.
+
+    Args:
+        events: the events of a timetable, or a portfolio table.
+        currencies: the currency units. Only `+` events in these units are included.
+        unconditional: if true, exclude the cashflows that come after a choice or a condition
+            of the same contract, on any of its tracks.
+
+    Examples:
+        >>> tt = FixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE").timetable()
+        >>> index = CashflowIndex(tt["events"], ["USD"])
+        >>> index.between(datetime(2024, 1, 1), datetime(2025, 1, 1)).column("quantity").to_pylist()
+        [0.025, 0.025]
+    """
+
+    def __init__(
+        self, events, currencies: List[str], unconditional: bool = False
+    ):
+        self.currencies = list(currencies)
+        columns = _select(events, self.currencies, unconditional)
+        order = np.argsort(columns["time"], kind="stable")
+        self._columns = {k: v[order] for k, v in columns.items()}
+
+    def __len__(self):
+        return len(self._columns["time"])
+
+    def between(self, start, end) -> pa.Table:
+        """The cashflows with start <= time < end, sorted by time.
+
+        Args:
+            start: the start datetime.
+            end: the end datetime.
+        """
+        time = self._columns["time"]
+        lo, hi = np.searchsorted(time, _to_ms([start, end]), "left")
+        cols = {k: v[lo:hi] for k, v in self._columns.items()}
+        table = {}
+        if "contract" in cols:
+            table["contract"] = pa.array(cols["contract"])
+        table["time"] = pa.array(cols["time"], type=pa.int64()).cast(TS_TYPE)
+        table["unit"] = dict_array(cols["unit"], self.currencies)
+        table["quantity"] = pa.array(cols["quantity"])
+        return pa.table(table)
+
+    def ladder(self, edges) -> pa.Table:
+        """Aggregate the cashflows into time buckets, see [cashflow_ladder][qablet_contracts.ladder.cashflow_ladder].
+
+        Args:
+            edges: the sorted bucket edges, as datetimes.
+        """
+        return _ladder(self._columns, self.currencies, edges)
@@ -0,0 +1,244 @@
+"""
+This module contains the portfolio table, where the timetables of many contracts are stored
+in a single pyarrow recordbatch. The contract column identifies the contract of each event,
+and the expressions of all contracts are merged into a single dictionary.
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.timetable import (
+    event_schema,
+    timetable_from_arrays,
+)
+
+
+def portfolio_schema(dtype=np.float64) -> pa.Schema:
+    """Schema of the portfolio table, i.e. the contract id followed by the event schema."""
+    return pa.schema(
+        [pa.field("contract", pa.int64())] + list(event_schema(dtype))
+    )
+
+
+PORTFOLIO_SCHEMA = portfolio_schema(np.float64)
+DEFAULT_BLOCK_ROWS = 65536
+
+
+def ragged_index(counts):
+    """For groups of the given sizes laid out one after another, return the group of each element,
+    and the position of each element within its group."""
+    counts = np.asarray(counts, dtype=np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, np.arange(len(owner)) - first[owner]
+
+
+def portfolio_from_arrays(
+    contract,
+    time,
+    op,
+    quantity,
+    unit,
+    track,
+    expressions: Optional[Dict] = None,
+    dtype=np.float64,
+) -> Dict:
+    """Create a portfolio table from columns, see
+    [timetable_from_arrays][qablet_contracts.timetable.timetable_from_arrays].
+
+    Args:
+        contract: the contract id of each event.
+        time: the time of each event, as datetime64.
+        op: the op of each event.
+        quantity: the quantity of each event.
+        unit: the unit of each event.
+        track: the track of each event.
+        expressions: the expressions of all contracts.
+        dtype: the dtype of the quantities.
+    """
+    tt = timetable_from_arrays(
+        time, op, quantity, unit, track, expressions, dtype
+    )
+    contract = pa.array(np.asarray(contract, dtype=np.int64))
+    tt["events"] = pa.RecordBatch.from_arrays(
+        [contract] + tt["events"].columns, schema=portfolio_schema(dtype)
+    )
+    return tt
+
+
+def portfolio_from_timetables(
+    timetables: List[Dict], dtype=np.float64
+) -> Dict:
+    """Create a portfolio table from the timetables of a list of contracts. The contract id of
+    each event is the position of its timetable in the list. The names of the expressions
+    must be unique across contracts, e.g. by using different tracks.
+
+    Args:
+        timetables: a list of timetables.
+        dtype: the dtype of the quantities.
+    """
+    schema = portfolio_schema(dtype)
+    batches = []
+    expressions = {}
+    for i, tt in enumerate(timetables):
+        events = tt["events"]
+        contract = pa.array(np.full(len(events), i, dtype=np.int64))
+        columns = [events.column(name) for name in events.schema.names]
+        columns[2] = columns[2].cast(schema.field("quantity").type)
+        batches.append(
+            pa.RecordBatch.from_arrays([contract] + columns, schema=schema)
+        )
+        expressions.update(tt.get("expressions", {}))
+
+    table = pa.Table.from_batches(batches, schema=schema)
+    table = table.unify_dictionaries().combine_chunks()
+    events = table.to_batches()
+    return {
+        "events": events[0]
+        if events
+        else pa.RecordBatch.from_pylist([], schema=schema),
+        "expressions": expressions,
+    }
+
+
+def _sorted_runs(
+    contract: np.ndarray, times: np.ndarray, chunk: int = 1 << 20
+):
+    """The start and end of each run of rows of the same contract, checking that each run is sorted by time.
+    The rows are scanned in chunks, so that the temporary arrays do not grow with the number of rows."""
+    n = len(contract)
+    starts = [np.zeros(min(n, 1), dtype=np.int64)]
+    for lo in range(0, n - 1, chunk):
+        hi = min(lo + chunk, n - 1)
+        same = contract[lo + 1 : hi + 1] == contract[lo:hi]
+        if (same & (times[lo + 1 : hi + 1] < times[lo:hi])).any():
+            raise ValueError("the events of a contract are not sorted by time")
+        starts.append(np.flatnonzero(~same) + lo + 1)
+    starts = np.concatenate(starts)
+    return starts, np.append(starts[1:], n)
+
+
+def _search_after(times: np.ndarray, lo, hi, limit) -> np.ndarray:
+    """For sorted runs [lo, hi) whose first time is on or before the limit, the first position
+    of each run with a time after the limit. A galloping search from the start of each run,
+    so that the cost is the log of the number of rows taken, not of the length of the run."""
+    a, b = lo + 1, hi.copy()
+    width = 1
+    pending = a < b
+    while pending.any():
+        probe = np.minimum(a + width - 1, b - 1)
+        ok = pending & (times[np.where(pending, probe, 0)] <= limit)
+        b = np.where(pending & ~ok, probe, b)
+        a = np.where(ok, probe + 1, a)
+        pending = ok & (a < b)
+        width *= 2
+    # the answer is in [a, b]
+    pending = a < b
+    while pending.any():
+        mid = (a + b) // 2
+        ok = pending & (times[np.where(pending, mid, 0)] <= limit)
+        a = np.where(ok, mid + 1, a)
+        b = np.where(pending & ~ok, mid, b)
+        pending = a < b
+    return a
+
+
+def merge_events(
+    events, window=None, block_rows: int = DEFAULT_BLOCK_ROWS
+) -> Iterator[pa.RecordBatch]:
+    """Iterate over the events of a portfolio table in time order, one time step, or one time window,
+    at a time. The rows of each contract must be sorted by time, as in a timetable, but the table itself
+    need not be, e.g. a portfolio table of many timetables.
+
+    The runs of rows of each contract are merged a block of time at a time, without sorting the table.
+    The rows of a block are sorted by time, and split into batches, so that the cost of a batch doesn't grow
+    with the number of runs. The rows of a batch are in time order, the rows at the same time are in the order
+    of the table, so the order of the rows of a contract at the same time, e.g. a `>` followed by a `+`, is kept.
+    Besides the batches, the memory used is proportional to the number of runs, i.e. to the number of contracts,
+    and to the rows of a block.
+
+    Args:
+        events: the events of a portfolio table, or a timetable, as a recordbatch or a table.
+        window: the length of the time window of each batch, as a timedelta of at least 1ms. By default,
+            each batch has the events of a single time.
+        block_rows: the number of rows of a block, approximately, or of the runs if there are more.
+
+    Examples:
+        >>> pf = portfolio_from_timetables([bond.timetable() for bond in bonds])
+        >>> for batch in merge_events(pf["events"], window=np.timedelta64(7, "D")):
+        ...     process(batch)
+    """
+    if isinstance(events, pa.Table):
+        batches = events.unify_dictionaries().combine_chunks().to_batches()
+        if not batches:
+            return
+        events = batches[0]
+    times = events.column("time").view(pa.int64()).to_numpy()
+    if "contract" in events.schema.names:
+        contract = events.column("contract").to_numpy()
+    else:
+        contract = np.zeros(len(events), dtype=np.int64)
+    step = 1 if window is None else int(window / np.timedelta64(1, "ms"))
+    if step <= 0:
+        raise ValueError(f"window must be at least 1ms, got {window}")
+    if not len(times):
+        return
+
+    cursor, end = _sorted_runs(contract, times)
+    # the time of the next row of each run, or a sentinel once the run is done
+    done = np.iinfo(np.int64).max
+    head = times[cursor]
+    # the length of time of a block, adjusted to take about target rows at a time
+    target = max(block_rows, len(head))
+    span = max(
+        step,
+        (int(times.max()) - int(times.min()) + 1) * target // len(times),
+    )
+    carry = np.zeros(0, dtype=np.int64)  # the rows of an unfinished batch
+    carry_end = 0
+    while True:
+        first = int(head.min()) if len(head) else done
+        if first == done:
+            if not len(carry):
+                break
+            limit, rows = done, carry
+        else:
+            limit = max(first + span - 1, carry_end)
+            moving = np.flatnonzero(head <= limit)
+            lo = cursor[moving]
+            hi = _search_after(times, lo, end[moving], limit)
+            owner, pos = ragged_index(hi - lo)
+            rows = lo[owner] + pos
+            cursor[moving] = hi
+            finished = hi >= end[moving]
+            head[moving] = np.where(
+                finished, done, times[np.minimum(hi, len(times) - 1)]
+            )
+            # drop the runs that are done, once they are the majority
+            if (head == done).sum() * 2 > len(head):
+                keep = head != done
+                cursor, end, head = cursor[keep], end[keep], head[keep]
+            if len(rows) * 2 < target:
+                span *= 2
+            elif len(rows) > 2 * target:
+                span = max(step, span // 2)
+            # the carried rows are before the rows of the block
+            rows = np.concatenate([carry, rows])
+        t = times[rows]
+        order = np.argsort(t, kind="stable")
+        rows, t = rows[order], t[order]
+
+        # split the block into batches, the last one is carried if later rows may belong to it
+        bounds = [0]
+        while bounds[-1] < len(rows):
+            batch_end = int(t[bounds[-1]]) + step - 1
+            if limit != done and batch_end > limit:
+                break
+            bounds.append(int(np.searchsorted(t, batch_end, side="right")))
+        carry = rows[bounds[-1] :]
+        carry_end = batch_end if len(carry) else 0
+        block = events.take(pa.array(rows[: bounds[-1]]))
+        for a, size in zip(bounds, np.diff(bounds).tolist()):
+            yield block.slice(a, size)
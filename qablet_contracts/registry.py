@@ -0,0 +1,225 @@
+"""
+This module contains the registry of contract types, which maps each contract dataclass to a type code,
+and an arrow struct type of its fields. With it, contracts of mixed types can be stored in a single
+arrow table (and in parquet files), and recreated from it, without pickling.
+
+The table has a `type` column with the type code of each contract, and a struct column for each type,
+named by its type code, which is null in the rows of the other types.
+
+Contract types from other packages are registered with [register][qablet_contracts.registry.register],
+or through an entry point in the `qablet_contracts.contracts` group, which refers to the contract class.
+"""
+
+import dataclasses
+import typing
+from datetime import datetime
+from importlib.metadata import entry_points
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import qablet_contracts
+from qablet_contracts.timetable import dict_array
+
+ENTRY_POINT_GROUP = "qablet_contracts.contracts"
+
+# the arrow type of each field annotation, a python datetime has microsecond precision
+_SCALAR_TYPES = {
+    str: pa.string(),
+    float: pa.float64(),
+    int: pa.int64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp("us"),
+    dict: pa.map_(pa.string(), pa.float64()),
+}
+
+_TYPES: Dict[str, type] = {}  # type code -> class
+_CODES: Dict[type, str] = {}  # class -> type code
+_loaded = False
+
+
+def _arrow_type(hint) -> pa.DataType:
+    if typing.get_origin(hint) in (list, List):
+        [item] = typing.get_args(hint)
+        return pa.list_(_arrow_type(item))
+    if hint in _SCALAR_TYPES:
+        return _SCALAR_TYPES[hint]
+    raise TypeError(f"no arrow type for the annotation {hint}")
+
+
+def struct_type(cls) -> pa.StructType:
+    """The arrow struct type of the fields of a contract dataclass."""
+    hints = typing.get_type_hints(cls)
+    return pa.struct(
+        [
+            pa.field(f.name, _arrow_type(hints[f.name]))
+            for f in dataclasses.fields(cls)
+        ]
+    )
+
+
+def register(cls=None, code: Optional[str] = None):
+    """Register a contract dataclass, with a type code, by default its class name.
+    It can be used as a class decorator, with or without the code.
+
+    Args:
+        cls: the contract class.
+        code: the type code.
+
+    Examples:
+        >>> @register(code="MyOption")
+        ... @dataclass
+        ... class MyOption(Option):
+        ...     pass
+    """
+    if cls is None:
+        return lambda cls: register(cls, code)
+    code = code or cls.__name__
+    if _TYPES.get(code, cls) is not cls:
+        raise ValueError(f"type code {code} is already registered")
+    struct_type(cls)  # check that all fields have an arrow type
+    _TYPES[code] = cls
+    _CODES[cls] = code
+    return cls
+
+
+def _entry_points(group: str):
+    """The entry points of a group. Python 3.9 returns a dict of all groups, and takes no group argument."""
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group=group)
+    return eps.get(group, [])
+
+
+def _load():
+    """Register the contract classes of this package, and the plugins, the first time they are needed."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    for name in qablet_contracts.__all__:
+        cls = getattr(qablet_contracts, name)
+        if dataclasses.is_dataclass(cls) and cls not in _CODES:
+            register(cls)
+    for ep in _entry_points(ENTRY_POINT_GROUP):
+        cls = ep.load()
+        if cls not in _CODES:
+            register(cls, ep.name)
+
+
+def contract_types() -> Dict[str, type]:
+    """Return the registered contract classes, by type code."""
+    _load()
+    return dict(_TYPES)
+
+
+def type_code(cls) -> str:
+    """Return the type code of a registered contract class."""
+    _load()
+    if cls not in _CODES:
+        raise KeyError(f"{cls.__name__} is not a registered contract type")
+    return _CODES[cls]
+
+
+def _values(contracts, name: str, arrow_type: pa.DataType) -> pa.Array:
+    """The values of a field of the contracts, as an arrow array."""
+    values = [getattr(c, name) for c in contracts]
+    if pa.types.is_list(arrow_type):
+        values = [None if v is None else list(v) for v in values]
+    elif pa.types.is_map(arrow_type):
+        values = [None if v is None else list(v.items()) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def to_table(contracts: List) -> pa.Table:
+    """Store a list of contracts of registered types in an arrow table. The contracts of each type
+    are converted one field at a time.
+
+    Args:
+        contracts: a list of contracts.
+
+    Examples:
+        >>> table = to_table([Option("USD", "SPX", 2900, datetime(2024, 3, 31), True), Bond("USD", datetime(2025, 3, 31))])
+        >>> table.column("type").to_pylist()
+        ['Option', 'Bond']
+    """
+    codes = [type_code(type(c)) for c in contracts]
+    names, inverse = np.unique(
+        np.array(codes, dtype=object), return_inverse=True
+    )
+    inverse = inverse.ravel()
+
+    columns = {"type": dict_array(inverse, list(names))}
+    for i, code in enumerate(names):
+        cls = _TYPES[code]
+        rows = np.flatnonzero(inverse == i)
+        struct = struct_type(cls)
+        selected = [contracts[r] for r in rows]
+        values = pa.StructArray.from_arrays(
+            [_values(selected, f.name, f.type) for f in struct],
+            fields=list(struct),
+        )
+        # scatter the values to their rows, with nulls in the rows of other types
+        take = np.full(len(contracts), len(rows))
+        take[rows] = np.arange(len(rows))
+        values = pa.concat_arrays([values, pa.nulls(1, struct)])
+        columns[code] = values.take(pa.array(take))
+    return pa.table(columns)
+
+
+def _field_value(value, arrow_type: pa.DataType):
+    if pa.types.is_map(arrow_type) and value is not None:
+        return dict(value)
+    return value
+
+
+def from_table(table: pa.Table) -> List:
+    """Recreate the contracts stored in a table by [to_table][qablet_contracts.registry.to_table].
+
+    Args:
+        table: the table of contracts.
+    """
+    _load()
+    table = table.unify_dictionaries().combine_chunks()
+    type_column = table.column("type").chunk(0) if len(table) else None
+    contracts = [None] * len(table)
+    if type_column is None:
+        return contracts
+
+    codes = type_column.indices.to_numpy()
+    for i, code in enumerate(type_column.dictionary.to_pylist()):
+        cls = _TYPES[code]
+        struct = struct_type(cls)
+        rows = np.flatnonzero(codes == i)
+        values = table.column(code).chunk(0).take(pa.array(rows))
+        fields = [
+            [_field_value(v, f.type) for v in values.field(f.name).to_pylist()]
+            if pa.types.is_map(f.type)
+            else values.field(f.name).to_pylist()
+            for f in struct
+        ]
+        # the fields are in the order of the dataclass, i.e. of its positional arguments
+        for r, args in zip(rows, zip(*fields)):
+            contracts[r] = cls(*args)
+    return contracts
+
+
+def type_columns(table: pa.Table, code: str) -> pa.Table:
+    """The fields of the contracts of one type in a table, as columns, e.g. to pass them to a batch
+    timetable builder without creating the contracts.
+
+    Args:
+        table: the table of contracts.
+        code: the type code.
+
+    Examples:
+        >>> bonds = type_columns(table, "FixedBond")
+        >>> tt = fixed_bond_batch("USD", bonds["coupon"], bonds["accrual_start"], bonds["maturity"])
+    """
+    mask = pc.equal(table.column("type").cast(pa.string()), code)
+    values = table.filter(mask).column(code).combine_chunks()
+    return pa.Table.from_arrays(
+        values.flatten(), schema=pa.schema(list(values.type))
+    )
@@ -0,0 +1,410 @@
+"""
+This module contains a local timetable service, which builds the timetables of contracts for other processes,
+over a unix socket or a localhost port, with asyncio. It runs offline, and needs no other packages.
+
+Requests of the same contract type that arrive within a short window are coalesced into a single build,
+e.g. the events of many options are converted to arrow in one call, instead of one call per option.
+The number of builds in progress is limited, and the service keeps metrics of the latency of the requests,
+and the depth of the queues.
+
+A request is a table of contracts, see [to_table][qablet_contracts.registry.to_table], and the response
+is the events of their timetables, as a portfolio table whose contract ids are the positions in the request.
+Both are in the arrow IPC stream format. The expressions are not sent, as they are python functions,
+a client that needs them can call the expressions of the contracts.
+
+Each message has a header with the size of its payload, its kind (or status), and the id of the request,
+so that a client can send several requests on a connection without waiting for the responses.
+
+Examples:
+    >>> service = TimetableService(window=0.002)
+    >>> server = await service.start(path="/tmp/timetables.sock")
+    >>> client = await TimetableClient.connect(path="/tmp/timetables.sock")
+    >>> events = await client.timetable(Option("USD", "SPX", 2900, datetime(2024, 3, 31), True))
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.portfolio import (
+    portfolio_from_timetables,
+    portfolio_schema,
+)
+from qablet_contracts.registry import from_table, to_table, type_code
+from qablet_contracts.timetable import EventsMixin
+
+# size of the payload, kind of request (or status of response), and request id
+_HEADER = struct.Struct("<IBI")
+REQUEST_TIMETABLE = 1
+REQUEST_METRICS = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+logger = logging.getLogger(__name__)
+
+
+def _to_ipc(data) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, data.schema) as writer:
+        writer.write(data)
+    return sink.getvalue().to_pybytes()
+
+
+def _from_ipc(payload: bytes) -> pa.Table:
+    return pa.ipc.open_stream(payload).read_all()
+
+
+def _as_batch(table: pa.Table, schema: pa.Schema) -> pa.RecordBatch:
+    table = table.unify_dictionaries().combine_chunks()
+    batches = table.to_batches()
+    return (
+        batches[0]
+        if batches
+        else pa.RecordBatch.from_pylist([], schema=schema)
+    )
+
+
+def batch_events(contracts: List, dtype=np.float64) -> pa.RecordBatch:
+    """The events of a list of contracts of the same type, as a portfolio table whose contract ids are the positions
+    in the list. The events of [EventsMixin][qablet_contracts.timetable.EventsMixin] contracts are converted to arrow
+    in a single call, the timetables of other contracts, including those that override the timetable
+    of EventsMixin with a columnar one, are concatenated.
+
+    Args:
+        contracts: a list of contracts.
+        dtype: the dtype of the quantities.
+    """
+    schema = portfolio_schema(dtype)
+    if all(
+        isinstance(c, EventsMixin)
+        and type(c).timetable is EventsMixin.timetable
+        for c in contracts
+    ):
+        rows = [
+            {**event, "contract": i}
+            for i, contract in enumerate(contracts)
+            for event in contract.events()
+        ]
+        return pa.RecordBatch.from_pylist(rows, schema=schema)
+    timetables = [c.timetable(dtype) for c in contracts]
+    return portfolio_from_timetables(timetables, dtype)["events"]
+
+
+class TimetableService:
+    """A service that builds the timetables of contracts, coalescing the requests of each contract type,
+    see the [module][qablet_contracts.service].
+
+    Args:
+        window: the seconds to wait for more requests of a type, after the first one.
+        max_batch: the largest number of contracts in a build, a full batch is built without waiting.
+        max_concurrency: the largest number of builds in progress, in a thread pool.
+        latency_samples: the number of recent requests in the latency percentiles.
+        percentiles: the percentiles of the latency in the metrics.
+        dtype: the dtype of the quantities.
+        batch_builders: builders for some type codes, which take a list of contracts, and return
+            their events, as [batch_events][qablet_contracts.service.batch_events].
+
+    If the build of a batch fails, its contracts are built one at a time, so that the requests
+    of other clients in the same batch still succeed, and only the requests with a bad contract fail.
+    """
+
+    def __init__(
+        self,
+        window: float = 0.002,
+        max_batch: int = 1024,
+        max_concurrency: int = 4,
+        latency_samples: int = 10_000,
+        percentiles=(50, 90, 99),
+        dtype=np.float64,
+        batch_builders: Optional[Dict[str, Callable]] = None,
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_concurrency = max_concurrency
+        self.percentiles = percentiles
+        self.dtype = dtype
+        self.batch_builders = dict(batch_builders or {})
+        self.schema = portfolio_schema(dtype)
+        self._executor = ThreadPoolExecutor(max_concurrency)
+        self._semaphore = None  # created in the event loop
+        self._queues: Dict[str, List] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self._latencies = deque(maxlen=latency_samples)
+        self._counters = {
+            "requests": 0,
+            "contracts": 0,
+            "batches": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+        }
+        self._building = 0
+
+    def _build(self, code: str, contracts: List) -> pa.RecordBatch:
+        builder = self.batch_builders.get(code)
+        if builder is None:
+            return batch_events(contracts, self.dtype)
+        return builder(contracts)
+
+    def _enqueue(self, contract) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        code = type_code(type(contract))
+        future = loop.create_future()
+        queue = self._queues.setdefault(code, [])
+        queue.append((contract, future))
+        depth = sum(len(q) for q in self._queues.values())
+        self._counters["max_queue_depth"] = max(
+            self._counters["max_queue_depth"], depth
+        )
+        if len(queue) >= self.max_batch:
+            self._flush(code)
+        elif len(queue) == 1:
+            self._timers[code] = loop.call_later(
+                self.window, self._flush, code
+            )
+        return future
+
+    def _flush(self, code: str):
+        timer = self._timers.pop(code, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._queues.pop(code, [])
+        if items:
+            task = asyncio.ensure_future(self._build_batch(code, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_build(self, code: str, contracts: List):
+        """Build in the thread pool, and return the events, or the exception raised by the build."""
+        async with self._semaphore:
+            self._building += 1
+            try:
+                [result] = await asyncio.gather(
+                    asyncio.get_running_loop().run_in_executor(
+                        self._executor, self._build, code, contracts
+                    ),
+                    return_exceptions=True,
+                )
+            finally:
+                self._building -= 1
+        if not isinstance(result, BaseException):
+            self._counters["batches"] += 1
+        return result
+
+    async def _build_batch(self, code: str, items: List):
+        contracts = [c for c, _ in items]
+        events = await self._run_build(code, contracts)
+        if isinstance(events, BaseException):
+            if len(items) == 1:
+                results = [events]
+            else:  # find the bad contracts, the others still get their events
+                results = await asyncio.gather(
+                    *[self._run_build(code, [c]) for c in contracts]
+                )
+        else:
+            # the rows of each contract are contiguous, in the order of the contracts
+            contract = events.column("contract").to_numpy()
+            bounds = np.searchsorted(contract, np.arange(len(items) + 1))
+            results = [
+                events.slice(bounds[i], bounds[i + 1] - bounds[i])
+                for i in range(len(items))
+            ]
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def timetables(self, contracts: List) -> pa.RecordBatch:
+        """The events of the timetables of a list of contracts, as a portfolio table, whose contract ids
+        are the positions in the list. The contracts are built in batches with the contracts of other requests.
+
+        Args:
+            contracts: a list of contracts, of registered types.
+        """
+        start = time.perf_counter()
+        self._counters["requests"] += 1
+        self._counters["contracts"] += len(contracts)
+        try:
+            futures = [self._enqueue(c) for c in contracts]
+            parts = await asyncio.gather(*futures)
+        except Exception:
+            self._counters["errors"] += 1
+            raise
+        ids = np.repeat(np.arange(len(parts)), [len(p) for p in parts])
+        table = pa.Table.from_batches(parts, schema=self.schema)
+        table = table.set_column(0, "contract", pa.array(ids, pa.int64()))
+        events = _as_batch(table, self.schema)
+        self._latencies.append(time.perf_counter() - start)
+        return events
+
+    def metrics(self) -> Dict:
+        """The counters of the requests, contracts, batches and errors, the mean batch size, the current and
+        the largest number of contracts waiting in the queues, the number of builds in progress,
+        and the percentiles of the latency of recent requests, in seconds."""
+        counters = dict(self._counters)
+        batches = counters["batches"]
+        latencies = np.array(self._latencies)
+        metrics = {
+            **counters,
+            "mean_batch_size": counters["contracts"] / batches
+            if batches
+            else 0.0,
+            "queue_depth": sum(len(q) for q in self._queues.values()),
+            "building": self._building,
+        }
+        for p in self.percentiles:
+            metrics[f"latency_p{p}"] = (
+                float(np.percentile(latencies, p)) if len(latencies) else 0.0
+            )
+        return metrics
+
+    async def _respond(self, kind, request_id, payload, writer, lock):
+        try:
+            if kind == REQUEST_TIMETABLE:
+                contracts = from_table(_from_ipc(payload))
+                data = _to_ipc(await self.timetables(contracts))
+            elif kind == REQUEST_METRICS:
+                data = json.dumps(self.metrics()).encode()
+            else:
+                raise ValueError(f"unknown request kind {kind}")
+            status = STATUS_OK
+        except Exception as e:
+            logger.exception("request %d failed", request_id)
+            status, data = STATUS_ERROR, f"{type(e).__name__}: {e}".encode()
+        async with lock:
+            writer.write(_HEADER.pack(len(data), status, request_id) + data)
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(_HEADER.size)
+                size, kind, request_id = _HEADER.unpack(header)
+                payload = await reader.readexactly(size)
+                task = asyncio.ensure_future(
+                    self._respond(kind, request_id, payload, writer, lock)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def start(
+        self,
+        path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> asyncio.AbstractServer:
+        """Start serving on a unix socket, if a path is given, or else on a localhost port.
+
+        Args:
+            path: the path of the unix socket.
+            host: the host, a loopback address, or localhost.
+            port: the port, by default any free port.
+        """
+        if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+            raise ValueError(
+                f"the service is local, {host} is not a loopback address"
+            )
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path=path)
+        return await asyncio.start_server(self._handle, host=host, port=port)
+
+    def close(self):
+        """Stop the thread pool of the builds."""
+        self._executor.shutdown(wait=False)
+
+
+class TimetableClient:
+    """A client of a [TimetableService][qablet_contracts.service.TimetableService], which can send
+    several requests at a time on one connection. Use [connect][qablet_contracts.service.TimetableClient.connect]
+    to create it."""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(
+        cls,
+        path: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+    ) -> "TimetableClient":
+        """Connect to a service, on a unix socket, if a path is given, or else on a port."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                header = await self._reader.readexactly(_HEADER.size)
+                size, status, request_id = _HEADER.unpack(header)
+                payload = await self._reader.readexactly(size)
+                future = self._futures.pop(request_id, None)
+                if future is None or future.done():
+                    continue  # an unknown request, or one that was cancelled
+                if status == STATUS_OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload.decode()))
+        except (asyncio.IncompleteReadError, ConnectionResetError) as e:
+            for future in self._futures.values():
+                future.set_exception(ConnectionError(str(e)))
+            self._futures.clear()
+
+    async def _request(self, kind: int, payload: bytes) -> bytes:
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) % 2**32
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        self._writer.write(
+            _HEADER.pack(len(payload), kind, request_id) + payload
+        )
+        await self._writer.drain()
+        return await future
+
+    async def timetable(self, contracts) -> pa.RecordBatch:
+        """The events of the timetable of a contract, or of a list of contracts, as a portfolio table."""
+        if not isinstance(contracts, list):
+            contracts = [contracts]
+        payload = await self._request(
+            REQUEST_TIMETABLE, _to_ipc(to_table(contracts))
+        )
+        table = _from_ipc(payload)
+        return _as_batch(table, table.schema)
+
+    async def metrics(self) -> Dict:
+        """The metrics of the service."""
+        return json.loads(await self._request(REQUEST_METRICS, b""))
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
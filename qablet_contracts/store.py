@@ -0,0 +1,331 @@
+"""
+This module contains a portfolio store, i.e. a portfolio table that can be updated incrementally,
+by appending and removing contracts, without rebuilding the table from all the contracts.
+
+The events are kept in chunks, one per append, with the rows of each contract contiguous.
+A removal only marks the contracts of a chunk as removed, and a chunk is rewritten
+by compaction, when the fraction of its rows that are removed passes a threshold.
+Small chunks, e.g. from appending one trade at a time, are merged by [compact][qablet_contracts.store.PortfolioStore.compact].
+The cost of an update depends on the size of the change, and of the chunks it touches, not on the size of the portfolio.
+
+Chunks are never modified, an update replaces them, so a snapshot is a zero-copy view of the chunks
+at the time it was taken (slices of the rows of the contracts that were live), which is not affected
+by later updates. The expressions of a name must be the same in all the contracts of the store,
+an append with a different expression of a name that is already in the store raises a ValueError.
+"""
+
+import threading
+from collections import ChainMap
+from typing import Dict, List
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.fingerprint import expression_spec
+from qablet_contracts.portfolio import (
+    portfolio_from_timetables,
+    portfolio_schema,
+)
+
+DEFAULT_CHUNK_ROWS = 65536
+DEFAULT_COMPACT_THRESHOLD = 0.25
+
+
+class _Chunk:
+    """An immutable chunk of events, with the contracts in ascending order of their ids.
+
+    Args:
+        events: the events, with the rows of each contract contiguous.
+        contracts: the ids of the contracts in the chunk.
+        offsets: the first row of each contract, and the number of rows.
+        expressions: the expressions of the contracts.
+        alive: whether each contract is live, by default all.
+    """
+
+    __slots__ = (
+        "_live_expressions",
+        "alive",
+        "contracts",
+        "events",
+        "expressions",
+        "offsets",
+    )
+
+    def __init__(self, events, contracts, offsets, expressions, alive=None):
+        self.events = events
+        self.contracts = contracts
+        self.offsets = offsets
+        self.expressions = expressions
+        self.alive = (
+            np.ones(len(contracts), dtype=bool) if alive is None else alive
+        )
+        self._live_expressions = None
+
+    @property
+    def rows(self) -> int:
+        return len(self.events)
+
+    @property
+    def dead_rows(self) -> int:
+        counts = np.diff(self.offsets)
+        return int(counts[~self.alive].sum())
+
+    def remove(self, positions: np.ndarray) -> "_Chunk":
+        """A chunk with the contracts at the positions removed."""
+        alive = self.alive.copy()
+        alive[positions] = False
+        return _Chunk(
+            self.events, self.contracts, self.offsets, self.expressions, alive
+        )
+
+    def slices(self) -> List[pa.RecordBatch]:
+        """Zero-copy slices of the rows of the live contracts, one per run of consecutive live contracts."""
+        if self.alive.all():
+            return [self.events]
+        edges = np.diff(self.alive.astype(np.int8), prepend=0, append=0)
+        starts = self.offsets[np.flatnonzero(edges == 1)]
+        ends = self.offsets[np.flatnonzero(edges == -1)]
+        return [
+            self.events.slice(s, e - s)
+            for s, e in zip(starts.tolist(), ends.tolist())
+        ]
+
+    def live_expressions(self) -> Dict:
+        """The expressions of the live contracts, computed once, as the chunk is immutable."""
+        if self._live_expressions is None:
+            live = pa.Table.from_batches(
+                self.slices(), schema=self.events.schema
+            )
+            self._live_expressions = _used_expressions(self.expressions, live)
+        return self._live_expressions
+
+
+def _used_expressions(expressions: Dict, events) -> Dict:
+    """The expressions that the ops and units of the events (a record batch, or a table) refer to, with their inputs."""
+    names = set()
+    for col in ["op", "unit"]:
+        column = events.column(col)
+        arrays = (
+            column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+        )
+        for array in arrays:
+            codes = np.unique(array.indices.fill_null(-1).to_numpy())
+            values = array.dictionary.to_pylist()
+            names.update(values[c] for c in codes if c >= 0)
+    used = {}
+    stack = [n for n in names if n in expressions]
+    while stack:
+        name = stack.pop()
+        if name in used:
+            continue
+        used[name] = expressions[name]
+        stack += [i for i in used[name].get("inp", []) if i in expressions]
+    return used
+
+
+def _merged_expressions(chunks: List[_Chunk], live: bool = False) -> Dict:
+    """The expressions of the chunks, of all contracts or only the live ones. The names are
+    unique across chunks, see [append][qablet_contracts.store.PortfolioStore.append]."""
+    return dict(
+        ChainMap(
+            *[c.live_expressions() if live else c.expressions for c in chunks]
+        )
+    )
+
+
+def _check_expressions(expressions: Dict, existing: Dict):
+    """Raise a ValueError if an expression has a different definition from the expression of the same name in the store."""
+    for name, expr in expressions.items():
+        other = existing.get(name)
+        if other is None or other is expr:
+            continue
+        try:
+            same = expression_spec(expressions, name) == expression_spec(
+                existing, name
+            )
+        except TypeError:  # cannot be compared, unless it is the same object
+            same = False
+        if not same:
+            raise ValueError(
+                f"the expression {name} is different from the expression of the same name in the store, "
+                "use a different track for each contract"
+            )
+
+
+def _compacted(chunks: List[_Chunk], schema: pa.Schema) -> _Chunk:
+    """Rewrite the live contracts of one or more chunks into a single chunk."""
+    slices = [s for c in chunks for s in c.slices()]
+    table = pa.Table.from_batches(slices, schema=schema)
+    table = table.unify_dictionaries().combine_chunks()
+    batches = table.to_batches()
+    events = (
+        batches[0]
+        if batches
+        else pa.RecordBatch.from_pylist([], schema=schema)
+    )
+    counts = np.concatenate([np.diff(c.offsets)[c.alive] for c in chunks])
+    contracts = np.concatenate([c.contracts[c.alive] for c in chunks])
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    expressions = _used_expressions(_merged_expressions(chunks), events)
+    return _Chunk(events, contracts, offsets, expressions)
+
+
+class PortfolioStore:
+    """A portfolio table that can be updated incrementally, see the [module][qablet_contracts.store].
+    The store assigns an id to each contract that is appended, which is its contract id in the snapshots.
+    Updates may come from different threads, and readers can take snapshots while they are going on.
+
+    Args:
+        dtype: the dtype of the quantities.
+        compact_threshold: rewrite a chunk when this fraction of its rows is removed.
+        chunk_rows: the size up to which compaction merges small chunks.
+
+    Examples:
+        >>> store = PortfolioStore()
+        >>> ids = store.append(fixed_bond_batch("USD", [0.05, 0.04, 0.03], datetime(2023, 12, 31), datetime(2025, 12, 31)))
+        >>> store.remove([ids[1]])
+        >>> snapshot = store.snapshot()
+        >>> sorted(set(snapshot["events"].column("contract").to_pylist()))
+        [0, 2]
+    """
+
+    def __init__(
+        self,
+        dtype=np.float64,
+        compact_threshold: float = DEFAULT_COMPACT_THRESHOLD,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    ):
+        self.schema = portfolio_schema(dtype)
+        self.compact_threshold = compact_threshold
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        self._chunks: List[_Chunk] = []  # in ascending order of contract ids
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        """The number of live contracts."""
+        return sum(int(c.alive.sum()) for c in self._chunks)
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def fragmentation(self) -> float:
+        """The fraction of the rows in the chunks that belong to removed contracts."""
+        chunks = self._chunks
+        rows = sum(c.rows for c in chunks)
+        return sum(c.dead_rows for c in chunks) / rows if rows else 0.0
+
+    def contracts(self) -> np.ndarray:
+        """The ids of the live contracts."""
+        chunks = self._chunks
+        ids = [c.contracts[c.alive] for c in chunks]
+        return np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+
+    def append(self, contracts) -> np.ndarray:
+        """Append contracts to the store, and return their ids. The expressions must be the same as
+        the expressions of the same names that are already in the store, otherwise it raises a ValueError.
+
+        Args:
+            contracts: a portfolio table, e.g. from a batch builder, a list of timetables, or a single timetable.
+        """
+        if isinstance(contracts, list):
+            contracts = portfolio_from_timetables(contracts)
+        events = contracts["events"]
+        if isinstance(events, pa.Table):
+            events = events.unify_dictionaries().combine_chunks()
+            batches = events.to_batches()
+            events = (
+                batches[0]
+                if batches
+                else pa.RecordBatch.from_pylist([], schema=events.schema)
+            )
+
+        # the rows of each contract are made contiguous, in the order of the contract ids
+        if "contract" in events.schema.names:
+            contract = events.column("contract").to_numpy()
+        else:
+            contract = np.zeros(len(events), dtype=np.int64)
+        order = np.argsort(contract, kind="stable")
+        if (order != np.arange(len(order))).any():
+            events = events.take(pa.array(order))
+            contract = contract[order]
+        keys, first, counts = np.unique(
+            contract, return_index=True, return_counts=True
+        )
+        offsets = np.append(first, len(contract))
+        columns = [events.column(name) for name in self.schema.names[1:]]
+        columns[2] = columns[2].cast(self.schema.field("quantity").type)
+
+        expressions = dict(contracts.get("expressions", {}))
+        with self._lock:
+            _check_expressions(expressions, _merged_expressions(self._chunks))
+            ids = self._next_id + np.arange(len(keys), dtype=np.int64)
+            self._next_id += len(keys)
+            contract = pa.array(np.repeat(ids, counts))
+            chunk = _Chunk(
+                pa.RecordBatch.from_arrays(
+                    [contract] + columns, schema=self.schema
+                ),
+                ids,
+                offsets,
+                expressions,
+            )
+            if len(ids):
+                self._chunks = self._chunks + [chunk]
+        return ids
+
+    def remove(self, ids):
+        """Remove contracts from the store. The chunks where the removed rows pass the threshold are compacted.
+
+        Args:
+            ids: the ids of the contracts.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._lock:
+            chunks = list(self._chunks)
+            firsts = np.array([c.contracts[0] for c in chunks], dtype=np.int64)
+            which = np.searchsorted(firsts, ids, side="right") - 1
+            for i in np.unique(which[which >= 0]):
+                chunk = chunks[i]
+                wanted = ids[which == i]
+                positions = np.minimum(
+                    np.searchsorted(chunk.contracts, wanted),
+                    len(chunk.contracts) - 1,
+                )
+                positions = positions[chunk.contracts[positions] == wanted]
+                chunk = chunk.remove(positions)
+                if chunk.dead_rows > self.compact_threshold * chunk.rows:
+                    chunk = _compacted([chunk], self.schema)
+                chunks[i] = chunk
+            self._chunks = [c for c in chunks if len(c.contracts)]
+
+    def compact(self):
+        """Rewrite the chunks with removed contracts, and merge consecutive small chunks, up to chunk_rows rows."""
+        with self._lock:
+            chunks, group, rows = [], [], 0
+            for chunk in self._chunks + [None]:
+                live = 0 if chunk is None else chunk.rows - chunk.dead_rows
+                if group and (chunk is None or rows + live > self.chunk_rows):
+                    if len(group) == 1 and group[0].alive.all():
+                        chunks.append(group[0])
+                    else:
+                        chunks.append(_compacted(group, self.schema))
+                    group, rows = [], 0
+                if chunk is not None and live:
+                    group.append(chunk)
+                    rows += live
+            self._chunks = chunks
+
+    def snapshot(self) -> Dict:
+        """A zero-copy portfolio table of the live contracts, which is not affected by later updates.
+        The events are a table, with one or more record batches per chunk, and the expressions
+        are those of the live contracts.
+        """
+        chunks = self._chunks
+        slices = [s for c in chunks for s in c.slices()]
+        return {
+            "events": pa.Table.from_batches(slices, schema=self.schema),
+            "expressions": _merged_expressions(chunks, live=True),
+        }
@@ -1,23 +1,40 @@
 # Define the timetable schema
 
+import functools
+import inspect
+import json
+import threading
+import time as _time
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
 
+import numpy as np
 import pyarrow as pa
 
-DICT_TYPE = pa.dictionary(pa.int64(), pa.string())
+from qablet_contracts.display import format_events, write_events
+from qablet_contracts.fingerprint import fingerprint
 
-# Event Schema for the timetable, using timestamp for time
+DICT_TYPE = pa.dictionary(pa.int64(), pa.string())
 TS_TYPE = pa.timestamp("ms", tz="UTC")
-TS_EVENT_SCHEMA = pa.schema(
-    [
-        pa.field("time", TS_TYPE),
-        pa.field("op", DICT_TYPE),
-        pa.field("quantity", pa.float64()),
-        pa.field("unit", DICT_TYPE),
-        pa.field("track", DICT_TYPE),
-    ]
-)
+
+
+def event_schema(dtype=np.float64) -> pa.Schema:
+    """Event Schema for the timetable, using timestamp for time, and the given
+    numpy dtype (float64 or float32) for quantities."""
+    return pa.schema(
+        [
+            pa.field("time", TS_TYPE),
+            pa.field("op", DICT_TYPE),
+            pa.field("quantity", pa.from_numpy_dtype(np.dtype(dtype))),
+            pa.field("unit", DICT_TYPE),
+            pa.field("track", DICT_TYPE),
+        ]
+    )
+
+
+TS_EVENT_SCHEMA = event_schema(np.float64)
+TS_EVENT_SCHEMA_F32 = event_schema(np.float32)
 
 
 def py_to_ts(py_dt):
@@ -25,38 +42,335 @@ def py_to_ts(py_dt):
     return pa.scalar(py_dt, type=TS_TYPE)
 
 
+def dict_array(codes, dictionary) -> pa.DictionaryArray:
+    """Create a dictionary array from integer codes, and the list of values they refer to.
+    A code of -1 is a null."""
+    codes = np.asarray(codes, dtype=np.int64)
+    return pa.DictionaryArray.from_arrays(
+        indices=pa.array(codes, mask=codes < 0),
+        dictionary=pa.array(dictionary, type=pa.string()),
+    )
+
+
+def ts_array(times) -> pa.Array:
+    """Create a timestamp array from an array (or list) of datetimes."""
+    times = np.asarray(times, dtype="datetime64[ms]")
+    return pa.array(times).cast(TS_TYPE)
+
+
+def _as_dict_array(values) -> pa.Array:
+    """Convert a dictionary array, or a list (or array) of strings to a dictionary array of DICT_TYPE."""
+    if not isinstance(values, pa.DictionaryArray):
+        values = pa.array(values, type=pa.string()).dictionary_encode()
+    return values.cast(DICT_TYPE)
+
+
+class BuildProfile:
+    """Counters of the timetables built while profiling is enabled, see
+    [profile_build][qablet_contracts.timetable.profile_build].
+
+    For each contract class, the number of timetables built, the wall time of the builds, and the rows,
+    arrow bytes, and dictionary entries (by column) of the events. For each stage of the builds, i.e.
+    `events`, `expressions`, `schedule`, `dcf` and `arrow` (the creation of the record batch),
+    the number of calls, and the wall time. Stages can nest, e.g. `dcf` inside `events`,
+    and the time of a stage includes the stages within it.
+    """
+
+    def __init__(self):
+        self.classes: Dict[str, Dict] = {}
+        self.stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()  # the build in progress in each thread
+
+    @contextmanager
+    def stage(self, name: str):
+        start = _time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = _time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(
+                    name, {"calls": 0, "seconds": 0.0}
+                )
+                stage["calls"] += 1
+                stage["seconds"] += seconds
+
+    def _build(self, timetable, contract, *args, **kwargs):
+        """Build the timetable of a contract, and record it, unless it is nested in another build."""
+        if getattr(self._local, "building", False):
+            return timetable(contract, *args, **kwargs)
+        self._local.building = True
+        start = _time.perf_counter()
+        try:
+            tt = timetable(contract, *args, **kwargs)
+        finally:
+            self._local.building = False
+        seconds = _time.perf_counter() - start
+
+        events = tt["events"]
+        entries = {
+            f.name: len(col.dictionary)
+            for f, col in zip(events.schema, events.columns)
+            if pa.types.is_dictionary(f.type)
+        }
+        with self._lock:
+            stats = self.classes.setdefault(
+                type(contract).__name__,
+                {
+                    "count": 0,
+                    "seconds": 0.0,
+                    "rows": 0,
+                    "nbytes": 0,
+                    "dictionary_entries": {},
+                },
+            )
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["rows"] += events.num_rows
+            stats["nbytes"] += events.nbytes
+            for name, n in entries.items():
+                stats["dictionary_entries"][name] = (
+                    stats["dictionary_entries"].get(name, 0) + n
+                )
+        return tt
+
+    def report(self) -> Dict:
+        """The counters, as a dict of plain python values."""
+        with self._lock:
+            return json.loads(json.dumps(self._report()))
+
+    def _report(self) -> Dict:
+        return {"classes": self.classes, "stages": self.stages}
+
+    def to_json(self, **kwargs) -> str:
+        """The counters, as a json string."""
+        with self._lock:
+            return json.dumps(self._report(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "qablet_timetable") -> str:
+        """The counters in the Prometheus text format, e.g. to write to a file for a local collector."""
+        metrics = [
+            ("builds_total", "Timetables built.", "class", "count"),
+            (
+                "build_seconds_total",
+                "Wall time of the builds.",
+                "class",
+                "seconds",
+            ),
+            ("rows_total", "Rows of the events.", "class", "rows"),
+            ("bytes_total", "Arrow bytes of the events.", "class", "nbytes"),
+            ("stage_calls_total", "Calls of each stage.", "stage", "calls"),
+            (
+                "stage_seconds_total",
+                "Wall time of each stage.",
+                "stage",
+                "seconds",
+            ),
+        ]
+        lines = []
+        with self._lock:
+            for name, help, label, key in metrics:
+                values = self.classes if label == "class" else self.stages
+                lines += [
+                    f"# HELP {prefix}_{name} {help}",
+                    f"# TYPE {prefix}_{name} counter",
+                ]
+                lines += [
+                    f'{prefix}_{name}{{{label}="{k}"}} {v[key]}'
+                    for k, v in sorted(values.items())
+                ]
+            name = f"{prefix}_dictionary_entries_total"
+            lines += [
+                f"# HELP {name} Dictionary entries of the events.",
+                f"# TYPE {name} counter",
+            ]
+            lines += [
+                f'{name}{{class="{k}",column="{col}"}} {n}'
+                for k, v in sorted(self.classes.items())
+                for col, n in v["dictionary_entries"].items()
+            ]
+        return "\n".join(lines) + "\n"
+
+
+_PROFILE: Optional[BuildProfile] = None
+_NO_STAGE = nullcontext()
+
+
+@contextmanager
+def profile_build(profile: Optional[BuildProfile] = None):
+    """Record the timetables built in all threads, within the context, in a
+    [BuildProfile][qablet_contracts.timetable.BuildProfile]. When it is not enabled,
+    the timetables are built without any recording.
+
+    Profiling is process-global, so that the builds in worker threads are recorded. It is not safe
+    to profile concurrent sessions, e.g. in different threads or asyncio tasks, as each would record
+    the builds of the others, and the contexts must be exited in the reverse order they are entered.
+
+    Args:
+        profile: a profile to add to, by default a new one.
+
+    Examples:
+        >>> with profile_build() as profile:
+        ...     FixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31)).timetable()
+        >>> profile.report()["classes"]["FixedBond"]["rows"]
+        4
+    """
+    global _PROFILE
+    previous = _PROFILE
+    _PROFILE = BuildProfile() if profile is None else profile
+    try:
+        yield _PROFILE
+    finally:
+        _PROFILE = previous
+
+
+def build_stage(name: str):
+    """A context that records the time of a stage of a build, if profiling is enabled."""
+    if _PROFILE is None:
+        return _NO_STAGE
+    return _PROFILE.stage(name)
+
+
+def _profiled(timetable):
+    """Wrap the timetable method of a contract class, to record its builds when profiling is enabled."""
+
+    @functools.wraps(timetable)
+    def wrapper(self, *args, **kwargs):
+        if _PROFILE is None:
+            return timetable(self, *args, **kwargs)
+        return _PROFILE._build(timetable, self, *args, **kwargs)
+
+    return wrapper
+
+
+def timetable_from_arrays(
+    time,
+    op,
+    quantity,
+    unit,
+    track,
+    expressions: Optional[Dict] = None,
+    dtype=np.float64,
+) -> Dict:
+    """Create a timetable from columns, instead of a list of dicts. Op, unit and track can be
+    dictionary arrays (see [dict_array][qablet_contracts.timetable.dict_array]), or lists of strings.
+
+    Args:
+        time: the time of each event, as datetime64 or datetime.
+        op: the op of each event.
+        quantity: the quantity of each event.
+        unit: the unit of each event.
+        track: the track of each event.
+        expressions: the expressions of the timetable.
+        dtype: the dtype of the quantities.
+    """
+    with build_stage("arrow"):
+        events = pa.RecordBatch.from_arrays(
+            [
+                ts_array(time),
+                _as_dict_array(op),
+                pa.array(np.asarray(quantity, dtype=dtype)),
+                _as_dict_array(unit),
+                _as_dict_array(track),
+            ],
+            schema=event_schema(dtype),
+        )
+    return {"events": events, "expressions": expressions or {}}
+
+
+def _accepts_dtype(method) -> bool:
+    """Return True if an expressions method takes a dtype argument, after self."""
+    params = list(inspect.signature(method).parameters.values())[1:]
+    return any(
+        p.kind
+        in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.VAR_POSITIONAL)
+        for p in params
+    )
+
+
 class Contract(ABC):
-    """A base class for contracts."""
+    """A base class for contracts. The timetable method of each subclass is wrapped to record its builds,
+    when profiling is enabled, see [profile_build][qablet_contracts.timetable.profile_build]."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "timetable" in cls.__dict__:
+            cls.timetable = _profiled(cls.__dict__["timetable"])
 
     @abstractmethod
-    def timetable(self): ...
+    def timetable(self, dtype=np.float64): ...
 
-    def to_string(self, index=False) -> str:
-        df = self.timetable()["events"].to_pandas()
-        df["time"] = df["time"].dt.strftime(
-            "%m/%d/%Y"
-        )  # replace timestamp by Date
-        return df.to_string(index=index)
+    def to_string(
+        self,
+        index=False,
+        head: Optional[int] = None,
+        tail: Optional[int] = None,
+    ) -> str:
+        """Format the events of the timetable, optionally only the first head and last tail rows,
+        see [format_events][qablet_contracts.display.format_events]."""
+        if index:
+            # only the pandas formatter shows the index
+            df = self.timetable()["events"].to_pandas()
+            df["time"] = df["time"].dt.strftime(
+                "%m/%d/%Y"
+            )  # replace timestamp by Date
+            return df.to_string(index=index)
+        return format_events(self.timetable()["events"], head, tail)
 
-    def print_events(self):
-        print(self.to_string(index=False))
+    def print_events(
+        self, head: Optional[int] = None, tail: Optional[int] = None, file=None
+    ):
+        """Print the events of the timetable, or write them to a file or stream, see
+        [write_events][qablet_contracts.display.write_events]."""
+        write_events(self.timetable()["events"], file, head, tail)
+
+    def fingerprint(self, dtype=np.float64) -> str:
+        """A digest of the timetable, with the expressions it uses, which is the same in every process,
+        see [fingerprint][qablet_contracts.fingerprint.fingerprint]."""
+        return fingerprint(self.timetable(dtype))
 
 
 class EventsMixin(Contract):
     """A mixin class for contracts that generates a timetable from events list.
     A derived class needs to implement the events method that returns a list of dicts,
-    and the expressions method (optional) that returns a dictionary of expressions, batches, and snappers."""
+    and the expressions method (optional) that returns a dictionary of expressions, batches, and snappers.
+    The dtype (float64 or float32) is used for the quantities, and for the constants in the expressions,
+    so that expressions evaluated over float32 paths are not promoted to float64.
+    An expressions method that takes no dtype argument is also supported, its constants keep their own type."""
+
+    _expressions_dtype = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "expressions" in cls.__dict__:
+            cls._expressions_dtype = _accepts_dtype(
+                cls.__dict__["expressions"]
+            )
 
     @abstractmethod
     def events(self) -> List[Dict]: ...
 
-    def expressions(self) -> Dict:
+    def expressions(self, dtype=np.float64) -> Dict:
         return {}
 
-    def timetable(self):
-        return {
-            "events": pa.RecordBatch.from_pylist(
-                self.events(), schema=TS_EVENT_SCHEMA
-            ),
-            "expressions": self.expressions(),
-        }
+    def _expressions(self, dtype) -> Dict:
+        if self._expressions_dtype:
+            return self.expressions(dtype)
+        return self.expressions()
+
+    def timetable(self, dtype=np.float64):
+        dtype = np.dtype(dtype).type
+        if _PROFILE is None:  # the common case, without the stages
+            events = self.events()
+            expressions = self._expressions(dtype)
+        else:
+            with build_stage("events"):
+                events = self.events()
+            with build_stage("expressions"):
+                expressions = self._expressions(dtype)
+        with build_stage("arrow"):
+            events = pa.RecordBatch.from_pylist(
+                events, schema=event_schema(dtype)
+            )
+        return {"events": events, "expressions": expressions}
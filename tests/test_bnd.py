@@ -1,6 +1,19 @@
 from datetime import datetime
 
-from qablet_contracts.bnd.fixed import FixedBond, FixedCashFlows
+import numpy as np
+import pytest
+
+from qablet_contracts.bnd.callable import (
+    CallableFixedBond,
+    PuttableFixedBond,
+    callable_bond_batch,
+    puttable_bond_batch,
+)
+from qablet_contracts.bnd.fixed import (
+    FixedBond,
+    FixedCashFlows,
+    fixed_bond_batch,
+)
 from qablet_contracts.bnd.zero import Bond, BondCall, BondPut
 
 
@@ -33,3 +46,144 @@ def test_classes():
         "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE"
     ).timetable()
     assert len(tt["events"]) == 4
+
+
+def test_fixed_bond_batch():
+    coupons = [0.05, 0.04, 0.03]
+    start = datetime(2023, 12, 31)
+    maturities = [
+        datetime(2025, 12, 31),
+        datetime(2026, 6, 30),
+        datetime(2027, 12, 31),
+    ]
+
+    # bullet bonds match the single bond timetables
+    events = fixed_bond_batch("USD", coupons, start, maturities)["events"]
+    for i, (cpn, mat) in enumerate(zip(coupons, maturities)):
+        bond = events.filter(np.asarray(events.column("contract")) == i)
+        expected = FixedBond("USD", cpn, start, mat, "2QE").timetable()
+        expected = expected["events"]
+        for name in ["time", "op", "unit", "track"]:
+            assert (
+                bond.column(name).to_pylist()
+                == expected.column(name).to_pylist()
+            )
+        assert np.allclose(
+            bond.column("quantity"), expected.column("quantity")
+        )
+
+    # with amortization and sinking funds, the principal adds up to the notional
+    events = fixed_bond_batch(
+        "USD",
+        coupons,
+        start,
+        maturities,
+        notionals=[100, 200, 300],
+        amort_periods=[0, 5, 2],
+        sinking_contract=[0, 0, 2],
+        sinking_dates=[
+            datetime(2024, 6, 30),
+            datetime(2024, 12, 31),
+            datetime(2025, 12, 31),
+        ],
+        sinking_amounts=[10, 20, 60],
+    )["events"]
+    contract = np.asarray(events.column("contract"))
+    quantity = np.asarray(events.column("quantity"))
+    coupon_0 = [5 / 2, 4.5 / 2, 3.5 / 2, 3.5 / 2]
+    assert np.allclose(
+        quantity[contract == 0], [2.5, 10, 2.25, 20, 1.75, 71.75]
+    )
+    assert np.allclose(quantity[contract == 0].sum(), 100 + sum(coupon_0))
+    assert np.allclose(
+        quantity[contract == 1][-5:],
+        40 + 0.02 * np.array([200, 160, 120, 80, 40]),
+    )
+    assert np.allclose(
+        quantity[contract == 2][-2:], [0.015 * 240 + 150, 0.015 * 90 + 90]
+    )
+
+    # frequencies that do not divide a year into whole months
+    with pytest.raises(ValueError, match="freq"):
+        fixed_bond_batch("USD", coupons, start, maturities, freq=5)
+
+    # sinking fund payments of more than the notional
+    with pytest.raises(ValueError, match=r"notional of bonds \[1\]"):
+        fixed_bond_batch(
+            "USD",
+            coupons,
+            start,
+            maturities,
+            notionals=100,
+            amort_periods=[0, 2, 0],
+            sinking_contract=[0, 1],
+            sinking_dates=[datetime(2024, 6, 30), datetime(2024, 6, 30)],
+            sinking_amounts=[50, 60],
+        )
+
+    # sinking fund payments of bonds that are not in the batch
+    for contract in [3, -1]:
+        with pytest.raises(ValueError, match=rf"bonds \[{contract}\]"):
+            fixed_bond_batch(
+                "USD",
+                coupons,
+                start,
+                maturities,
+                sinking_contract=[0, contract],
+                sinking_dates=[datetime(2024, 6, 30), datetime(2024, 6, 30)],
+                sinking_amounts=[0.1, 0.1],
+            )
+
+
+def test_callable_bonds():
+    start = datetime(2023, 12, 31)
+    maturities = [datetime(2025, 12, 31), datetime(2026, 12, 31)]
+    call_contract = [0, 1, 1]
+    call_dates = [
+        datetime(2024, 12, 31),
+        datetime(2025, 6, 30),
+        datetime(2025, 12, 31),
+    ]
+    call_prices = [1.0, 1.01, 1.0]
+
+    for cls, batch, op, track in [
+        (CallableFixedBond, callable_bond_batch, "<", ""),
+        (PuttableFixedBond, puttable_bond_batch, ">", "put"),
+    ]:
+        events = batch(
+            "USD",
+            [0.05, 0.04],
+            start,
+            maturities,
+            call_contract,
+            call_dates,
+            call_prices,
+            track=track,
+        )["events"]
+        contract = np.asarray(events.column("contract"))
+        for i, mat in enumerate(maturities):
+            dates = [d for c, d in zip(call_contract, call_dates) if c == i]
+            prices = [p for c, p in zip(call_contract, call_prices) if c == i]
+            expected = cls(
+                "USD",
+                [0.05, 0.04][i],
+                start,
+                mat,
+                dates,
+                prices,
+                "2QE",
+                f"{track}#{i}",
+            ).timetable()["events"]
+            bond = events.filter(contract == i)
+            for name in ["time", "op", "unit", "track"]:
+                assert (
+                    bond.column(name).to_pylist()
+                    == expected.column(name).to_pylist()
+                )
+            assert np.allclose(
+                bond.column("quantity"), expected.column("quantity")
+            )
+            # the option comes after the coupon on the same date
+            ops = bond.column("op").to_pylist()
+            assert ops.count(op) == len(dates)
+            assert ops[0] == "+"
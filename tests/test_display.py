@@ -0,0 +1,72 @@
+import io
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+
+from qablet_contracts.bnd.fixed import FixedBond, fixed_bond_batch
+from qablet_contracts.display import format_events, write_events
+from qablet_contracts.eq.cliquet import Accumulator
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.timetable import event_schema
+
+
+def _pandas_string(events):
+    df = events.to_pandas()
+    df["time"] = df["time"].dt.strftime("%m/%d/%Y")
+    return df.to_string(index=False)
+
+
+def test_same_as_pandas():
+    fix_dates = [datetime(2021, 12, 31), datetime(2022, 6, 30)]
+    contracts = [
+        FixedBond(
+            "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE"
+        ),
+        Option("USD", "SPX", 2900, datetime(2024, 3, 31), True),
+        Accumulator("USD", "SPX", fix_dates, 0.0, -0.03, 0.05),
+    ]
+    for contract in contracts:
+        events = contract.timetable()["events"]
+        assert contract.to_string() == _pandas_string(events)
+
+    # floats in the scientific format, nans, and float32
+    for values, dtype in [
+        ([1e-8, 1.0, np.nan], np.float64),
+        ([1e17, 2.0, 0.5], np.float64),
+        ([0.1, 2.0, -2900.0], np.float32),
+    ]:
+        events = pa.RecordBatch.from_pylist(
+            [
+                {"time": datetime(2024, 1, i + 1), "op": "+", "quantity": v}
+                for i, v in enumerate(values)
+            ],
+            schema=event_schema(dtype),
+        )
+        assert format_events(events) == _pandas_string(events)
+
+    # a portfolio table
+    events = fixed_bond_batch(
+        "USD", [0.05, 0.04], datetime(2023, 12, 31), datetime(2025, 12, 31)
+    )["events"]
+    assert format_events(events) == _pandas_string(events)
+
+
+def test_truncate_and_stream():
+    rng = np.random.default_rng(2)
+    n = 50
+    start = np.datetime64("2024-01-15") + rng.integers(0, 365, n)
+    events = fixed_bond_batch(
+        "USD", rng.uniform(0.01, 0.06, n), start, start + 3650
+    )["events"]
+
+    lines = format_events(events, head=3, tail=2).split("\n")
+    assert len(lines) == 1 + 3 + 1 + 2
+    assert lines[4].split() == ["..."] * 6
+    assert [len(line) for line in lines] == [len(lines[0])] * len(lines)
+
+    # written in small chunks, the output is the same
+    stream = io.StringIO()
+    write_events(events, stream, chunk_size=7)
+    assert stream.getvalue() == format_events(events) + "\n"
+    assert stream.getvalue() == _pandas_string(events) + "\n"
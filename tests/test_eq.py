@@ -1,11 +1,24 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
+import pytest
 
-from qablet_contracts.eq.autocall import DiscountCert, ReverseCB
+from qablet_contracts.eq import autocall
+from qablet_contracts.eq.autocall import (
+    DiscountCert,
+    ReverseCB,
+    WorstOfDiscountCert,
+    WorstOfReverseCB,
+    worst_of_autocall_batch,
+)
 from qablet_contracts.eq.barrier import OptionKO
 from qablet_contracts.eq.cliquet import Accumulator
 from qablet_contracts.eq.forward import ForwardOption
+from qablet_contracts.eq.rainbow import BasketRainbow, Rainbow
+from qablet_contracts.expr import eval_expression, eval_grad
+from qablet_contracts.ir.dcf import dcf_30_360
+from qablet_contracts.portfolio import portfolio_from_timetables
 
 
 def test_classes():
@@ -58,3 +71,361 @@ def test_classes():
         True,
     ).timetable()
     assert len(tt["events"]) == 4
+
+
+def test_hoisted_constants(monkeypatch):
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    contract = DiscountCert(
+        "USD", "AAPL", 100, 80, start, maturity, 102, barrier_dates, 0.092
+    )
+    payoff_fn = contract.expressions()["payoff"]["fn"]
+
+    # The previous payoff, which recomputed the constants in each call.
+    def legacy_payoff_fn(inputs):
+        [s] = inputs
+        eq_pay = s * (contract.notional / contract.initial_spot)
+        return [
+            np.where(eq_pay < contract.strike, eq_pay, contract.fixed_payoff())
+        ]
+
+    s = np.random.default_rng(1).lognormal(4.6, 0.2, 1_000_000)
+    expected = legacy_payoff_fn([s])[0]
+    assert np.array_equal(payoff_fn([s])[0], expected)
+
+    # The function doesn't access the contract, after it was created.
+    contract.strike = 0
+    contract.cpn_rate = 1.0
+    assert np.array_equal(payoff_fn([s])[0], expected)
+
+    # The daycount and the other constants are not recomputed in each call.
+    calls = []
+
+    def counting_dcf(*args):
+        calls.append(args)
+        return dcf_30_360(*args)
+
+    monkeypatch.setattr(autocall, "dcf", counting_dcf)
+    for _ in range(10):
+        legacy_payoff_fn([s])
+    assert len(calls) == 10
+    calls.clear()
+    for _ in range(10):
+        payoff_fn([s])
+    assert len(calls) == 0
+
+
+def test_kernels():
+    pytest.importorskip("numba")
+
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    fix_dates = pd.bdate_range(
+        datetime(2021, 12, 31), datetime(2024, 12, 31), freq="2BQE"
+    )
+    contracts = [
+        OptionKO(
+            "USD", "EQ", 100, maturity, True, 102, "Up/Out", barrier_dates
+        ),
+        OptionKO(
+            "USD", "EQ", 100, maturity, True, 98, "Dn/Out", barrier_dates
+        ),
+        DiscountCert(
+            "USD", "EQ", 100, 80, start, maturity, 102, barrier_dates, 0.092
+        ),
+        Accumulator("USD", "EQ", fix_dates, 0.0, -0.03, 0.05),
+    ]
+
+    rng = np.random.default_rng(1)
+    # 1-D paths, and 2-D paths, e.g. of a basket
+    for dtype, shape in [
+        (np.float64, 100_000),
+        (np.float32, 100_000),
+        (np.float64, (3, 1000)),
+    ]:
+        s = rng.lognormal(4.6, 0.1, shape).astype(dtype)
+        s_prev = rng.lognormal(4.6, 0.1, shape).astype(dtype)
+        acc = rng.normal(0, 0.05, shape).astype(dtype)
+        inputs = {1: [s], 3: [s, s_prev, acc]}
+        for contract in contracts:
+            expressions = contract.expressions(dtype)
+            kernels = [e for e in expressions.values() if "kernel" in e]
+            assert kernels
+            for expr in kernels:
+                for inp in [inputs[len(expr["inp"])], [dtype(100.0)] * 3]:
+                    inp = inp[: len(expr["inp"])]
+                    expected = expr["fn"](inp)
+                    result = expr["kernel"](inp)
+                    for a, b in zip(expected, result):
+                        assert np.asarray(a).dtype == np.asarray(b).dtype
+                        assert np.array_equal(
+                            np.broadcast_to(a, np.shape(b)), b
+                        )
+
+
+def test_grads():
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    fix_dates = pd.bdate_range(
+        datetime(2021, 12, 31), datetime(2024, 12, 31), freq="2BQE"
+    )
+    contracts = [
+        OptionKO(
+            "USD", "EQ", 100, maturity, True, 102, "Up/Out", barrier_dates
+        ),
+        OptionKO(
+            "USD", "EQ", 100, maturity, True, 98, "Dn/Out", barrier_dates
+        ),
+        DiscountCert(
+            "USD", "EQ", 100, 80, start, maturity, 102, barrier_dates, 0.092
+        ),
+        Accumulator("USD", "EQ", fix_dates, 0.0, -0.03, 0.05),
+        Accumulator(
+            "USD", "EQ", fix_dates, 0.0, -0.03, 0.05, state={"S_PREV": 90}
+        ),
+        ForwardOption("USD", "EQ", 1.0, start, maturity, True),
+        OptionKO(
+            "USD",
+            "EQ",
+            100,
+            maturity,
+            True,
+            120,
+            "Up/Out",
+            barrier_dates,
+            continuous_vol=0.2,
+        ),
+        OptionKO(
+            "USD",
+            "EQ",
+            100,
+            maturity,
+            True,
+            80,
+            "Dn/Out",
+            barrier_dates,
+            continuous_vol=0.2,
+        ),
+    ]
+
+    # central differences of fn, with respect to each input, away from the steps
+    rng = np.random.default_rng(1)
+    s = rng.lognormal(4.6, 0.1, 10_000)
+    inputs = [s, rng.lognormal(4.6, 0.1, 10_000), rng.normal(0, 0.05, 10_000)]
+    h = 1e-6
+    for contract in contracts:
+        for expr in contract.expressions().values():
+            inp = inputs[: len(expr["inp"])]
+            grad = expr["grad"](inp)
+            for j in range(len(inp)):
+                up = [x + h * (k == j) for k, x in enumerate(inp)]
+                dn = [x - h * (k == j) for k, x in enumerate(inp)]
+                for i, (a, b) in enumerate(
+                    zip(expr["fn"](up), expr["fn"](dn))
+                ):
+                    fd = (np.asarray(a, float) - np.asarray(b, float)) / (
+                        2 * h
+                    )
+                    smooth = np.abs(fd) < 1e3
+                    expected = np.broadcast_to(grad[i][j], fd.shape)
+                    assert smooth.mean() > 0.99
+                    assert np.allclose(fd[smooth], expected[smooth], atol=1e-5)
+
+    # smoothed conditions, the slopes of the steps add up to one
+    grid = np.linspace(50, 150, 100_001)
+    ko_up, ko_dn, cert = [c.expressions() for c in contracts[:3]]
+    for expr, sign in [(ko_up["ko"], 1), (ko_dn["ko"], -1), (cert["call"], 1)]:
+        [[slope]] = expr["grad"]([grid], width=0.5)
+        assert np.isclose(slope.sum() * (grid[1] - grid[0]), sign)
+        assert np.all(slope * sign >= 0)
+
+    # the smoothed payoff is a logistic blend of the two sides
+    fn = cert["payoff"]["fn"]
+    width = 0.5
+
+    def smoothed(s):
+        below = 1 / (1 + np.exp(4 * (s - fn.strike / fn.scale) / width))
+        return below * s * fn.scale + (1 - below) * fn.fixed
+
+    [[grad]] = eval_grad(cert, "payoff", {"EQ": grid}, width=width)
+    fd = (smoothed(grid + h) - smoothed(grid - h)) / (2 * h)
+    assert np.allclose(grad, fd, atol=1e-5)
+
+
+def test_smoothing():
+    maturity = datetime(2024, 9, 30)
+    dates = pd.date_range(datetime(2024, 3, 31), maturity, freq="ME")
+    s = np.linspace(80, 160, 801)
+    for barrier_type, sign in [("Up/Out", 1), ("Dn/Out", -1)]:
+        args = ("USD", "EQ", 100, maturity, True, 120, barrier_type, dates)
+        [hard] = eval_expression(
+            OptionKO(*args).expressions(), "ko", {"EQ": s}
+        )
+        for shape in ["sigmoid", "spread"]:
+            contract = OptionKO(*args, smoothing=0.02, smoothing_shape=shape)
+            expressions = contract.expressions()
+            [weight] = eval_expression(expressions, "ko", {"EQ": s})
+            assert np.all((weight >= 0) & (weight <= 1))
+            assert np.all(np.diff(weight) * sign >= 0)
+            assert weight[s == 120] == 0.5
+            # the same as the hard barrier, away from it
+            far = np.abs(s - 120) > 6
+            assert np.allclose(weight[far], hard[far], atol=1e-4)
+            # the slope at the barrier is one over the width
+            [[slope]] = expressions["ko"]["grad"]([np.array([120.0])])
+            assert np.isclose(slope * sign, 1 / 2.4)
+
+    with pytest.raises(ValueError, match="smoothing shape"):
+        OptionKO(*args, smoothing=0.02, smoothing_shape="cubic").expressions()
+
+
+def test_basket_rainbow():
+    assets = ["SPX", "FTSE", "N225"]
+    strikes = [5087, 7684, 39100]
+    rng = np.random.default_rng(1)
+    values = {
+        a: k * rng.lognormal(0, 0.1, 10_000) for a, k in zip(assets, strikes)
+    }
+    for is_call in [True, False]:
+        rainbow = Rainbow(
+            "USD", assets, strikes, 100_000, datetime(2024, 3, 31), is_call
+        )
+        basket = BasketRainbow(
+            "USD", assets, strikes, 100_000, datetime(2024, 3, 31), is_call
+        )
+        tt = basket.timetable()
+        assert len(tt["events"]) == 3
+
+        # The best choice of the rainbow matches the basket phrase.
+        choices = [
+            e["quantity"] * values[e["unit"]]
+            for e in rainbow.events()
+            if e["op"] == ">"
+        ]
+        [choice] = [e for e in basket.events() if e["op"] == ">"]
+        [phrase] = eval_expression(tt["expressions"], choice["unit"], values)
+        assert np.allclose(
+            np.max(choices, axis=0), choice["quantity"] * phrase
+        )
+
+
+def test_worst_of_autocall():
+    start = datetime(2024, 3, 31)
+    barrier_dates = [
+        pd.date_range(start, maturity, freq="ME", inclusive="right")
+        for maturity in [datetime(2024, 7, 31), datetime(2024, 9, 30)]
+    ]
+    assets = ["AAPL", "MSFT", "NVDA"]
+    terms = [
+        ([100, 400, 900], 80, 102, 0.092),
+        ([110, 410, 950], 85, 105, 0.1),
+    ]
+    rng = np.random.default_rng(1)
+    values = {
+        a: rng.lognormal(np.log(s), 0.1, 10_000)
+        for a, s in zip(assets, terms[0][0])
+    }
+
+    for reverse, cls in [
+        (False, WorstOfDiscountCert),
+        (True, WorstOfReverseCB),
+    ]:
+        contracts = [
+            cls(
+                "USD",
+                assets,
+                spots,
+                strike,
+                start,
+                dates[-1],
+                barrier,
+                dates,
+                cpn,
+                track=f"#{i}",
+            )
+            for i, ((spots, strike, barrier, cpn), dates) in enumerate(
+                zip(terms, barrier_dates)
+            )
+        ]
+        batch = worst_of_autocall_batch(
+            "USD",
+            assets,
+            [t[0] for t in terms],
+            [t[1] for t in terms],
+            [start, start],
+            [d[-1] for d in barrier_dates],
+            [t[2] for t in terms],
+            barrier_dates,
+            [t[3] for t in terms],
+            reverse=reverse,
+        )
+        expected = portfolio_from_timetables(
+            [c.timetable() for c in contracts]
+        )
+        a = batch["events"]
+        b = expected["events"]
+        assert a.column("contract").equals(b.column("contract"))
+        assert a.column("time").equals(b.column("time"))
+        assert np.allclose(a.column("quantity"), b.column("quantity"))
+        for col in ["op", "unit", "track"]:
+            assert a.column(col).to_pylist() == b.column(col).to_pylist()
+
+        # The phrases of the batch match those of each contract.
+        for i, c in enumerate(contracts):
+            expressions = c.expressions()
+            for name in [f"#{i}.call", f"#{i}.payoff"]:
+                [x] = eval_expression(expressions, name, values)
+                [y] = eval_expression(batch["expressions"], name, values)
+                assert np.array_equal(x, y)
+
+    # A single asset worst-of matches the single asset autocall.
+    dates = barrier_dates[0]
+    single = DiscountCert(
+        "USD", "AAPL", 100, 80, start, dates[-1], 102, dates, 0.1
+    )
+    worst_of = WorstOfDiscountCert(
+        "USD", ["AAPL"], [100], 80, start, dates[-1], 102, dates, 0.1
+    )
+    assert worst_of.timetable()["events"].equals(single.timetable()["events"])
+    for name in ["call", "payoff"]:
+        [x] = eval_expression(single.expressions(), name, values)
+        [y] = eval_expression(worst_of.expressions(), name, values)
+        assert np.allclose(x, y)
+
+    # A contract without barrier dates only has the payoff at maturity.
+    for reverse, cls in [(False, DiscountCert), (True, ReverseCB)]:
+        batch = worst_of_autocall_batch(
+            "USD",
+            ["AAPL"],
+            [[100], [100]],
+            80,
+            [start, start],
+            [dates[-1], dates[-1]],
+            102,
+            [dates, []],
+            0.1,
+            reverse=reverse,
+        )
+        expected = [
+            cls("USD", "AAPL", 100, 80, start, dates[-1], 102, d, 0.1)
+            for d in [dates, []]
+        ]
+        events = batch["events"]
+        for i, c in enumerate(expected):
+            rows = events.filter(events.column("contract").to_numpy() == i)
+            assert rows.column("time").equals(
+                c.timetable()["events"].column("time")
+            )
+            assert np.allclose(
+                rows.column("quantity"),
+                c.timetable()["events"].column("quantity"),
+            )
@@ -0,0 +1,253 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from qablet_contracts.eq.autocall import DiscountCert
+from qablet_contracts.eq.barrier import OptionKO
+from qablet_contracts.eq.cliquet import Accumulator
+from qablet_contracts.expr import (
+    ExpressionProfile,
+    compare_precision,
+    eval_expression,
+    eval_path_snapper,
+    evaluate_chunked,
+    is_chunk_safe,
+)
+from qablet_contracts.timetable import TS_EVENT_SCHEMA_F32, EventsMixin
+
+
+def test_chunked():
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    fix_dates = pd.bdate_range(
+        datetime(2021, 12, 31), datetime(2024, 12, 31), freq="2BQE"
+    )
+    n = len(barrier_dates)
+    cases = [
+        (
+            OptionKO(
+                "USD", "EQ", 100, maturity, True, 102, "Up/Out", barrier_dates
+            ),
+            "EQ",
+            [(i, "ko") for i in range(n)],
+        ),
+        (
+            DiscountCert(
+                "USD", "EQ", 100, 80, start, maturity, 102, barrier_dates, 0.1
+            ),
+            "EQ",
+            [(i, "call") for i in range(n)] + [(n - 1, "payoff")],
+        ),
+        (
+            Accumulator("USD", "SPX", fix_dates, 0.0, -0.03, 0.05),
+            "SPX",
+            [(0, "start")] + [(i, "addfix") for i in range(1, len(fix_dates))],
+        ),
+    ]
+
+    num_paths = 10_001
+    rng = np.random.default_rng(1)
+    for contract, asset, steps in cases:
+        expressions = contract.timetable()["expressions"]
+        assert is_chunk_safe(expressions)
+
+        num_steps = max(step for step, _ in steps) + 1
+        paths = {asset: rng.lognormal(4.6, 0.1, (num_steps, num_paths))}
+        full, full_snaps = evaluate_chunked(
+            expressions, steps, paths, num_paths, chunk_size=num_paths
+        )
+        with ThreadPoolExecutor(4) as executor:
+            chunked, chunked_snaps = evaluate_chunked(
+                expressions,
+                steps,
+                paths,
+                num_paths,
+                chunk_size=1000,
+                executor=executor,
+            )
+
+        for a, b in zip(full, chunked):
+            assert np.array_equal(a, b)
+        assert full_snaps.keys() == chunked_snaps.keys()
+        for k in full_snaps:
+            assert np.array_equal(full_snaps[k], chunked_snaps[k])
+
+        # no paths
+        empty, empty_snaps = evaluate_chunked(
+            expressions, steps, {asset: paths[asset][:, :0]}, 0
+        )
+        for outs, empty_outs in zip(full, empty):
+            for a, b in zip(outs, empty_outs):
+                assert b.shape == (0,) and b.dtype == a.dtype
+        assert empty_snaps.keys() == full_snaps.keys()
+
+    # a phrase with an output for each asset of a basket
+    expressions = {
+        "perf": {
+            "type": "phrase",
+            "inp": ["basket"],
+            "fn": lambda inputs: [inputs[0] / [[100.0], [50.0]]],
+            "chunk_safe": True,
+        },
+        "one": {
+            "type": "phrase",
+            "inp": ["basket"],
+            "fn": lambda inputs: [np.ones((2, 1))],
+            "chunk_safe": True,
+        },
+    }
+    paths = {"basket": rng.lognormal(4.6, 0.1, (2, 2, num_paths))}
+    steps = [(0, "perf"), (1, "perf"), (1, "one")]
+    outputs, _ = evaluate_chunked(
+        expressions, steps, paths, num_paths, chunk_size=1000
+    )
+    assert np.array_equal(outputs[1][0], paths["basket"][1] / [[100], [50]])
+    assert np.array_equal(outputs[2][0], np.ones((2, num_paths)))
+
+
+def test_float32():
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    contract = DiscountCert(
+        "USD", "EQ", 100, 80, start, maturity, 102, barrier_dates, 0.1
+    )
+    tt = contract.timetable(dtype=np.float32)
+    assert tt["events"].schema == TS_EVENT_SCHEMA_F32
+
+    n = len(barrier_dates)
+    steps = [(i, "call") for i in range(n)] + [(n - 1, "payoff")]
+    num_paths = 100_000
+    rng = np.random.default_rng(1)
+    paths = {"EQ": rng.lognormal(4.6, 0.2, (n, num_paths))}
+    for row in compare_precision(contract, steps, paths, num_paths):
+        if row["name"] == "call":
+            assert row["dtype"] == bool
+            assert row["mismatch"] < 1e-3
+        else:
+            assert row["dtype"] == np.float32
+            assert row["max_rel_error"] < 1e-6
+
+    # the relative error is relative to the float64 value, also below 1
+    contract.notional = 0.01
+    [row] = compare_precision(contract, steps[-1:], paths, num_paths)
+    assert row["max_abs_error"] < 1e-8
+    assert 1e-9 < row["max_rel_error"] < 1e-6
+
+
+class _OneArgExpressions(EventsMixin):
+    """A contract written before expressions took a dtype."""
+
+    def events(self):
+        return [
+            {
+                "track": "",
+                "time": datetime(2024, 9, 30),
+                "op": "+",
+                "quantity": 1,
+                "unit": "pay",
+            }
+        ]
+
+    def expressions(self):
+        return {"pay": {"type": "phrase", "inp": ["EQ"], "fn": lambda x: x}}
+
+
+def test_one_arg_expressions():
+    contract = _OneArgExpressions()
+    for dtype in [np.float64, np.float32]:
+        tt = contract.timetable(dtype)
+        assert tt["events"].schema.field(
+            "quantity"
+        ).type == pa.from_numpy_dtype(np.dtype(dtype))
+        assert list(tt["expressions"]) == ["pay"]
+
+
+def test_expression_profile():
+    start = datetime(2024, 3, 31)
+    maturity = datetime(2024, 9, 30)
+    barrier_dates = pd.date_range(
+        start, maturity, freq="ME", inclusive="right"
+    )
+    n = len(barrier_dates)
+    profile = ExpressionProfile()
+    for barrier in [102, 105]:
+        contract = OptionKO(
+            "USD", "EQ", 100, maturity, True, barrier, "Up/Out", barrier_dates
+        )
+        tt = profile.timetable(contract, np.float32)
+        num_paths = 1000
+        paths = {
+            "EQ": np.random.default_rng(1)
+            .lognormal(4.6, 0.1, (n, num_paths))
+            .astype(np.float32)
+        }
+        evaluate_chunked(
+            tt["expressions"], [(i, "ko") for i in range(n)], paths, num_paths
+        )
+
+    # phrases that upcast float32 paths, and return an array of the wrong shape
+    expressions = profile.wrap(
+        {
+            "up": {
+                "type": "phrase",
+                "inp": ["EQ"],
+                "fn": lambda inputs: [inputs[0] * np.ones(1)],
+            },
+            "wide": {
+                "type": "phrase",
+                "inp": ["EQ", "up"],
+                "fn": lambda inputs: [np.outer(inputs[0][:2], inputs[1])],
+            },
+        },
+        "Custom",
+    )
+    eval_expression(expressions, "wide", {"EQ": paths["EQ"][0]})
+
+    rows = {(r["group"], r["name"]): r for r in profile.report()}
+    ko = rows["OptionKO", "ko"]
+    assert ko["calls"] == 2 * n and ko["fn"] == "Above"
+    assert ko["input_sizes"] == [num_paths]
+    assert ko["input_dtypes"] == [["float32"]]
+    assert ko["output_bytes"] == 2 * n * num_paths  # bool outputs
+    assert ko["upcast"] == ko["broadcast"] == 0
+    assert rows["Custom", "up"]["upcast"] == 1
+    assert rows["Custom", "up"]["broadcast"] == 0
+    assert rows["Custom", "wide"]["broadcast"] == 1
+    assert rows["Custom", "wide"]["input_dtypes"] == [["float32"], ["float64"]]
+
+    groups = {r["group"]: r for r in profile.report(by="group")}
+    assert groups["OptionKO"]["expressions"] == 1
+    assert groups["OptionKO"]["calls"] == 2 * n
+    assert groups["Custom"]["calls"] == 2
+
+
+def test_path_snapper():
+    fix_dates = pd.bdate_range(datetime(2022, 1, 3), periods=750)
+    rng = np.random.default_rng(2)
+    paths = {"SPX": 100 * rng.lognormal(0, 0.01, (750, 1000)).cumprod(axis=0)}
+    for state in [{}, {"ACC": 0.01, "S_PREV": 99.0}]:
+        contract = Accumulator(
+            "USD", "SPX", fix_dates, 0.0, -0.03, 0.05, state=state
+        )
+        expressions = contract.timetable()["expressions"]
+        steps = [(0, "start")] + [(i, "addfix") for i in range(1, 750)]
+        _, expected = evaluate_chunked(expressions, steps, paths, 1000)
+
+        snaps = {"SPX": paths["SPX"][0]}
+        eval_expression(expressions, "start", snaps)
+        del snaps["SPX"]
+        acc, s_prev = eval_path_snapper(
+            expressions, "addfix", paths, range(1, 750), snaps
+        )
+        assert np.allclose(acc, expected["ACC"], rtol=0, atol=1e-12)
+        assert np.array_equal(s_prev, expected["S_PREV"])
+        assert snaps["ACC"] is acc
@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import qablet_contracts
+from qablet_contracts.bnd.fixed import FixedBond, fixed_bond_batch
+from qablet_contracts.eq.cliquet import Accumulator
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.fingerprint import (
+    contract_fingerprints,
+    expression_spec,
+    fingerprint,
+)
+from qablet_contracts.portfolio import portfolio_from_timetables
+
+FIX_DATES = [
+    datetime(2021, 12, 31),
+    datetime(2022, 6, 30),
+    datetime(2022, 12, 30),
+]
+
+
+def _contracts():
+    return [
+        FixedBond(
+            "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE"
+        ),
+        Option("USD", "SPX", 2900, datetime(2024, 3, 31), True),
+        Accumulator("USD", "SPX", FIX_DATES, 0.0, -0.03, 0.05, track="a"),
+    ]
+
+
+def test_fingerprint():
+    contracts = _contracts()
+    prints = [c.fingerprint() for c in contracts]
+    assert len(set(prints)) == 3
+    assert all(len(p) == 32 for p in prints)
+
+    # the same contract gives the same fingerprint, a change in a term gives another one
+    assert _contracts()[2].fingerprint() == prints[2]
+    changed = Accumulator("USD", "SPX", FIX_DATES, 0.0, -0.03, 0.06, track="a")
+    assert changed.fingerprint() != prints[2]
+    assert (
+        Option("USD", "SPX", 2901, datetime(2024, 3, 31), True).fingerprint()
+        != prints[1]
+    )
+
+    # it doesn't depend on the dictionary encoding
+    events = contracts[0].timetable()["events"]
+    op = events.column("op").cast(pa.string())
+    op = pa.DictionaryArray.from_arrays(
+        pa.array(np.arange(len(op)), pa.int64()), op
+    )
+    reencoded = events.set_column(1, "op", op)
+    assert fingerprint({"events": reencoded, "expressions": {}}) == prints[0]
+
+    # it depends on the values, which are rounded in float32, unless they are exact
+    assert contracts[0].fingerprint(np.float32) != prints[0]
+    assert contracts[1].fingerprint(np.float32) == prints[1]
+
+    # per contract fingerprints of a portfolio are the same as those of the contracts
+    portfolio = portfolio_from_timetables([c.timetable() for c in contracts])
+    table = contract_fingerprints(portfolio)
+    assert table.column("contract").to_pylist() == [0, 1, 2]
+    assert [f.hex() for f in table.column("fingerprint").to_pylist()] == prints
+    assert fingerprint(portfolio) != fingerprint(
+        portfolio_from_timetables([c.timetable() for c in contracts[::-1]])
+    )
+
+    # in a batch of bonds, each bond has its own fingerprint, and equal bonds have equal ones
+    tt = fixed_bond_batch(
+        "USD",
+        [0.05, 0.04, 0.05],
+        datetime(2023, 12, 31),
+        datetime(2025, 12, 31),
+        track="b",
+    )
+    digests = contract_fingerprints(tt).column("fingerprint").to_pylist()
+    assert digests[0] == digests[2] != digests[1]
+
+
+def test_unsupported():
+    class Slotted:
+        __slots__ = ()
+
+        def __call__(self, inputs):
+            return inputs
+
+    for fn in [object(), Slotted()]:
+        expressions = {"p": {"type": "phrase", "inp": ["SPX"], "fn": fn}}
+        with pytest.raises(TypeError, match="cannot fingerprint"):
+            expression_spec(expressions, "p")
+
+
+def test_stable_across_processes():
+    code = (
+        "from qablet_contracts.eq.cliquet import Accumulator; import datetime;"
+        f"print(Accumulator('USD', 'SPX', {FIX_DATES!r}, 0.0, -0.03, 0.05, track='a').fingerprint())"
+    )
+    root = os.path.dirname(os.path.dirname(qablet_contracts.__file__))
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": root, "PYTHONHASHSEED": "7"},
+    )
+    assert out.stdout.strip() == _contracts()[2].fingerprint()
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import qablet_contracts
+
+MODULES = [
+    "qablet_contracts.bnd.callable",
+    "qablet_contracts.bnd.fixed",
+    "qablet_contracts.bnd.zero",
+    "qablet_contracts.eq.autocall",
+    "qablet_contracts.eq.barrier",
+    "qablet_contracts.eq.cliquet",
+    "qablet_contracts.eq.forward",
+    "qablet_contracts.eq.rainbow",
+    "qablet_contracts.eq.vanilla",
+    "qablet_contracts.ir.calibration",
+    "qablet_contracts.ir.swap",
+    "qablet_contracts.ir.swaption",
+    "qablet_contracts.benchmark",
+    "qablet_contracts.display",
+    "qablet_contracts.expr",
+    "qablet_contracts.interpreter",
+    "qablet_contracts.ladder",
+    "qablet_contracts.portfolio",
+]
+
+# The budget for a contract module, with its dependencies (mostly numpy and pyarrow).
+# The time spent in the package's own modules depends on the machine, so it is only reported.
+MAX_MODULES = 300
+
+
+def _import(module):
+    """Import a module in a new interpreter, and return the loaded modules, and the import times."""
+    code = f"import sys; import {module}; print(' '.join(sys.modules))"
+    root = os.path.dirname(os.path.dirname(qablet_contracts.__file__))
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": root},
+    )
+    own_time = 0
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip().startswith("qablet_contracts"):
+            own_time += int(parts[0].split(":")[1])
+    return out.stdout.split(), own_time
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_budget(module, record_property):
+    modules, own_time = _import(module)
+    assert "pandas" not in modules
+    assert "numba" not in modules
+    assert len(modules) < MAX_MODULES
+    record_property("own_import_time_us", own_time)
+
+
+def test_lazy_namespace():
+    modules, _ = _import("qablet_contracts")
+    assert "numpy" not in modules and "pyarrow" not in modules
+
+    from qablet_contracts.eq.vanilla import Option
+
+    assert qablet_contracts.Option is Option
+    assert set(qablet_contracts.__all__) <= set(dir(qablet_contracts))
+    for name in qablet_contracts.__all__:
+        assert isinstance(getattr(qablet_contracts, name), type)
+    assert not hasattr(qablet_contracts, "NoSuchContract")
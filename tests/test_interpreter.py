@@ -0,0 +1,169 @@
+from datetime import datetime
+from math import erf, exp, sqrt
+
+import numpy as np
+import pytest
+
+from qablet_contracts.benchmark import (
+    benchmark,
+    convergence,
+    event_times,
+    synthetic_paths,
+)
+from qablet_contracts.bnd.fixed import FixedBond
+from qablet_contracts.eq.barrier import OptionKO
+from qablet_contracts.eq.cliquet import Accumulator
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.interpreter import evaluate
+from qablet_contracts.portfolio import portfolio_from_timetables
+from qablet_contracts.timetable import timetable_from_arrays
+
+START = np.datetime64("2024-01-01")
+MONTHLY = [datetime(2024, m, 1) for m in range(2, 13)] + [datetime(2025, 1, 1)]
+
+
+def _paths(contracts, num_paths=20_000, **kwargs):
+    times = np.unique(
+        np.concatenate([event_times(c.timetable(), START) for c in contracts])
+    )
+    return times, synthetic_paths(times, ["EQ"], num_paths, "USD", **kwargs)
+
+
+def _value(tt, times, paths):
+    return evaluate(tt, times, paths, "USD").column("value")[0].as_py()
+
+
+def _norm_cdf(x):
+    return 0.5 * (1 + erf(x / sqrt(2)))
+
+
+def test_european_and_bermudan():
+    option = Option("USD", "EQ", 100, datetime(2025, 1, 1), True)
+    ko = OptionKO("USD", "EQ", 100, MONTHLY[-1], True, 120, "Up/Out", MONTHLY)
+    times, paths = _paths([option, ko], 200_000, rate=0.05, vol=0.2)
+    t = (times[-1] - times[0]) / np.timedelta64(365, "D")
+    d1 = (0.05 + 0.02) * t / (0.2 * sqrt(t))
+    d2 = d1 - 0.2 * sqrt(t)
+    call = 100 * _norm_cdf(d1) - 100 * exp(-0.05 * t) * _norm_cdf(d2)
+    assert abs(_value(option.timetable(), times, paths) - call) < 0.1
+
+    # a put that can be exercised monthly, on a track for each date, is worth more than the European put
+    put = call - 100 + 100 * exp(-0.05 * t)
+    rows = []
+    for i, date in enumerate(MONTHLY):
+        rows += [
+            (date, ">", 1.0, f".ex{i}", ".opt"),
+            (date, "+", 100.0, "USD", f".ex{i}"),
+            (date, "+", -1.0, "EQ", f".ex{i}"),
+        ]
+    time, op, quantity, unit, track = map(list, zip(*rows))
+    bermudan = timetable_from_arrays(time, op, quantity, unit, track)
+    value = _value(bermudan, times, paths)
+    assert put + 0.2 < value < put + 1.0
+
+
+def test_path_dependent():
+    ko = OptionKO("USD", "EQ", 100, MONTHLY[-1], True, 120, "Up/Out", MONTHLY)
+    accumulator = Accumulator(
+        "USD", "EQ", [datetime(2024, 1, 1)] + MONTHLY, 0.0, -0.03, 0.05
+    )
+    times, paths = _paths([ko, accumulator])
+    s, deflator = paths["EQ"], paths["USD"]
+
+    # the same calculation, directly on the paths
+    alive = ~(s[1:] > 120).any(axis=0)
+    expected = np.mean(alive * deflator[-1] * np.maximum(s[-1] - 100, 0))
+    assert np.isclose(_value(ko.timetable(), times, paths), expected)
+
+    returns = np.clip(s[1:] / s[:-1] - 1, -0.03, 0.05).sum(axis=0)
+    expected = np.mean(deflator[-1] * 100 * np.maximum(returns, 0))
+    assert np.isclose(_value(accumulator.timetable(), times, paths), expected)
+
+    # a portfolio is worth the sum of its contracts
+    bond = FixedBond("USD", 0.05, datetime(2024, 1, 1), datetime(2025, 1, 1))
+    contracts = [ko, bond, accumulator]
+    values = [_value(c.timetable(), times, paths) for c in contracts]
+    portfolio = portfolio_from_timetables([c.timetable() for c in contracts])
+    table = evaluate(portfolio, times, paths, "USD")
+    assert table.column("contract").to_pylist() == [0, 1, 2]
+    assert np.allclose(table.column("value").to_numpy(), values)
+
+
+def test_benchmark():
+    cases = {
+        "ko": OptionKO(
+            "USD", "EQ", 100, MONTHLY[-1], True, 120, "Up/Out", MONTHLY
+        ).timetable()
+    }
+    [row] = benchmark(cases, num_paths=100, start=START, repeat=1)
+    assert row["case"] == "ko" and row["rows"] == 15 and row["steps"] == 13
+    assert row["seconds"] > 0 and row["value"] > 0
+
+
+def test_convergence():
+    args = ("USD", "EQ", 100, MONTHLY[-1], True, 120, "Up/Out", MONTHLY)
+    cases = {
+        "hard": OptionKO(*args),
+        "smooth": OptionKO(*args, smoothing=0.02),
+    }
+    hard, smooth = convergence(
+        cases, num_paths=[2000], seeds=8, bump=0.001, start=START
+    )
+    assert hard["case"] == "hard" and hard["num_paths"] == 2000
+    # a small bias, and a much more stable delta
+    assert abs(smooth["value"] - hard["value"]) < 0.05 * hard["value"]
+    assert smooth["delta_stderr"] < hard["delta_stderr"] / 2
+
+    # the standard error needs more than one seed
+    with pytest.raises(ValueError, match="seeds"):
+        convergence(cases, num_paths=[100], seeds=1, start=START)
+
+
+def test_continuous_barrier():
+    # an up and out call, with a barrier monitored continuously, on a quarterly schedule
+    s, k, b, r, vol = 100.0, 100.0, 120.0, 0.05, 0.2
+    dates = [datetime(2024, 1, 1)] + [datetime(2024, m, 1) for m in [4, 7, 10]]
+    dates.append(datetime(2025, 1, 1))
+    args = ("USD", "EQ", k, dates[-1], True, b, "Up/Out", dates)
+    ko = OptionKO(*args, continuous_vol=vol)
+    times, paths = _paths([ko], 100_000, rate=r, vol=vol)
+    assert len(times) == 5
+
+    t = (times[-1] - times[0]) / np.timedelta64(365, "D")
+    sd = vol * sqrt(t)
+    lam = (r + vol**2 / 2) / vol**2
+    d1 = (np.log(s / k) + (r + vol**2 / 2) * t) / sd
+    call = s * _norm_cdf(d1) - k * exp(-r * t) * _norm_cdf(d1 - sd)
+    x1 = np.log(s / b) / sd + lam * sd
+    y = np.log(b * b / s / k) / sd + lam * sd
+    y1 = np.log(b / s) / sd + lam * sd
+    knock_in = (
+        s * _norm_cdf(x1)
+        - k * exp(-r * t) * _norm_cdf(x1 - sd)
+        - s * (b / s) ** (2 * lam) * (_norm_cdf(-y) - _norm_cdf(-y1))
+        + k
+        * exp(-r * t)
+        * (b / s) ** (2 * lam - 2)
+        * (_norm_cdf(-y + sd) - _norm_cdf(-y1 + sd))
+    )
+    exact = call - knock_in  # about 1.17
+
+    assert abs(_value(ko.timetable(), times, paths) - exact) < 0.05
+    # monitored on the dates only, it is worth much more
+    assert _value(OptionKO(*args).timetable(), times, paths) > exact + 0.5
+
+
+def test_continuous_barrier_portfolio():
+    # two continuously monitored options, with different vols, in one portfolio
+    dates = [datetime(2024, 1, 1)] + [datetime(2024, m, 1) for m in [4, 7, 10]]
+    args = ("USD", "EQ", 100.0, dates[-1], True, 120.0, "Up/Out", dates)
+    options = [
+        OptionKO(*args, track="#0", continuous_vol=0.1),
+        OptionKO(*args, track="#1", continuous_vol=0.4),
+    ]
+    times, paths = _paths(options, 20_000)
+    portfolio = portfolio_from_timetables([o.timetable() for o in options])
+    values = evaluate(portfolio, times, paths, "USD").column("value")
+    expected = [_value(o.timetable(), times, paths) for o in options]
+    assert np.allclose(values.to_pylist(), expected)
+    assert expected[0] > expected[1]
@@ -1,9 +1,18 @@
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
-from qablet_contracts.ir.swap import Swap
-from qablet_contracts.ir.swaption import BermudaSwaption, Swaption
+from qablet_contracts.ir.calibration import calibration_set
+from qablet_contracts.ir.schedule import add_months
+from qablet_contracts.ir.swap import Swap, simple_swap_period, swap_leg
+from qablet_contracts.ir.swaption import (
+    BermudaSwaption,
+    Swaption,
+    swaption_cube,
+)
+from qablet_contracts.portfolio import portfolio_from_timetables
+from qablet_contracts.timetable import EventsMixin
 
 
 def test_classes():
@@ -22,3 +31,113 @@ def test_classes():
 
     tt = BermudaSwaption("USD", dates, strike_rate).timetable()
     assert len(tt["events"]) == 6
+
+    # The columnar timetables have the same events as the events lists,
+    # whose times are the naive datetimes of the contract.
+    for contract in [
+        Swap("USD", dates, strike_rate),
+        Swaption("USD", dates, strike_rate),
+        BermudaSwaption("USD", dates, strike_rate),
+    ]:
+        assert isinstance(contract, EventsMixin)
+        assert all(e["time"].tzinfo is None for e in contract.events())
+        events = contract.timetable()["events"]
+        expected = EventsMixin.timetable(contract)["events"]
+        for col in ["time", "op", "unit", "track"]:
+            assert events.column(col).to_pylist() == (
+                expected.column(col).to_pylist()
+            )
+        assert np.allclose(events["quantity"], expected["quantity"])
+
+
+def test_shared_leg():
+    dates = pd.bdate_range(
+        datetime(2023, 12, 31),
+        datetime(2025, 12, 31),
+        freq="2QE",
+    )
+    # The leg is computed once, and shared.
+    assert swap_leg(dates) is swap_leg(list(dates))
+
+    # The columnar timetable matches the period by period events.
+    expected = []
+    for i, start in enumerate(dates[:-1]):
+        end = dates[i + 1]
+        expected.append([".opt", start, ">", 1, ".swp"])
+        expected.extend(
+            [e["track"], e["time"], e["op"], e["quantity"], e["unit"]]
+            for e in simple_swap_period("USD", start, end, 0.03, ".swp")
+        )
+    events = BermudaSwaption("USD", dates, 0.03).timetable()["events"]
+    df = events.to_pandas()
+    assert len(df) == len(expected)
+    for row, exp in zip(df.itertuples(), expected):
+        assert [row.track, row.time.tz_localize(None), row.op, row.unit] == [
+            exp[0],
+            exp[1],
+            exp[2],
+            exp[4],
+        ]
+        assert np.isclose(row.quantity, exp[3])
+
+
+def test_swaption_cube():
+    expiries = [datetime(2024, 12, 31), datetime(2025, 6, 30)]
+    tenors = [1, 2]
+    strike_rates = [0.03, 0.04]
+    cube = swaption_cube("USD", expiries, tenors, strike_rates)
+
+    timetables = []
+    for expiry in expiries:
+        for tenor in tenors:
+            months = np.arange(2 * tenor + 1) * 6
+            dates = add_months(np.full(len(months), expiry), months)
+            for k in strike_rates:
+                track = f"#{len(timetables)}"
+                timetables.append(Swaption("USD", dates, k, track).timetable())
+    expected = portfolio_from_timetables(timetables)["events"]
+
+    events = cube["events"]
+    for name in ["contract", "time", "op", "unit", "track"]:
+        assert (
+            events.column(name).to_pylist()
+            == expected.column(name).to_pylist()
+        )
+    assert np.allclose(events.column("quantity"), expected.column("quantity"))
+
+
+def test_calibration_set():
+    expiries = [datetime(2024, 12, 31), datetime(2025, 6, 30)]
+    offsets = [-0.01, 0.0, 0.01]
+    tt = calibration_set(
+        "USD",
+        expiries,
+        [1, 2],
+        offsets,
+        atm_rates=0.03,
+        coterminal_tenors=[3],
+        coterminal_atm_rates=0.03,
+    )
+    contracts = tt["contracts"].to_pylist()
+    assert len(contracts) == 2 * 2 * 3 + 3
+
+    timetables = []
+    for c in contracts:
+        months = np.arange(2 * c["tenor"] + 1) * 6
+        dates = add_months(np.full(len(months), c["expiry"].date()), months)
+        cls = Swaption if c["type"] == "Swaption" else BermudaSwaption
+        track = f"#{c['contract']}"
+        timetables.append(cls("USD", dates, c["strike"], track).timetable())
+    expected = portfolio_from_timetables(timetables)["events"]
+
+    assert [c["type"] for c in contracts[-3:]] == ["BermudaSwaption"] * 3
+    assert np.allclose(
+        [c["strike"] for c in contracts[-3:]], [0.02, 0.03, 0.04]
+    )
+    events = tt["events"]
+    for name in ["contract", "time", "op", "unit", "track"]:
+        assert (
+            events.column(name).to_pylist()
+            == expected.column(name).to_pylist()
+        )
+    assert np.allclose(events.column("quantity"), expected.column("quantity"))
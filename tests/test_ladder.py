@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from qablet_contracts.bnd.callable import callable_bond_batch
+from qablet_contracts.bnd.fixed import fixed_bond_batch
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.ir.swaption import Swaption
+from qablet_contracts.ladder import CashflowIndex, cashflow_ladder
+from qablet_contracts.portfolio import portfolio_from_timetables
+from qablet_contracts.timetable import event_schema
+
+
+def test_ladder():
+    rng = np.random.default_rng(1)
+    n = 200
+    start = np.datetime64("2024-01-15") + rng.integers(0, 365, n)
+    maturity = start + rng.integers(365, 365 * 10, n)
+    events = fixed_bond_batch(
+        "USD", rng.uniform(0.01, 0.06, n), start, maturity
+    )["events"]
+    edges = pd.date_range("2024-01-01", "2036-01-01", freq="YS")
+
+    ladder = cashflow_ladder(events, ["EUR", "USD"], edges)
+    assert ladder.num_rows == 2 * (len(edges) - 1)
+
+    df = events.to_pandas()
+    df["year"] = df["time"].dt.year
+    expected = df.groupby("year")["quantity"].sum()
+    usd = ladder.to_pandas().iloc[len(edges) - 1 :]
+    assert np.allclose(
+        usd["quantity"], expected.reindex(edges.year[:-1], fill_value=0)
+    )
+    assert ladder.to_pandas().iloc[: len(edges) - 1]["count"].sum() == 0
+
+    # point in time queries
+    index = CashflowIndex(events, ["USD"])
+    assert len(index) == len(df)
+    t0, t1 = datetime(2026, 3, 1), datetime(2027, 7, 15)
+    flows = index.between(t0, t1).to_pandas()
+    times = df["time"].dt.tz_localize(None)
+    assert len(flows) == ((times >= t0) & (times < t1)).sum()
+    assert flows["time"].is_monotonic_increasing
+    assert np.allclose(
+        flows["quantity"].sum(),
+        df["quantity"][(times >= t0) & (times < t1)].sum(),
+    )
+
+
+def test_unconditional():
+    bonds = callable_bond_batch(
+        "USD",
+        [0.05, 0.04],
+        datetime(2023, 12, 31),
+        [datetime(2025, 12, 31), datetime(2024, 12, 31)],
+        [1, 0],
+        [datetime(2024, 6, 30), datetime(2024, 12, 31)],
+        [1.0, 1.01],
+    )
+    index = CashflowIndex(bonds["events"], ["USD"], unconditional=True)
+    flows = index.between(datetime(2020, 1, 1), datetime(2030, 1, 1))
+    assert flows.column("contract").to_pylist() == [0, 1, 0]
+
+    # options pay in the currency only after a choice
+    options = [
+        Option("USD", "SPX", 2900, datetime(2024, 3, 31), "Call", f"#{i}")
+        for i in range(3)
+    ]
+    events = portfolio_from_timetables([o.timetable() for o in options])
+    edges = [datetime(2024, 1, 1), datetime(2025, 1, 1)]
+    ladder = cashflow_ladder(events["events"], ["USD"], edges)
+    assert ladder.column("count").to_pylist() == [3]
+    ladder = cashflow_ladder(events["events"], ["USD"], edges, True)
+    assert ladder.column("count").to_pylist() == [0]
+
+
+def test_unconditional_tracks():
+    # a snapper is not a condition, the payment after it is unconditional
+    rows = [
+        (datetime(2024, 1, 31), "s", 0.0, ".fix"),
+        (datetime(2024, 2, 29), None, 0.0, ".fix"),
+        (datetime(2024, 6, 30), "+", 1.0, "USD"),
+    ]
+    snapper = pa.RecordBatch.from_pylist(
+        [
+            {"time": t, "op": op, "quantity": q, "unit": u, "track": ""}
+            for t, op, q, u in rows
+        ],
+        schema=event_schema(),
+    )
+    # the choice on the .opt track switches to the payments on the .swp track
+    dates = pd.bdate_range(
+        datetime(2023, 12, 31), datetime(2024, 12, 31), freq="2QE"
+    )
+    swaption = Swaption("USD", dates, 0.03).timetable()
+    events = portfolio_from_timetables([{"events": snapper}, swaption])
+
+    end = datetime(2025, 1, 1)
+    index = CashflowIndex(events["events"], ["USD"])
+    flows = index.between(dates[0], end)
+    assert flows.column("contract").to_pylist() == [1, 0, 1, 1, 1]
+    index = CashflowIndex(events["events"], ["USD"], unconditional=True)
+    flows = index.between(dates[0], end)
+    assert flows.column("contract").to_pylist() == [0]
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from qablet_contracts.bnd.fixed import FixedBond
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.ir.swaption import BermudaSwaption
+from qablet_contracts.portfolio import merge_events, portfolio_from_timetables
+
+
+def _times(events):
+    return events.column("time").cast(pa.int64()).to_numpy()
+
+
+def _sorted(events):
+    return events.take(pa.array(np.argsort(_times(events), kind="stable")))
+
+
+def _portfolio():
+    dates = [datetime(2024, m, 1) for m in range(3, 13, 3)]
+    contracts = [
+        Option("USD", "SPX", 2900 + i, dates[i % 4], i % 2 == 0)
+        for i in range(8)
+    ]
+    contracts += [
+        BermudaSwaption("USD", dates, 0.03),
+        FixedBond("USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31)),
+    ]
+    return portfolio_from_timetables([c.timetable() for c in contracts])[
+        "events"
+    ]
+
+
+def test_merge_events():
+    events = _portfolio()
+    expected = _sorted(events)
+
+    batches = list(merge_events(events))
+    assert all(len(set(_times(b))) == 1 for b in batches)
+    assert len(batches) == len(set(_times(events)))
+    assert pa.Table.from_batches(batches).to_pylist() == expected.to_pylist()
+
+    # windows of 90 days, from the first time of each window
+    batches = list(merge_events(events, window=np.timedelta64(90, "D")))
+    for b in batches:
+        times = _times(b)
+        assert times.max() - times.min() < 90 * 86400000
+    assert pa.Table.from_batches(batches).to_pylist() == expected.to_pylist()
+
+    # the same batches, merged in small blocks of time
+    for window in [None, np.timedelta64(90, "D")]:
+        small = list(merge_events(events, window=window, block_rows=4))
+        assert [len(b) for b in small] == [
+            len(b) for b in merge_events(events, window=window)
+        ]
+        assert pa.Table.from_batches(small).to_pylist() == expected.to_pylist()
+
+    # the rows of a contract may be in several runs, here the first coupons of the bond
+    n = len(events)
+    order = [n - 4, n - 3] + list(range(n - 4)) + [n - 2, n - 1]
+    split = events.take(pa.array(order))
+    merged = pa.Table.from_batches(list(merge_events(split)))
+    assert merged.to_pylist() == _sorted(split).to_pylist()
+
+    assert list(merge_events(events.slice(0, 0))) == []
+    with pytest.raises(ValueError, match="not sorted"):
+        list(merge_events(events.take(pa.array([n - 1, n - 2]))))
+    for window in [
+        np.timedelta64(0, "D"),
+        np.timedelta64(-1, "D"),
+        np.timedelta64(500, "us"),
+    ]:
+        with pytest.raises(ValueError, match="window"):
+            list(merge_events(events, window=window))
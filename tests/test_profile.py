@@ -0,0 +1,71 @@
+import json
+from datetime import datetime
+
+from qablet_contracts import timetable
+from qablet_contracts.bnd.fixed import FixedBond, FixedCashFlows
+from qablet_contracts.eq.barrier import OptionKO
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.timetable import BuildProfile, profile_build
+
+
+def _contracts():
+    dates = [datetime(2024, 3, 31), datetime(2024, 6, 30)]
+    return [
+        FixedBond(
+            "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE"
+        ),
+        FixedCashFlows("USD", dates, [0.05, 1.05]),
+        Option("USD", "SPX", 2900, datetime(2024, 3, 31), True),
+        OptionKO("USD", "SPX", 100, dates[-1], True, 120, "Up/Out", dates),
+        Option("EUR", "SX5E", 4000, datetime(2024, 3, 31), False),
+    ]
+
+
+def test_profile_build():
+    contracts = _contracts()
+    with profile_build() as profile:
+        timetables = [c.timetable() for c in contracts]
+        contracts[0].fingerprint()
+    assert timetable._PROFILE is None
+
+    report = profile.report()
+    classes = report["classes"]
+    assert {k: v["count"] for k, v in classes.items()} == {
+        "FixedBond": 2,
+        "FixedCashFlows": 1,
+        "Option": 2,
+        "OptionKO": 1,
+    }
+    option_rows = sum(len(tt["events"]) for tt in timetables[2::2])
+    assert classes["Option"]["rows"] == option_rows
+    assert classes["Option"]["nbytes"] == sum(
+        tt["events"].nbytes for tt in timetables[2::2]
+    )
+    assert classes["FixedBond"]["dictionary_entries"] == {
+        "op": 2,
+        "unit": 2,
+        "track": 2,
+    }
+
+    stages = report["stages"]
+    assert stages["events"]["calls"] == 3
+    assert stages["expressions"]["calls"] == 3
+    assert stages["schedule"]["calls"] == stages["dcf"]["calls"] == 2
+    assert stages["arrow"]["calls"] == 6
+    assert json.loads(profile.to_json()) == report
+
+    text = profile.to_prometheus()
+    assert 'qablet_timetable_builds_total{class="Option"} 2' in text
+    assert 'qablet_timetable_stage_calls_total{stage="arrow"} 6' in text
+    assert (
+        'qablet_timetable_dictionary_entries_total{class="FixedBond",column="op"} 2'
+        in text
+    )
+
+    # disabled, nothing is recorded, and a profile can be extended
+    contracts[0].timetable()
+    assert profile.report() == report
+    with profile_build(profile):
+        contracts[0].timetable()
+    assert profile.report()["classes"]["FixedBond"]["count"] == 3
+    assert BuildProfile().report() == {"classes": {}, "stages": {}}
@@ -0,0 +1,141 @@
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+
+import pyarrow.parquet as pq
+import pytest
+
+import qablet_contracts as qc
+from qablet_contracts import registry
+from qablet_contracts.bnd.fixed import fixed_bond_batch
+from qablet_contracts.registry import (
+    contract_types,
+    from_table,
+    register,
+    to_table,
+    type_code,
+    type_columns,
+)
+
+
+def _contracts():
+    fix_dates = [datetime(2021, 12, 31), datetime(2022, 6, 30)]
+    return [
+        qc.Option("USD", "SPX", 2900, datetime(2024, 3, 31), True),
+        qc.Bond("USD", datetime(2025, 3, 31)),
+        qc.Accumulator(
+            "USD", "SPX", fix_dates, 0.0, -0.03, 0.05, state={"S_PREV": 1.0}
+        ),
+        qc.FixedBond(
+            "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31), "2QE"
+        ),
+        qc.BasketRainbow(
+            "USD", ["A", "B"], [100.0, 50.0], 100, datetime(2024, 3, 31), True
+        ),
+        qc.FixedBond(
+            "USD", 0.04, datetime(2023, 12, 31), datetime(2026, 12, 31)
+        ),
+    ]
+
+
+def test_round_trip():
+    contracts = _contracts()
+    table = to_table(contracts)
+    assert table.column("type").to_pylist() == [
+        type(c).__name__ for c in contracts
+    ]
+
+    pq.write_table(table, "contracts.parquet")
+    assert from_table(pq.read_table("contracts.parquet")) == contracts
+
+    # the columns of one type go straight into a batch builder
+    bonds = type_columns(table, "FixedBond")
+    assert bonds.column("coupon").to_pylist() == [0.05, 0.04]
+    tt = fixed_bond_batch(
+        "USD", bonds["coupon"], bonds["accrual_start"], bonds["maturity"]
+    )
+    assert set(tt["events"].column("contract").to_pylist()) == {0, 1}
+
+
+@pytest.fixture
+def restore_registry(monkeypatch):
+    """Undo the registrations made by a test."""
+    registry._load()
+    monkeypatch.setattr(registry, "_TYPES", dict(registry._TYPES))
+    monkeypatch.setattr(registry, "_CODES", dict(registry._CODES))
+
+
+def test_register(restore_registry):
+    assert set(qc.__all__) - set(contract_types()) == {
+        "Contract",
+        "EventsMixin",
+    }
+
+    @register(code="TestOption")
+    @dataclass
+    class TestOption(qc.Option):
+        pass
+
+    assert type_code(TestOption) == "TestOption"
+    contract = TestOption("USD", "SPX", 2900, datetime(2024, 3, 31), True)
+    assert from_table(to_table([contract])) == [contract]
+
+    with pytest.raises(ValueError):
+        register(qc.Bond, code="TestOption")
+
+    @dataclass
+    class Unknown(qc.Option):
+        pass
+
+    with pytest.raises(KeyError):
+        to_table([Unknown("USD", "SPX", 2900, datetime(2024, 3, 31), True)])
+
+    @dataclass
+    class Unsupported(qc.Option):
+        extra: object = None
+
+    with pytest.raises(TypeError):
+        register(Unsupported)
+
+
+PLUGIN = """
+from dataclasses import dataclass
+
+import qablet_contracts as qc
+
+
+@dataclass
+class PluginBond(qc.Bond):
+    pass
+"""
+
+
+def test_entry_points(restore_registry, monkeypatch, tmp_path):
+    # a distribution on the path, with a plugin in the entry point group
+    (tmp_path / "plugin_bond.py").write_text(PLUGIN)
+    dist_info = tmp_path / "plugin_bond-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text(
+        "Metadata-Version: 2.1\nName: plugin-bond\nVersion: 1.0\n"
+    )
+    (dist_info / "entry_points.txt").write_text(
+        f"[{registry.ENTRY_POINT_GROUP}]\n"
+        "PluginBond = plugin_bond:PluginBond\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "plugin_bond", raising=False)
+
+    monkeypatch.setattr(registry, "_loaded", False)
+    plugin_bond = contract_types()["PluginBond"]
+    assert plugin_bond.__module__ == "plugin_bond"
+    assert registry._CODES[plugin_bond] == "PluginBond"
+
+
+def test_entry_points_dict(monkeypatch):
+    # python 3.9 returns a dict of all the groups
+    monkeypatch.setattr(
+        registry, "entry_points", lambda: {registry.ENTRY_POINT_GROUP: []}
+    )
+    assert list(registry._entry_points(registry.ENTRY_POINT_GROUP)) == []
+    monkeypatch.setattr(registry, "entry_points", dict)
+    assert list(registry._entry_points(registry.ENTRY_POINT_GROUP)) == []
@@ -0,0 +1,193 @@
+import asyncio
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from qablet_contracts.bnd.fixed import FixedBond
+from qablet_contracts.eq.barrier import OptionKO
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.ir.swap import Swap
+from qablet_contracts.service import (
+    _HEADER,
+    STATUS_OK,
+    TimetableClient,
+    TimetableService,
+    batch_events,
+)
+
+
+def _options(n):
+    return [
+        Option("USD", "SPX", 2900 + i, datetime(2024, 3, 31), i % 2 == 0)
+        for i in range(n)
+    ]
+
+
+def _same_events(events, timetable):
+    expected = timetable["events"].to_pylist()
+    assert events.drop_columns(["contract"]).to_pylist() == expected
+
+
+def test_batch_events():
+    dates = [datetime(2024, 3, 31), datetime(2024, 6, 30)]
+    options = [
+        OptionKO("USD", "SPX", 100, dates[-1], True, 120 + i, "Up/Out", dates)
+        for i in range(3)
+    ]
+    bonds = [
+        FixedBond("USD", c, datetime(2023, 12, 31), datetime(2025, 12, 31))
+        for c in [0.01, 0.02]
+    ]
+    dates = [
+        datetime(2024, 3, 31),
+        datetime(2024, 6, 30),
+        datetime(2024, 9, 30),
+    ]
+    swaps = [Swap("USD", dates[i:], 0.03, track=f"#{i}") for i in range(2)]
+    for contracts in [options, bonds, swaps]:
+        events = batch_events(contracts)
+        contract = events.column("contract").to_numpy()
+        for i, c in enumerate(contracts):
+            _same_events(events.filter(contract == i), c.timetable())
+
+
+async def _serve(service, **kwargs):
+    server = await service.start(**kwargs)
+    if "path" in kwargs:
+        client = await TimetableClient.connect(path=kwargs["path"])
+    else:
+        port = server.sockets[0].getsockname()[1]
+        client = await TimetableClient.connect(port=port)
+    return server, client
+
+
+@pytest.mark.parametrize("unix", [True, False])
+def test_service(unix):
+    if unix and not hasattr(asyncio, "start_unix_server"):
+        pytest.skip("no unix sockets")
+    options = _options(20)
+    bond = FixedBond(
+        "USD", 0.05, datetime(2023, 12, 31), datetime(2025, 12, 31)
+    )
+
+    async def run():
+        # a long window, so that concurrent requests are built together
+        service = TimetableService(window=0.05, max_batch=8)
+        kwargs = {"path": os.path.abspath("tt.sock")} if unix else {}
+        server, client = await _serve(service, **kwargs)
+        responses = await asyncio.gather(
+            *[client.timetable(c) for c in options],
+            client.timetable([bond, options[0]]),
+        )
+        metrics = await client.metrics()
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        service.close()
+        return responses, metrics
+
+    responses, metrics = asyncio.run(run())
+    for events, option in zip(responses, options):
+        assert set(events.column("contract").to_pylist()) == {0}
+        _same_events(events, option.timetable())
+
+    # the contracts of a request are numbered in the order of the request
+    events = responses[-1]
+    contract = events.column("contract").to_numpy()
+    _same_events(events.filter(contract == 0), bond.timetable())
+    _same_events(events.filter(contract == 1), options[0].timetable())
+
+    # 21 options in batches of at most 8, and a bond
+    assert metrics["requests"] == 21 and metrics["contracts"] == 22
+    assert metrics["batches"] == 4
+    assert metrics["max_queue_depth"] >= 8
+    assert metrics["queue_depth"] == 0 and metrics["errors"] == 0
+    assert 0 < metrics["latency_p50"] <= metrics["latency_p99"]
+
+
+def test_service_local():
+    service = TimetableService()
+    with pytest.raises(ValueError, match="loopback"):
+        asyncio.run(service.start(host="0.0.0.0"))
+    service.close()
+
+
+def test_service_errors():
+    def failing(contracts):
+        raise ValueError("no builder")
+
+    async def run():
+        service = TimetableService(batch_builders={"Option": failing})
+        server, client = await _serve(service)
+        with pytest.raises(RuntimeError, match="no builder"):
+            await client.timetable(_options(1))
+        # the connection is still usable
+        metrics = await client.metrics()
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        service.close()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert metrics["errors"] == 1 and metrics["batches"] == 0
+    assert np.isclose(metrics["mean_batch_size"], 0.0)
+
+
+def test_service_bad_contract():
+    def builder(contracts):
+        if any(c.strike == 2901 for c in contracts):
+            raise ValueError("bad strike")
+        return batch_events(contracts)
+
+    options = _options(4)
+
+    async def run():
+        # a long window, so that the requests are built together
+        service = TimetableService(
+            window=0.05, batch_builders={"Option": builder}
+        )
+        server, client = await _serve(service)
+        responses = await asyncio.gather(
+            *[client.timetable(c) for c in options], return_exceptions=True
+        )
+        metrics = await client.metrics()
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        service.close()
+        return responses, metrics
+
+    responses, metrics = asyncio.run(run())
+    # only the request with the bad contract fails
+    assert isinstance(responses[1], RuntimeError)
+    assert "bad strike" in str(responses[1])
+    for i in [0, 2, 3]:
+        _same_events(responses[i], options[i].timetable())
+    assert metrics["errors"] == 1 and metrics["batches"] == 3
+
+
+def test_client_unknown_response():
+    async def handle(reader, writer):
+        size, _, request_id = _HEADER.unpack(
+            await reader.readexactly(_HEADER.size)
+        )
+        await reader.readexactly(size)
+        # a response to a request that was never sent, then the real one
+        for rid, data in [(request_id + 1, b"?"), (request_id, b"{}")]:
+            writer.write(_HEADER.pack(len(data), STATUS_OK, rid) + data)
+        await writer.drain()
+
+    async def run():
+        server = await asyncio.start_server(handle, host="127.0.0.1", port=0)
+        port = server.sockets[0].getsockname()[1]
+        client = await TimetableClient.connect(port=port)
+        metrics = await asyncio.wait_for(client.metrics(), timeout=5)
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return metrics
+
+    assert asyncio.run(run()) == {}
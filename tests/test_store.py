@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from qablet_contracts.bnd.fixed import fixed_bond_batch
+from qablet_contracts.eq.barrier import OptionKO
+from qablet_contracts.eq.vanilla import Option
+from qablet_contracts.fingerprint import contract_fingerprints
+from qablet_contracts.store import PortfolioStore
+
+
+def _bonds(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-15") + rng.integers(0, 365, n)
+    return fixed_bond_batch(
+        "USD", rng.uniform(0.01, 0.06, n), start, start + 1825
+    )
+
+
+def _digests(tt):
+    table = contract_fingerprints(tt)
+    return dict(
+        zip(
+            table.column("contract").to_pylist(),
+            table.column("fingerprint").to_pylist(),
+        )
+    )
+
+
+def test_append_remove():
+    store = PortfolioStore(compact_threshold=0.5)
+    bonds = _bonds(100)
+    ids = store.append(bonds)
+    assert ids.tolist() == list(range(100))
+    option = Option(
+        "USD", "SPX", 2900, datetime(2024, 3, 31), True
+    ).timetable()
+    more = store.append([option])
+    assert more.tolist() == [100]
+    assert len(store) == 101 and store.num_chunks == 2
+
+    expected = _digests(bonds)
+    snapshot = store.snapshot()
+    store.remove(ids[10:20])
+    store.remove([5, 100, 1000])  # unknown ids are ignored
+    assert len(store) == 89
+    assert 0 < store.fragmentation < 0.5
+
+    # the old snapshot is not affected by the removals
+    assert len(snapshot["events"]) == len(bonds["events"]) + len(
+        option["events"]
+    )
+    later = store.snapshot()
+    live = _digests(later)
+    assert set(live) == set(store.contracts().tolist())
+    assert all(live[i] == expected[i] for i in live)
+    assert (
+        later["events"].column("contract").num_chunks > 1
+    )  # slices of the chunk
+
+    # past the threshold, the chunk is rewritten with only the live contracts
+    store.remove(ids[20:60])
+    assert store.fragmentation == 0
+    assert later["events"].num_rows > store.snapshot()["events"].num_rows
+    assert all(live[i] == expected[i] for i in _digests(store.snapshot()))
+
+
+def test_compact():
+    store = PortfolioStore(chunk_rows=1000)
+    for seed in range(20):
+        store.append(_bonds(3, seed))
+    dates = [datetime(2024, 3, 31), datetime(2024, 6, 30)]
+    option = OptionKO("USD", "SPX", 100, dates[-1], True, 120, "Up/Out", dates)
+    ids = store.append(option.timetable())
+    store.remove(np.arange(0, 60, 2))
+    before = store.snapshot()
+    expected = _digests(before)
+
+    store.compact()
+    assert store.num_chunks == 1 and store.fragmentation == 0
+    after = store.snapshot()
+    assert after["events"].num_rows == before["events"].num_rows
+    assert _digests(after) == expected
+    assert list(after["expressions"]) == ["ko"]
+
+    # the same expressions are appended again, but not a different one of the same name
+    store.append(option.timetable())
+    option.barrier = 110
+    with pytest.raises(ValueError, match="ko"):
+        store.append(option.timetable())
+
+    # the expressions of removed contracts are not in the snapshots
+    store.remove(ids)
+    store.remove(ids + 1)
+    assert len(store.snapshot()["expressions"]) == 0
+    store.compact()
+    assert len(store.snapshot()["expressions"]) == 0
+    assert len(store) == 30
+
+    # the snapshot taken before compaction is not affected
+    assert _digests(before) == expected
+    assert list(before["expressions"]) == ["ko"]
+
+
+def test_concurrent_updates():
+    store = PortfolioStore()
+    ids = [store.append(_bonds(5, seed)) for seed in range(8)]
+
+    def update(i):
+        store.remove(ids[i][:2])
+        store.append(_bonds(2, 100 + i))
+
+    threads = [threading.Thread(target=update, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store) == 8 * 5 - 8 * 2 + 8 * 2
+    ids = store.contracts()
+    assert len(np.unique(ids)) == len(ids)